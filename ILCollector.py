@@ -1,19 +1,2730 @@
-import tkinter as tk
-from tkinter import messagebox, filedialog, ttk
+import argparse
 import subprocess
 import csv
+import hashlib
+import heapq
+import io
+import json
 import os
-from datetime import datetime
-import win32evtlog
-import win32evtlogutil
-import win32con
+import platform
+import queue
+import re
+import shutil
+import socket
+import sqlite3
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from itertools import islice
+from operator import itemgetter
 import threading
 import sys
+import time
+import unicodedata
 
-class ModernILCollector:
+from event_records import (
+    LEVEL_ERROR, LEVEL_LABELS, LEVEL_NAMES, LEVEL_OTHER, LEVEL_WARNING, EventRecord, event_csv_row,
+    format_timestamp, format_utc, parse_csv_time, parse_utc, to_int,
+)
+from eventlog_readers import (
+    EventFilter, EvtQuerySource, Win32EventLogSource, Win32MessageFormatter, describe_unformatted, parse_time,
+)
+from evtx_reader import EvtxFileSource
+from fleet import HostConnection, read_hosts
+from jobs import (
+    CancelToken, CollectionCancelled, JobQueue, JobScheduler, LRUCache, ProgressQueue, describe_progress,
+    format_bytes, parse_size, run_process,
+)
+from search_index import EventSearchIndex
+
+# tkinter は使用時に読み込む（CLIの起動を速くし、Windows以外でも読み込めるようにする）
+tk = ttk = messagebox = filedialog = None
+
+
+def load_tkinter():
+    """tkinterを読み込む（GUIを起動するときだけ呼ぶ）"""
+    global tk, ttk, messagebox, filedialog
+    import tkinter as tk
+    from tkinter import messagebox, filedialog, ttk
+
+
+# FormatMessageの挿入文字列・エスケープ記法（%1, %1!s!, %n, %t, %% など）
+_INSERT_PATTERN = re.compile(r"%([1-9]\d?)(?:!([^!]*)!)?|%([0nrt%.! ])")
+_ESCAPES = {'n': '\r\n', 'r': '\r', 't': '\t', '%': '%', '.': '.', '!': '!', ' ': ' ', '0': '\0'}
+
+# メッセージDLLが登録されていないソースを表す印
+_SOURCE_NOT_FOUND = object()
+
+
+def apply_inserts(template, inserts):
+    """メッセージテンプレートにレコードごとの挿入文字列を埋め込む"""
+    inserts = inserts or ()
+
+    def replace(match):
+        number, _, escape = match.groups()
+        if escape is not None:
+            return _ESCAPES[escape]
+        index = int(number) - 1
+        if 0 <= index < len(inserts):
+            return str(inserts[index])
+        return match.group(0)
+
+    # %0 以降は出力しない（FormatMessageと同じ動作）
+    return _INSERT_PATTERN.sub(replace, template).split('\0', 1)[0]
+
+
+class FakeMessageFormatter:
+    """Windows以外で計測するための擬似フォーマッタ
+
+    レジストリ参照・DLL読み込み・テンプレート取得のコストを指定秒数のビジーループで再現する。
+    """
+
+    def __init__(self, load_delay=0.0002, template_delay=0.00005, message_length=80):
+        self.load_delay = load_delay
+        self.template_delay = template_delay
+        self.filler = "x" * message_length
+        self.loaded = 0
+        self.freed = 0
+
+    @staticmethod
+    def _spin(seconds):
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            pass
+
+    def load_modules(self, log_name, source):
+        self._spin(self.load_delay)
+        self.loaded += 1
+        return [f"{log_name}/{source}"]
+
+    def load_template(self, modules, event_id):
+        self._spin(self.template_delay)
+        return f"{modules[0]} event {event_id & 0xFFFF}: %1 / %2 {self.filler}%n"
+
+    def free_modules(self, modules):
+        self.freed += 1
+
+    def safe_format_message(self, event, log_name):
+        """キャッシュなしの場合（毎回読み込み・解放する）の処理を再現する"""
+        modules = self.load_modules(log_name, event.SourceName)
+        try:
+            return apply_inserts(self.load_template(modules, event.EventID), event.StringInserts)
+        finally:
+            self.free_modules(modules)
+
+
+class MessageFormatCache:
+    """SafeFormatMessageの結果を組み立てるためのメッセージDLLハンドルとテンプレートのキャッシュ
+
+    DLLハンドルは (ログ名, ソース)、テンプレートは (ログ名, ソース, イベントID) をキーに保持し、
+    挿入文字列だけをレコードごとに埋め込む。
+    """
+
+    def __init__(self, formatter, max_templates=4096, max_modules=64):
+        self.formatter = formatter
+        self.modules = LRUCache(max_modules, on_evict=lambda key, modules: formatter.free_modules(modules))
+        self.templates = LRUCache(max_templates)
+        self._lock = threading.Lock()
+
+    def format(self, event, log_name):
+        """イベントのメッセージを返す"""
+        key = (log_name, event.source, event.event_id)
+        with self._lock:
+            found, template = self.templates.lookup(key)
+            if not found:
+                template = self._load_template(log_name, event.source, event.event_id)
+                self.templates.put(key, template)
+
+        if template is _SOURCE_NOT_FOUND:
+            return describe_unformatted(event)
+        if template is None:
+            return ""
+        return apply_inserts(template, event.inserts)
+
+    def _load_template(self, log_name, source, event_id):
+        found, modules = self.modules.lookup((log_name, source))
+        if not found:
+            modules = self.formatter.load_modules(log_name, source)
+            self.modules.put((log_name, source), modules)
+        if modules is None:
+            return _SOURCE_NOT_FOUND
+        return self.formatter.load_template(modules, event_id)
+
+    def stats(self):
+        """ヒット・ミス数を返す"""
+        lookups = self.templates.hits + self.templates.misses
+        return {
+            'template_hits': self.templates.hits,
+            'template_misses': self.templates.misses,
+            'module_hits': self.modules.hits,
+            'module_misses': self.modules.misses,
+            'hit_rate': self.templates.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        """読み込んだメッセージDLLをすべて解放する"""
+        with self._lock:
+            self.modules.clear()
+            self.templates.clear()
+
+
+class StageStats:
+    """パイプラインのステージごとの処理件数と処理時間"""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0      # キュー待ちを除いた処理時間（秒）
+        self.elapsed = 0.0   # ステージ開始から終了までの時間（秒）
+        self.cpu = 0.0       # ステージのスレッドが使ったCPU時間（秒）
+        self.bytes = 0       # 書き込んだバイト数（書き込みステージのみ）
+
+    @property
+    def events_per_second(self):
+        return self.items / self.busy if self.busy > 0 else 0.0
+
+    def to_dict(self):
+        """run_manifest.json に記録する形にする"""
+        phase = {
+            'name': self.name,
+            'items': self.items,
+            'wall_seconds': round(self.elapsed, 6),
+            'busy_seconds': round(self.busy, 6),
+            'cpu_seconds': round(self.cpu, 6),
+        }
+        if self.bytes:
+            phase['bytes'] = self.bytes
+        return phase
+
+    def __repr__(self):
+        return (f"{self.name}: {self.items}件 処理{self.busy:.3f}秒 "
+                f"経過{self.elapsed:.3f}秒 ({self.events_per_second:,.0f}件/秒)")
+
+
+def _children_cpu():
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+class PhaseTimer:
+    """処理1つ分の経過時間とCPU時間（子プロセス分を含む）を計測する
+
+        with PhaseTimer("msinfo32") as phase:
+            ...
+        phases.append(phase.to_dict())
+    """
+
+    def __init__(self, name, **info):
+        self.name = name
+        self.info = info
+        self.wall = self.cpu = self.child_cpu = 0.0
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        self._child_cpu = _children_cpu()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wall = time.perf_counter() - self._wall
+        self.cpu = time.thread_time() - self._cpu
+        self.child_cpu = _children_cpu() - self._child_cpu
+        if exc_type is not None:
+            self.info['error'] = str(exc_value)
+        return False
+
+    def to_dict(self):
+        phase = {
+            'name': self.name,
+            'wall_seconds': round(self.wall, 6),
+            'cpu_seconds': round(self.cpu, 6),
+        }
+        if self.child_cpu:
+            phase['child_cpu_seconds'] = round(self.child_cpu, 6)
+        phase.update(self.info)
+        return phase
+
+
+class RunManifest:
+    """収集ごとのフェーズ別の計測結果を出力フォルダの run_manifest.json に追記する"""
+
+    FILE_NAME = "run_manifest.json"
+
+    # 同じファイルへの追記をスレッド間で直列化する
+    _lock = threading.Lock()
+
+    def __init__(self, folder):
+        self.path = os.path.join(folder, self.FILE_NAME)
+
+    def append(self, run):
+        """実行1回分の記録を追加する"""
+        with self._lock:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {'tool': "ILCollector", 'runs': []}
+            data['runs'].append(run)
+            atomic_write_json(self.path, data)
+
+
+class HashingFileIO(io.FileIO):
+    """書き込んだバイト列の SHA-256 とバイト数を書き込みと同時に計算するファイル
+
+    出力後に読み直さずにハッシュが得られる。追記モードの場合は追記した部分だけを対象とし、
+    開始位置を offset に持つ。
+    """
+
+    def __init__(self, path, mode='w'):
+        super().__init__(path, mode)
+        self.offset = self.tell() if 'a' in mode else 0
+        self.sha256 = hashlib.sha256()
+        self.bytes_written = 0
+
+    def write(self, data):
+        written = super().write(data)
+        if written:
+            self.sha256.update(memoryview(data)[:written])
+            self.bytes_written += written
+        return written
+
+    def include_existing(self):
+        """追記モードで開く前からある内容もハッシュとバイト数に含める（続きから書き込むファイル全体を対象にする）"""
+        with open(self.name, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                self.sha256.update(block)
+                self.bytes_written += len(block)
+        self.offset = 0
+
+    def checksum(self):
+        """{'sha256': 16進数のハッシュ, 'bytes': バイト数}（追記の場合は 'offset' も含む）"""
+        checksum = {'sha256': self.sha256.hexdigest(), 'bytes': self.bytes_written}
+        if self.offset:
+            checksum['offset'] = self.offset
+        return checksum
+
+
+def open_hashed(path, mode='w', encoding='utf-8', newline=None):
+    """書き込みながら SHA-256 を計算するテキストファイルを開く
+
+    閉じた後に checksum_of(f) でハッシュとバイト数を得る。
+    """
+    return io.TextIOWrapper(io.BufferedWriter(HashingFileIO(path, mode)), encoding=encoding, newline=newline)
+
+
+def checksum_of(f):
+    """open_hashed() で開いたファイルの書き込み済みの分のハッシュ（未書き出しの分を先に書き出す）"""
+    if not f.closed:
+        f.flush()
+    return f.buffer.raw.checksum()
+
+
+def sync_hashed(f):
+    """open_hashed() で開いたファイルをディスクに書き出し、{'offset': バイト数, 'sha256': ハッシュ} を返す"""
+    f.flush()
+    raw = f.buffer.raw
+    os.fsync(raw.fileno())
+    return {'offset': raw.bytes_written, 'sha256': raw.sha256.hexdigest()}
+
+
+def reopen_hashed(path, state, newline=None):
+    """sync_hashed() の状態までファイルを切り詰め、内容のハッシュが一致すれば続きを書き込むために開く
+
+    一致しない場合（チェックポイントの後に書き換えられた場合など）は ValueError。
+    """
+    with open(path, 'r+b') as f:
+        f.truncate(state['offset'])
+    f = open_hashed(path, 'a', newline=newline)
+    raw = f.buffer.raw
+    raw.include_existing()
+    if raw.bytes_written != state['offset'] or raw.sha256.hexdigest() != state['sha256']:
+        f.close()
+        raise ValueError(f"出力ファイルがチェックポイントと一致しません: {path}")
+    return f
+
+
+class ChecksumManifest:
+    """出力ファイルの SHA-256 とバイト数を同じフォルダの checksums.json に記録する"""
+
+    FILE_NAME = "checksums.json"
+
+    # 同じファイルへの更新をスレッド間で直列化する
+    _lock = threading.Lock()
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, self.FILE_NAME)
+
+    def record(self, path, checksum):
+        """ファイル1件分の記録を追加（同じ名前なら置き換え）する"""
+        with self._lock:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {'algorithm': "sha256", 'files': {}}
+            entry = dict(checksum)
+            entry['recorded'] = datetime.now().isoformat(timespec='seconds')
+            data['files'][os.path.relpath(path, self.folder)] = entry
+            atomic_write_json(self.path, data)
+
+
+class RotatingCsvWriter:
+    """イベントのCSVを一定のサイズ・行数ごとに番号付きのファイル（パート）に分けて書き込む
+
+    max_bytes・max_rows のどちらも指定しない場合は output_file にそのまま書き込む。指定した場合は
+    <名前>_part001.csv, <名前>_part002.csv… にそれぞれ見出し行を付けて書き込み、パートごとの
+    行数・バイト数・日時と RecordNumber の範囲を <名前>_parts.json に記録する。
+    サイズはパートの1行あたりの平均から次のパートに移る位置を見積もるため、目安として扱う。
+    open_indexer を指定した場合はパートごとに検索用の索引への登録を行う（パスと、続きから書き込む場合は
+    残すイベントの最も古い RecordNumber を受け取って EventIndexWriter を返す関数）。
+    resume に checkpoint() の状態を渡した場合は、書き込み中だったパートを記録した位置まで切り詰め、
+    その内容が記録したハッシュと一致することを確かめてから続きを書き込む（一致しなければ ValueError）。
+    """
+
+    def __init__(self, output_file, header, max_bytes=None, max_rows=None, open_indexer=None, resume=None):
+        self.output_file = output_file
+        self.header = header
+        self.max_bytes = max_bytes
+        self.max_rows = max_rows
+        self.rotating = bool(max_bytes or max_rows)
+        self.open_indexer = open_indexer
+        stem, self._ext = os.path.splitext(output_file)
+        self._stem = stem
+        self.index_file = parts_index_file(output_file) if self.rotating else None
+        self.parts = []         # 閉じたパートと書き込み中のパートの記録
+        self._file = None
+        self._indexer = None
+        self._closed_bytes = 0  # 閉じたパートのバイト数の合計
+        self.rows = 0           # 書き込んだ行数の合計
+        self.last_record = None  # 最後に書き込んだイベントの RecordNumber
+        if resume is None:
+            self._next_part()
+        else:
+            self._resume(resume)
+
+    def _resume(self, state):
+        folder = os.path.dirname(self.output_file)
+        for part in state['parts']:
+            part = dict(part)
+            part['path'] = os.path.join(folder, part.pop('file'))
+            self.parts.append(part)
+        part = self.parts[-1]
+        missing = [entry['path'] for entry in self.parts if not os.path.exists(entry['path'])]
+        if missing:
+            raise ValueError(f"出力ファイルが見つかりません: {missing[0]}")
+        self._closed_bytes = sum(closed['checksum']['bytes'] for closed in self.parts[:-1])
+        self.rows = state['rows']
+        self.last_record = state['last_record']
+        self._file = reopen_hashed(part['path'], state, newline='')
+        self._writer = csv.writer(self._file)
+        # 索引はチェックポイントまでの分を登録済み（それより後に登録された分は削除する）
+        self._indexer = self.open_indexer(part['path'], self.last_record) if self.open_indexer is not None else None
+
+    def _next_part(self):
+        """書き込み中のパートを閉じて次のパートを開く"""
+        self._close_part()
+        number = len(self.parts) + 1
+        path = f"{self._stem}_part{number:03d}{self._ext}" if self.rotating else self.output_file
+        self._file = open_hashed(path, 'w', newline='', encoding='utf-8-sig')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.header)
+        self._indexer = self.open_indexer(path, None) if self.open_indexer is not None else None
+        self.parts.append({'path': path, 'rows': 0, 'records': None, 'times': None, 'checksum': None})
+
+    def _close_part(self, partial=False):
+        """書き込み中のパートを閉じる（partial の場合は名前に .partial を付ける）"""
+        if self._file is None:
+            return
+        part = self.parts[-1]
+        self._file.close()
+        part['checksum'] = checksum_of(self._file)
+        self._closed_bytes += part['checksum']['bytes']
+        if partial:
+            partial_path = f"{os.path.splitext(part['path'])[0]}.partial{self._ext}"
+            os.replace(part['path'], partial_path)
+            part['path'] = partial_path
+        if self._indexer is not None:
+            self._indexer.close(part['path'])
+        self._file = self._indexer = None
+
+    def _full(self):
+        part = self.parts[-1]
+        if not part['rows']:
+            return False
+        if self.max_rows and part['rows'] >= self.max_rows:
+            return True
+        return bool(self.max_bytes) and self._file.tell() >= self.max_bytes
+
+    def writerows(self, items):
+        """(イベント, メッセージ) のリストをCSVの行にして書き込む（パートの上限に達したら次のパートに移る）"""
+        start = 0
+        while start < len(items):
+            if self.rotating and self._full():
+                self._next_part()
+            part = self.parts[-1]
+            end = len(items)
+            if self.max_rows:
+                end = min(end, start + self.max_rows - part['rows'])
+            if self.max_bytes and part['rows']:
+                size = self._file.tell()
+                end = min(end, start + max(int((self.max_bytes - size) * part['rows'] / size), 1))
+            chunk = items[start:end]
+            self._writer.writerows([event_csv_row(event, message) for event, message in chunk])
+            self._track(part, chunk)
+            start = end
+
+    def _track(self, part, chunk):
+        """パートの行数・RecordNumber と日時の範囲を更新し、索引に登録する"""
+        part['rows'] += len(chunk)
+        self.rows += len(chunk)
+        self.last_record = chunk[-1][0].record_number
+        records = [event.record_number for event, _ in chunk]
+        times = [event.timestamp for event, _ in chunk]
+        if part['records'] is not None:
+            records += part['records']
+            times += part['times']
+        part['records'] = (min(records), max(records))
+        part['times'] = (min(times), max(times))
+        if self._indexer is not None:
+            for event, message in chunk:
+                self._indexer.add(event, message)
+
+    def tell(self):
+        """書き込んだバイト数の合計（進捗の表示用）"""
+        return self._closed_bytes + (self._file.tell() if self._file is not None else 0)
+
+    @property
+    def bytes_written(self):
+        """閉じたパートのバイト数の合計（close() の後は出力全体）"""
+        return self._closed_bytes
+
+    def checkpoint(self):
+        """書き込んだ分をディスクに書き出し、resume に渡せる状態を返す（JSONに保存できる辞書）"""
+        if self._indexer is not None:
+            self._indexer.sync()
+        state = sync_hashed(self._file)
+        parts = []
+        for part in self.parts:
+            part = dict(part)
+            part['file'] = os.path.basename(part.pop('path'))
+            parts.append(part)
+        state.update(parts=parts, rows=self.rows, last_record=self.last_record)
+        return state
+
+    def abort(self):
+        """異常終了した場合にファイルを閉じる（名前の変更と一覧の保存はせず、チェックポイントから再開できる状態に残す）"""
+        self._close_part()
+
+    def close(self, partial=False):
+        """書き込み中のパートを閉じ、パートに分けた場合は一覧を保存して出力ファイルのパスを返す
+
+        partial（キャンセルで途中まで）の場合は最後のパート（分けない場合は出力ファイル）の名前に
+        .partial を付け、一覧の complete を False にする。パートに分けた場合は一覧のパスを返す。
+        """
+        self._close_part(partial)
+        if not self.rotating:
+            return self.parts[0]['path']
+        atomic_write_json(self.index_file, {
+            'file': os.path.basename(self.output_file),
+            'complete': not partial,
+            'max_bytes': self.max_bytes,
+            'max_rows': self.max_rows,
+            'rows': sum(part['rows'] for part in self.parts),
+            'parts': [self._part_entry(part) for part in self.parts],
+        })
+        return self.index_file
+
+    def _part_entry(self, part):
+        entry = {
+            'file': os.path.basename(part['path']),
+            'rows': part['rows'],
+            'bytes': part['checksum']['bytes'],
+            'sha256': part['checksum']['sha256'],
+        }
+        if part['rows']:
+            entry['first_record'], entry['last_record'] = part['records']
+            entry['oldest'], entry['newest'] = (self._iso_time(t) for t in part['times'])
+        return entry
+
+    @staticmethod
+    def _iso_time(timestamp):
+        try:
+            return datetime.fromtimestamp(timestamp).isoformat(timespec='seconds')
+        except (OverflowError, OSError, ValueError, TypeError):
+            return None
+
+    def checksums(self):
+        """閉じたパートごとの (パス, ハッシュ)"""
+        return [(part['path'], part['checksum']) for part in self.parts]
+
+    def read_events(self):
+        """書き込んだ行を EventRecord（日時・イベントID・レベル・ソースのみ）にして返す（再開したエクスポートの集計用）"""
+        for part in self.parts:
+            with open(part['path'], encoding='utf-8-sig', newline='') as f:
+                rows = csv.reader(f)
+                next(rows, None)
+                for row in rows:
+                    if len(row) < 5:
+                        continue
+                    yield EventRecord(
+                        None, parse_csv_time(row[0]) or 0, to_int(row[1]),
+                        LEVEL_LABELS.index(row[2]) if row[2] in LEVEL_LABELS else LEVEL_OTHER, sys.intern(row[3])
+                    )
+
+
+class JsonLinesWriter:
+    """イベントを1行1件のJSON（JSON Lines）で書き込む
+
+    CSVと違いメッセージの改行をそのまま残し、RecordNumber・挿入文字列・コンピューター名・分類も
+    項目として出力する（他のシステムへの取り込み用）。バッチの行はまとめて1回で書き込む。
+    resume に checkpoint() の状態を渡した場合は、記録した位置まで切り詰めてハッシュを確かめてから続きを書き込む。
+    """
+
+    def __init__(self, output_file, log_name, resume=None):
+        self.path = output_file
+        self.log_name = log_name
+        self.checksum = None
+        if resume is None:
+            self._file = open_hashed(output_file, 'w', newline='')
+        else:
+            self._file = reopen_hashed(output_file, resume, newline='')
+
+    def writerows(self, items):
+        """(イベント, メッセージ) のリストを書き込む"""
+        dumps = json.dumps
+        log_name = self.log_name
+        self._file.write("".join([dumps({
+            'log': log_name,
+            'record_number': event.record_number,
+            'time': format_utc(event.timestamp),
+            'event_id': event.event_id & 0xFFFF,
+            'qualifiers': event.event_id >> 16,
+            'level': LEVEL_NAMES[event.level],
+            'source': event.source,
+            'computer': event.computer,
+            'category': event.category,
+            'inserts': list(event.inserts),
+            'message': message,
+        }, ensure_ascii=False, default=str) + "\n" for event, message in items]))
+
+    def tell(self):
+        return self._file.tell()
+
+    @property
+    def bytes_written(self):
+        return self.checksum['bytes'] if self.checksum is not None else self._file.buffer.raw.bytes_written
+
+    def checkpoint(self):
+        return sync_hashed(self._file)
+
+    def abort(self):
+        self._file.close()
+
+    def close(self, partial=False):
+        """ファイルを閉じてパスを返す（partial の場合は名前に .partial を付ける）"""
+        self._file.close()
+        self.checksum = checksum_of(self._file)
+        if partial:
+            stem, ext = os.path.splitext(self.path)
+            os.replace(self.path, f"{stem}.partial{ext}")
+            self.path = f"{stem}.partial{ext}"
+        return self.path
+
+    def checksums(self):
+        return [(self.path, self.checksum)]
+
+    def read_events(self):
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue
+                yield EventRecord(item['record_number'], parse_utc(item['time']) or 0,
+                                  (item['qualifiers'] << 16) | item['event_id'], LEVEL_NAMES.index(item['level']),
+                                  sys.intern(item['source']))
+
+
+class SqliteEventWriter:
+    """イベントをSQLiteのデータベースの events テーブルに書き込む（分析用）
+
+    バッチごとに executemany でまとめて挿入し、コミットは checkpoint() と close() のときだけ行う。
+    コミットしていない行は異常終了すると SQLite が取り消すため、resume では checkpoint() の行数より
+    後に挿入された行だけを削除する。日時・イベントID・ソースの索引は書き終えてから作る。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS events (
+            record_number INTEGER,
+            time TEXT,
+            log_name TEXT,
+            event_id INTEGER,
+            qualifiers INTEGER,
+            level TEXT,
+            source TEXT,
+            computer TEXT,
+            category INTEGER,
+            inserts TEXT,
+            message TEXT
+        )
+    """
+
+    def __init__(self, output_file, log_name, resume=None):
+        self.path = output_file
+        self.log_name = log_name
+        self.checksum = None
+        if resume is None and os.path.exists(output_file):
+            os.remove(output_file)
+        self._conn = sqlite3.connect(output_file)
+        self._conn.execute(self.SCHEMA)
+        self.rows = 0
+        if resume is not None:
+            # 行は挿入した順に 1 から rowid が振られる
+            count = self._conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM events").fetchone()[0]
+            if count < resume['rows']:
+                self._conn.close()
+                raise ValueError(f"出力ファイルがチェックポイントと一致しません: {output_file}")
+            self._conn.execute("DELETE FROM events WHERE rowid > ?", (resume['rows'],))
+            self._conn.commit()
+            self.rows = resume['rows']
+
+    def writerows(self, items):
+        """(イベント, メッセージ) のリストを挿入する（コミットはしない）"""
+        log_name = self.log_name
+        self._conn.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [(
+            event.record_number,
+            format_utc(event.timestamp),
+            log_name,
+            event.event_id & 0xFFFF,
+            event.event_id >> 16,
+            LEVEL_NAMES[event.level],
+            event.source,
+            event.computer,
+            event.category,
+            json.dumps(list(event.inserts), ensure_ascii=False, default=str),
+            message,
+        ) for event, message in items])
+        self.rows += len(items)
+
+    def tell(self):
+        # ページ単位で書き込まれるため、進捗には含めない
+        return 0
+
+    @property
+    def bytes_written(self):
+        return self.checksum['bytes'] if self.checksum is not None else 0
+
+    def checkpoint(self):
+        self._conn.commit()
+        return {'rows': self.rows}
+
+    def abort(self):
+        self._conn.close()
+
+    def close(self, partial=False):
+        """コミットして索引を作り、データベースを閉じてパスを返す（partial の場合は名前に .partial を付ける）"""
+        self._conn.execute("CREATE INDEX IF NOT EXISTS events_time ON events (time)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS events_event_id ON events (event_id, source)")
+        self._conn.commit()
+        self._conn.close()
+        if partial:
+            stem, ext = os.path.splitext(self.path)
+            os.replace(self.path, f"{stem}.partial{ext}")
+            self.path = f"{stem}.partial{ext}"
+        # ページを書き換えながら書き込むため、ハッシュは閉じてから計算する
+        sha256 = hashlib.sha256()
+        size = 0
+        with open(self.path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha256.update(block)
+                size += len(block)
+        self.checksum = {'sha256': sha256.hexdigest(), 'bytes': size}
+        return self.path
+
+    def checksums(self):
+        return [(self.path, self.checksum)]
+
+    def read_events(self):
+        rows = self._conn.execute("SELECT record_number, time, event_id, qualifiers, level, source FROM events")
+        for record_number, time_text, event_id, qualifiers, level, source in rows:
+            yield EventRecord(record_number, parse_utc(time_text) or 0, (qualifiers << 16) | event_id,
+                              LEVEL_NAMES.index(level), sys.intern(source))
+
+
+class FanOutWriter:
+    """1回の読み込みで整形したイベントのバッチを、選択した形式の書き込み先すべてに渡す
+
+    writers は {形式: 書き込み先} の辞書（EXPORT_FORMATS の順）。どの書き込み先も (イベント, メッセージ) の
+    リストを受け取り、形式ごとにまとめて書き込む。checkpoint() は書き込み先ごとの状態を 'outputs' にまとめ、
+    再開時はその状態を各書き込み先の resume に渡す。
+    """
+
+    def __init__(self, writers, resume=None):
+        self.writers = writers
+        self.rows = resume['rows'] if resume is not None else 0
+        self.last_record = resume['last_record'] if resume is not None else None
+
+    def writerows(self, items):
+        for writer in self.writers.values():
+            writer.writerows(items)
+        self.rows += len(items)
+        self.last_record = items[-1][0].record_number
+
+    def tell(self):
+        return sum(writer.tell() for writer in self.writers.values())
+
+    @property
+    def bytes_written(self):
+        return sum(writer.bytes_written for writer in self.writers.values())
+
+    def checkpoint(self):
+        return {
+            'outputs': {name: writer.checkpoint() for name, writer in self.writers.items()},
+            'rows': self.rows,
+            'last_record': self.last_record,
+        }
+
+    def abort(self):
+        for writer in self.writers.values():
+            writer.abort()
+
+    def close(self, partial=False):
+        """すべての書き込み先を閉じ、{形式: 出力ファイル} を返す"""
+        return {name: writer.close(partial) for name, writer in self.writers.items()}
+
+    def checksums(self):
+        return [item for writer in self.writers.values() for item in writer.checksums()]
+
+    def read_events(self):
+        return next(iter(self.writers.values())).read_events()
+
+
+# パイプラインの終端を表す印
+_PIPELINE_END = object()
+
+
+class EventPipeline:
+    """読み込み・整形・書き込みの各ステージを境界付きキューでつないで並行に実行する
+
+    read_batches はイベントのバッチを返すイテラブル、format_event はイベント1件を
+    CSVの行に変換する関数（Noneを返した場合は出力しない）、write_rows は行のリストを
+    まとめて書き込む関数。キューの長さに上限があるため、イベント数に関係なく
+    メモリ使用量は一定に保たれる。on_write を指定した場合は書き込みのたびに
+    ステージごとの統計を渡して呼び出す。
+    cancel_token（CancelToken）がキャンセルされると読み込みと整形をバッチの区切りで止め、
+    整形済みの行を書き込んでから終了する（cancelled がTrueになる）。
+    """
+
+    def __init__(self, read_batches, format_event, write_rows, limit=None, queue_size=8, chunk_size=500,
+                 on_write=None, profile_prefix=None, cancel_token=None):
+        self.read_batches = read_batches
+        self.format_event = format_event
+        self.write_rows = write_rows
+        self.on_write = on_write
+        self.profile_prefix = profile_prefix   # 指定した場合はステージごとに cProfile の結果を保存する
+        self.limit = limit
+        self.queue_size = queue_size
+        self.chunk_size = chunk_size
+        self.cancel_token = cancel_token or CancelToken()
+        self.cancelled = False
+        self.stats = {name: StageStats(name) for name in ('read', 'format', 'write')}
+        self._stop = threading.Event()     # 上流の読み込みを止める（件数上限に達した場合など）
+        self._aborted = threading.Event()  # いずれかのステージで例外が発生した
+        self._error = None
+
+    def run(self):
+        """パイプラインを実行し、ステージごとの統計を返す"""
+        raw_queue = queue.Queue(self.queue_size)
+        row_queue = queue.Queue(self.queue_size)
+        threads = [
+            threading.Thread(target=self._guard, args=(self._read_stage, raw_queue), daemon=True),
+            threading.Thread(target=self._guard, args=(self._format_stage, raw_queue, row_queue), daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+
+        # 書き込みは呼び出し元のスレッドで行う（ファイルの所有者を変えない）
+        self._guard(self._write_stage, row_queue)
+
+        for thread in threads:
+            thread.join()
+        if self._error is not None:
+            raise self._error
+        return self.stats
+
+    def _guard(self, stage, *queues):
+        try:
+            if self.profile_prefix is None:
+                stage(*queues)
+            else:
+                self._profile(stage, *queues)
+        except Exception as e:
+            if self._error is None:
+                self._error = e
+            self._aborted.set()
+
+    def _profile(self, stage, *queues):
+        """ステージを cProfile 付きで実行し、<prefix>_<ステージ名>.prof に保存する"""
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(stage, *queues)
+        finally:
+            profiler.dump_stats(f"{self.profile_prefix}_{stage.__name__.strip('_').replace('_stage', '')}.prof")
+
+    def _put(self, q, item, stop_events):
+        """停止が指示されるまでキューへの投入を試みる"""
+        while not any(event.is_set() for event in stop_events):
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, q):
+        """中断されるまでキューから取り出しを試みる"""
+        while not self._aborted.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _PIPELINE_END
+
+    def _read_stage(self, raw_queue):
+        stats = self.stats['read']
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        batches = iter(self.read_batches)
+        try:
+            while not self._stop.is_set():
+                if self.cancel_token.cancelled:
+                    self.cancelled = True
+                    break
+                t0 = time.perf_counter()
+                batch = next(batches, None)
+                stats.busy += time.perf_counter() - t0
+                if not batch:
+                    break
+                stats.items += len(batch)
+                if not self._put(raw_queue, batch, (self._stop, self._aborted, self.cancel_token)):
+                    self.cancelled = self.cancel_token.cancelled
+                    break
+            self._put(raw_queue, _PIPELINE_END, (self._stop, self._aborted))
+        finally:
+            stats.elapsed = time.perf_counter() - start
+            stats.cpu = time.thread_time() - cpu_start
+
+    def _format_stage(self, raw_queue, row_queue):
+        stats = self.stats['format']
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        chunk = []
+        try:
+            while True:
+                batch = self._get(raw_queue)
+                if batch is _PIPELINE_END:
+                    break
+                t0 = time.perf_counter()
+                for event in batch:
+                    row = self.format_event(event)
+                    if row is None:
+                        continue
+                    chunk.append(row)
+                    stats.items += 1
+                    if len(chunk) >= self.chunk_size:
+                        self._put(row_queue, chunk, (self._aborted,))
+                        chunk = []
+                    if self.limit is not None and stats.items >= self.limit:
+                        self._stop.set()
+                        break
+                stats.busy += time.perf_counter() - t0
+                if self._stop.is_set():
+                    break
+                if self.cancel_token.cancelled:
+                    self.cancelled = True
+                    break
+            if chunk:
+                self._put(row_queue, chunk, (self._aborted,))
+            self._put(row_queue, _PIPELINE_END, (self._aborted,))
+        finally:
+            stats.elapsed = time.perf_counter() - start
+            stats.cpu = time.thread_time() - cpu_start
+
+    def _write_stage(self, row_queue):
+        stats = self.stats['write']
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            while True:
+                chunk = self._get(row_queue)
+                if chunk is _PIPELINE_END:
+                    break
+                t0 = time.perf_counter()
+                self.write_rows(chunk)
+                stats.busy += time.perf_counter() - t0
+                stats.items += len(chunk)
+                if self.on_write is not None:
+                    self.on_write(self.stats)
+        finally:
+            stats.elapsed = time.perf_counter() - start
+            stats.cpu = time.thread_time() - cpu_start
+            # 書き込みが止まった場合に上流が待ち続けないようにする
+            self._stop.set()
+
+
+def atomic_write_json(path, data):
+    """一時ファイルに書き込んでから置き換え、途中で中断しても壊れないようにJSONを保存する"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+class BookmarkStore:
+    """ログ名ごとに出力済みの最大RecordNumberと出力ファイルのサイズを記録する"""
+
+    FILE_NAME = "bookmarks.json"
+
+    def __init__(self, root):
+        self.path = os.path.join(root, self.FILE_NAME)
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def get(self, log_name):
+        """ブックマークを返す（未登録の場合はNone）"""
+        with self._lock:
+            return self._load().get(log_name)
+
+    def update(self, log_name, record_number, output_file, size):
+        """ブックマークを原子的に更新する"""
+        with self._lock:
+            data = self._load()
+            data[log_name] = {
+                'record_number': record_number,
+                'file': os.path.basename(output_file),
+                'size': size,
+                'updated': datetime.now().isoformat(timespec='seconds'),
+            }
+            atomic_write_json(self.path, data)
+
+
+class ExportCheckpoint:
+    """実行中のエクスポートの途中経過を <出力ファイル名>.checkpoint.json に定期的に保存する
+
+    保存する前に出力をディスクに書き出すため、記録した位置（offset）までの内容とハッシュは
+    常にファイルと一致する。正常に終わった場合とキャンセルした場合は削除し、プロセスが
+    異常終了した場合（サーバーの再起動など）だけ残る。残ったチェックポイントは find() で探し、
+    Collector.resume_interrupted() で続きから出力する。
+    出力中は <出力ファイル名>.checkpoint.lock をロックし、他のプロセスが出力中のものを再開しない
+    （ロックはプロセスが終了すると OS が解放する）。
+    """
+
+    SUFFIX = ".checkpoint.json"
+    LOCK_SUFFIX = ".checkpoint.lock"
+
+    # 保存の間隔（秒）
+    INTERVAL = 5.0
+
+    def __init__(self, output_file, job, interval=INTERVAL):
+        stem = os.path.splitext(output_file)[0]
+        self.path = f"{stem}{self.SUFFIX}"
+        self.lock_path = f"{stem}{self.LOCK_SUFFIX}"
+        self.job = job            # 再開に必要なエクスポートの条件
+        self.interval = interval
+        self._saved = None
+        self._lock_file = None
+
+    def acquire(self):
+        """出力中のロックを取得する（他のプロセスが出力中ならFalse）"""
+        if self._lock_file is None:
+            self._lock_file = _lock_exclusive(self.lock_path)
+        return self._lock_file is not None
+
+    def release(self):
+        """ロックを解放する（チェックポイントは残す）"""
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def save(self, writer, force=False):
+        """前回の保存から interval 秒以上経っていれば writer（RotatingCsvWriter）の状態を保存する"""
+        now = time.monotonic()
+        if not force and self._saved is not None and now - self._saved < self.interval:
+            return
+        data = dict(self.job)
+        data.update(writer.checkpoint())
+        data['updated'] = datetime.now().isoformat(timespec='seconds')
+        atomic_write_json(self.path, data)
+        self._saved = now
+
+    def remove(self):
+        """出力を終えたチェックポイントとロックを削除する"""
+        self.release()
+        for path in (self.path, self.lock_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @classmethod
+    def find(cls, root):
+        """出力ルート以下（フリート収集のホスト別フォルダを含む2階層まで）に残ったチェックポイントを
+        (パス, 内容) のリストで返す（出力中のものと読めないものは飛ばす）"""
+        found = []
+        folders = level = [root] if os.path.isdir(root) else []
+        for _ in range(2):
+            level = sorted(entry.path for folder in level for entry in os.scandir(folder) if entry.is_dir())
+            folders = folders + level
+        for folder in folders:
+            for entry in sorted(os.scandir(folder), key=lambda entry: entry.name):
+                if not entry.name.endswith(cls.SUFFIX):
+                    continue
+                lock_file = _lock_exclusive(entry.path[:-len(cls.SUFFIX)] + cls.LOCK_SUFFIX)
+                if lock_file is None:
+                    continue
+                lock_file.close()
+                try:
+                    with open(entry.path, encoding='utf-8') as f:
+                        found.append((entry.path, json.load(f)))
+                except (OSError, ValueError):
+                    continue
+        return found
+
+
+def _lock_exclusive(path):
+    """ファイルを開いて排他ロックを取得する（他のプロセスがロック中ならNone）"""
+    f = open(path, 'w')
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+_INVALID_FILENAME_CHARS = re.compile(r'[\\/:*?"<>|]')
+
+
+def channel_filename(log_name):
+    """チャネル名をファイル名に使える形にする（"Microsoft-Windows-PowerShell/Operational" など）"""
+    return _INVALID_FILENAME_CHARS.sub("_", log_name)
+
+
+def parse_channels(specs):
+    """チャネルの指定（"Security" や "Security:5000"、カンマ区切り可）を (チャネル名のリスト, 件数上限の辞書) にする
+
+    件数上限を指定しなかったチャネルは辞書に含めない（0 は無制限）。
+    """
+    channels = []
+    limits = {}
+    for spec in specs:
+        for item in spec.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            name, sep, limit = item.rpartition(":")
+            if sep and limit.strip().isdigit():
+                item = name.strip()
+                limits[item] = int(limit) or None
+            elif sep:
+                raise ValueError(f"件数の指定が正しくありません: {item}")
+            if item not in channels:
+                channels.append(item)
+    return channels, limits
+
+
+def _text_width(text):
+    """等幅フォントでの表示幅（全角文字は2文字分）"""
+    return sum(2 if unicodedata.east_asian_width(ch) in "WF" else 1 for ch in text)
+
+
+def _format_table(rows, header=None):
+    """行のリストを列をそろえたテキストの行にする"""
+    rows = [[str(value) for value in row] for row in ([header] if header else []) + list(rows)]
+    if not rows:
+        return []
+    widths = [max(_text_width(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return ["  ".join(value + " " * (width - _text_width(value)) for value, width in zip(row, widths)).rstrip()
+            for row in rows]
+
+
+def summary_file(output_file):
+    """CSVに対応する集計ファイルのパス"""
+    return f"{os.path.splitext(output_file)[0]}_summary.txt"
+
+
+def parts_index_file(output_file):
+    """パートに分けて出力したCSVの一覧（RotatingCsvWriter）のパス"""
+    return f"{os.path.splitext(output_file)[0]}_parts.json"
+
+
+def export_csv_files(output_file):
+    """エクスポートの出力ファイル（パートの一覧の場合は各パート）のCSVのパスを書き込んだ順に返す"""
+    if not output_file.endswith("_parts.json"):
+        return [output_file]
+    with open(output_file, encoding='utf-8') as f:
+        parts = json.load(f)['parts']
+    folder = os.path.dirname(output_file)
+    return [os.path.join(folder, part['file']) for part in parts]
+
+
+# イベントログの出力形式と拡張子（CSV以外はパートに分けない）
+EXPORT_FORMATS = {'csv': ".csv", 'jsonl': ".jsonl", 'sqlite': ".sqlite3"}
+
+
+def export_files(output_file, formats, rotating=False):
+    """イベントログのエクスポートの {形式: 出力ファイル}（CSVをパートに分けた場合はパートの一覧）"""
+    stem = os.path.splitext(output_file)[0]
+    files = {}
+    for name in formats:
+        if name == 'csv':
+            files[name] = parts_index_file(output_file) if rotating else output_file
+        else:
+            files[name] = stem + EXPORT_FORMATS[name]
+    return files
+
+
+TIMELINE_HEADER = ['日時', 'チャネル', 'イベントID', 'レベル', 'ソース', 'メッセージ']
+
+
+def _timeline_rows(channel, paths):
+    """エクスポートしたCSVの行を (日時のエポック秒, 日時の後ろにチャネル名を挟んだ行) にして書き込んだ順に返す
+
+    日時を読めない行は最も古いものとして扱う。
+    """
+    for path in paths:
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            rows = csv.reader(f)
+            next(rows, None)
+            for row in rows:
+                if len(row) < 5:
+                    continue
+                timestamp = parse_csv_time(row[0])
+                yield -1 if timestamp is None else timestamp, [row[0], channel] + row[1:]
+
+
+def merge_timeline(streams, output_file, cancel_token=None):
+    """チャネルごとにエクスポートしたCSVを日時の新しい順に1つのCSVにまとめ、(行数, ハッシュ) を返す
+
+    streams は (チャネル名, CSVのパスのリスト) のリスト。チャネルは最大 max_workers 件ずつしか
+    同時に読み込まないため、読み込み中のイベントではなく出力を終えたCSVを読み直してまとめる。
+    各チャネルのCSVは新しい順に書かれているため、ヒープで各チャネルの先頭の行の日時（エポック秒）
+    だけを比べて順に書き出す（メモリは行数ではなくチャネル数に比例する）。
+    同じ日時の行は streams の順、チャネル内で日時が前後している行はCSVの順のまま出力する。
+    """
+    merged = heapq.merge(*(_timeline_rows(channel, paths) for channel, paths in streams),
+                         key=itemgetter(0), reverse=True)
+    count = 0
+    with open_hashed(output_file, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(TIMELINE_HEADER)
+        while True:
+            chunk = [row for _, row in islice(merged, 2000)]
+            if not chunk:
+                break
+            writer.writerows(chunk)
+            count += len(chunk)
+            if cancel_token is not None:
+                cancel_token.check()
+        return count, checksum_of(f)
+
+
+class EventSummary:
+    """出力したイベントを (ソース, イベントID, レベル) ごとに集計する
+
+    整形ステージでイベントを1件ずつ add() するため、CSVを読み直さずに
+    件数・最初と最後の日時・時間帯ごとのエラー件数が得られる。
+    組み合わせごとに [件数, 最初の日時, 最後の日時] のリストだけを持つ。
+    """
+
+    def __init__(self, log_name, bucket_seconds=3600, top=20):
+        self.log_name = log_name
+        self.bucket_seconds = bucket_seconds
+        self.top = top
+        self.total = 0
+        self.counts = {}          # (ソース, イベントID, レベルの添字) -> [件数, 最初, 最後]
+        self.error_buckets = {}   # 時間帯の開始（UNIX時刻）-> エラー件数
+
+    def add(self, event):
+        timestamp = event.timestamp
+        level = event.level
+        key = (event.source, event.event_id & 0xFFFF, level)
+        entry = self.counts.get(key)
+        if entry is None:
+            self.counts[key] = [1, timestamp, timestamp]
+        else:
+            entry[0] += 1
+            if timestamp < entry[1]:
+                entry[1] = timestamp
+            elif timestamp > entry[2]:
+                entry[2] = timestamp
+        if level == LEVEL_ERROR:
+            bucket = timestamp - timestamp % self.bucket_seconds
+            self.error_buckets[bucket] = self.error_buckets.get(bucket, 0) + 1
+        self.total += 1
+
+    def sources(self):
+        """ソースごとの (件数, 最初, 最後) を件数の多い順に返す"""
+        sources = {}
+        for (source, _, _), (count, first, last) in self.counts.items():
+            entry = sources.get(source)
+            if entry is None:
+                sources[source] = [count, first, last]
+            else:
+                entry[0] += count
+                entry[1] = min(entry[1], first)
+                entry[2] = max(entry[2], last)
+        return sorted(sources.items(), key=lambda item: -item[1][0])
+
+    def combinations(self):
+        """(ソース, イベントID, レベルの添字) ごとの (件数, 最初, 最後) を件数の多い順に返す"""
+        return sorted(self.counts.items(), key=lambda item: -item[1][0])
+
+    def error_bursts(self):
+        """エラーの多い時間帯 (開始, 件数) を件数の多い順に返す"""
+        return sorted(self.error_buckets.items(), key=lambda item: (-item[1], item[0]))
+
+    def levels(self):
+        """レベル名ごとの件数"""
+        totals = [0] * len(LEVEL_NAMES)
+        for (_, _, level), (count, _, _) in self.counts.items():
+            totals[level] += count
+        return dict(zip(LEVEL_NAMES, totals))
+
+    @staticmethod
+    def _time(timestamp):
+        return format_timestamp(timestamp)
+
+    def format_text(self):
+        """集計結果をテキストにする"""
+        lines = [f"=== {self.log_name} イベントログの集計 ===", f"出力件数: {self.total}"]
+        if self.counts:
+            first = min(entry[1] for entry in self.counts.values())
+            last = max(entry[2] for entry in self.counts.values())
+            lines.append(f"期間: {self._time(first)} ～ {self._time(last)}")
+        lines.append("レベル別: " + " / ".join(
+            f"{EventFilter.LEVELS[level]} {count}" for level, count in self.levels().items()
+        ))
+        lines.append("")
+
+        lines.append(f"=== 件数の多いソース（上位{self.top}） ===")
+        lines.extend(_format_table(
+            ([count, source, self._time(first), self._time(last)]
+             for source, (count, first, last) in self.sources()[:self.top]),
+            header=["件数", "ソース", "最初", "最後"]
+        ))
+        lines.append("")
+
+        lines.append(f"=== 件数の多い組み合わせ（上位{self.top}） ===")
+        lines.extend(_format_table(
+            ([count, source, event_id, LEVEL_LABELS[level], self._time(first), self._time(last)]
+             for (source, event_id, level), (count, first, last) in self.combinations()[:self.top]),
+            header=["件数", "ソース", "イベントID", "レベル", "最初", "最後"]
+        ))
+        lines.append("")
+
+        lines.append(f"=== エラーの多い時間帯（{self.bucket_seconds // 60}分ごと、上位{self.top}） ===")
+        bursts = self.error_bursts()[:self.top]
+        if bursts:
+            lines.extend(_format_table(
+                ([self._time(start), self._time(start + self.bucket_seconds), count] for start, count in bursts),
+                header=["開始", "終了", "エラー件数"]
+            ))
+        else:
+            lines.append("（エラーはありません）")
+        lines.append("")
+        return "\n".join(lines)
+
+    def write(self, path):
+        """集計ファイルを書き出し、ハッシュとバイト数を返す"""
+        with open_hashed(path, 'w', encoding='utf-8') as f:
+            f.write(self.format_text())
+        return checksum_of(f)
+
+
+class EventCsvIndex:
+    """出力したイベントログのCSVを、全体を読み込まずに表示するための索引
+
+    1回の走査で各行の開始位置（バイト数）・レベル・ソースだけを記録し、行の内容は表示する分だけ
+    開始位置から読み直す。数百万行のCSVでも1行あたり十数バイトのメモリで絞り込み・並べ替えができる。
+    """
+
+    LEVEL_COLUMN = 2
+    SOURCE_COLUMN = 3
+
+    # 何行ごとにまとめて解析し、進捗を通知するか
+    SCAN_BATCH = 20000
+
+    def __init__(self, path):
+        self.path = path
+        self.header = []
+        # レベル・ソースの列（タイムラインのCSVはチャネルの列の分だけ後ろになる）
+        self.level_column = self.LEVEL_COLUMN
+        self.source_column = self.SOURCE_COLUMN
+        # 各行の開始位置（末尾に最終行の終了位置を持つ）
+        self.offsets = array('Q')
+        # 各行のレベル・ソースの番号（level_names / source_names の添字）
+        self.levels = array('I')
+        self.sources = array('I')
+        self.level_names = []
+        self.source_names = []
+        self._file = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return max(len(self.offsets) - 1, 0)
+
+    def build(self, cancel_token=None, on_progress=None):
+        """CSVを先頭から走査して索引を作る（on_progress(読んだバイト数, ファイルサイズ) で進捗を通知）
+
+        メッセージ中の改行は引用符の数で判定し、1行として扱う。書き込み途中で終わっている最後の行は含めない。
+        """
+        level_ids = {}
+        source_ids = {}
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            first = f.readline()
+            self.header = next(csv.reader([first.decode('utf-8-sig', 'replace')]), [])
+            if "レベル" in self.header and "ソース" in self.header:
+                self.level_column = self.header.index("レベル")
+                self.source_column = self.header.index("ソース")
+            offset = len(first)
+            parts = []
+            quotes = 0
+            batch = []
+            for line in f:
+                parts.append(line)
+                quotes += line.count(b'"')
+                if quotes % 2:
+                    continue
+                record = parts[0] if len(parts) == 1 else b"".join(parts)
+                parts = []
+                quotes = 0
+                self.offsets.append(offset)
+                offset += len(record)
+                batch.append(record.decode('utf-8', 'replace'))
+                if len(batch) >= self.SCAN_BATCH:
+                    self._add_rows(batch, level_ids, source_ids)
+                    batch = []
+                    if cancel_token is not None:
+                        cancel_token.check()
+                    if on_progress is not None:
+                        on_progress(offset, size)
+            self._add_rows(batch, level_ids, source_ids)
+            self.offsets.append(offset)
+        if on_progress is not None:
+            on_progress(size, size)
+        return self
+
+    def _add_rows(self, lines, level_ids, source_ids):
+        for row in csv.reader(lines):
+            level = row[self.level_column] if len(row) > self.level_column else ""
+            source = row[self.source_column] if len(row) > self.source_column else ""
+            level_id = level_ids.get(level)
+            if level_id is None:
+                level_id = level_ids[level] = len(self.level_names)
+                self.level_names.append(level)
+            source_id = source_ids.get(source)
+            if source_id is None:
+                source_id = source_ids[source] = len(self.source_names)
+                self.source_names.append(source)
+            self.levels.append(level_id)
+            self.sources.append(source_id)
+
+    def view(self, levels=None, sources=None, sort_by=None, reverse=False):
+        """条件に合う行の番号（0始まり）を表示順に並べて返す
+
+        levels / sources は表示するレベル・ソース名の集合（None はすべて）。
+        sort_by は 'level'（重大度順）・'source'（名前順）・None（ファイルの順）。
+        同じレベル・ソースの行はファイルの順を保つ。
+        """
+        level_ok = self._ids(self.level_names, levels)
+        source_ok = self._ids(self.source_names, sources)
+        row_levels, row_sources = self.levels, self.sources
+        if level_ok is None and source_ok is None:
+            rows = array('I', range(len(self)))
+        elif source_ok is None:
+            rows = array('I', (row for row in range(len(self)) if row_levels[row] in level_ok))
+        elif level_ok is None:
+            rows = array('I', (row for row in range(len(self)) if row_sources[row] in source_ok))
+        else:
+            rows = array('I', (row for row in range(len(self))
+                               if row_levels[row] in level_ok and row_sources[row] in source_ok))
+        
+        if sort_by is None:
+            if reverse:
+                rows.reverse()
+            return rows
+        
+        # レベル・ソースの種類は少ないため、比較ソートではなく種類ごとに振り分けて並べる
+        if sort_by == 'level':
+            keys, names = row_levels, self.level_names
+            order = sorted(range(len(names)), key=lambda i: (
+                LEVEL_LABELS.index(names[i]) if names[i] in LEVEL_LABELS else len(LEVEL_LABELS), names[i]))
+        else:
+            keys, names = row_sources, self.source_names
+            order = sorted(range(len(names)), key=lambda i: names[i].casefold())
+        buckets = [array('I') for _ in names]
+        for row in rows:
+            buckets[keys[row]].append(row)
+        if reverse:
+            order.reverse()
+        sorted_rows = array('I')
+        for i in order:
+            sorted_rows.extend(buckets[i])
+        return sorted_rows
+
+    @staticmethod
+    def _ids(names, selected):
+        if selected is None:
+            return None
+        return {i for i, name in enumerate(names) if name in selected}
+
+    def read_rows(self, rows):
+        """指定した行の内容を読み込む（連続する行はまとめて1回で読む）"""
+        result = []
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'rb')
+            i = 0
+            while i < len(rows):
+                j = i + 1
+                while j < len(rows) and rows[j] == rows[j - 1] + 1:
+                    j += 1
+                start = self.offsets[rows[i]]
+                self._file.seek(start)
+                data = self._file.read(self.offsets[rows[j - 1] + 1] - start)
+                result.extend(csv.reader(io.StringIO(data.decode('utf-8', 'replace'), newline='')))
+                i = j
+        return result
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class SystemInfoCollector:
+    """OS・CPU・メモリ・ディスク・ネットワーク・更新プログラム・サービスの情報を
+    セクションごとに並列で取得し、テキストとJSONのレポートにまとめる
+
+    セクションはそれぞれ制限時間を持ち、時間内に終わらないものは待たずに
+    「タイムアウト」として飛ばす（応答しないネットワークドライブなどで全体が止まらないようにする）。
+    msinfo32 を使う場合はセクションと並行してバックグラウンドで実行し、期限を過ぎたら打ち切る。
+    cancel_token がキャンセルされた場合は取得済みのセクションだけでレポートを書き出して中断する。
+    """
+
+    # (キー, 見出し, 制限時間[秒])
+    SECTIONS = (
+        ("os", "OS", 5),
+        ("cpu", "CPU", 5),
+        ("memory", "メモリ", 5),
+        ("disks", "ディスク", 10),
+        ("network", "ネットワーク", 10),
+        ("updates", "更新プログラム", 30),
+        ("services", "サービス", 15),
+    )
+
+    MSINFO32_TIMEOUT = 300
+
+    def __init__(self, sections=None, timeout=None, msinfo32_timeout=None, cancel_token=None):
+        # sections: 取得するセクションのキー（省略時はすべて）、timeout: 全セクション共通の制限時間
+        keys = [key for key, _, _ in self.SECTIONS]
+        sections = list(sections or keys)
+        unknown = [key for key in sections if key not in keys]
+        if unknown:
+            raise ValueError(f"不明なセクションです: {', '.join(unknown)}")
+        self.sections = [(key, title, timeout or limit) for key, title, limit in self.SECTIONS if key in sections]
+        self.timeouts = dict((key, limit) for key, _, limit in self.sections)
+        self.msinfo32_timeout = msinfo32_timeout or self.MSINFO32_TIMEOUT
+        self.cancel_token = cancel_token or CancelToken()
+        self.checksums = {}   # 書き出したレポートのパス -> ハッシュとバイト数
+
+    def collect(self, text_file, json_file=None, phases=None, msinfo32_file=None):
+        """全セクションを取得してレポートを書き出し、セクションごとの結果を返す
+
+        phases にリストを渡した場合はセクションごと（と msinfo32）の計測結果を追加する。
+        すべてのセクションが失敗した場合は例外を、キャンセルされた場合は
+        レポートを書き出してから CollectionCancelled を送出する。
+        """
+        self.cancel_token.check()
+        phases = [] if phases is None else phases
+        msinfo32 = None
+        if msinfo32_file:
+            try:
+                msinfo32 = self._start_msinfo32(msinfo32_file)
+            except OSError as e:
+                phases.append({'name': "msinfo32", 'wall_seconds': 0.0, 'status': "error", 'error': str(e)})
+
+        # セクションごとにデーモンスレッドで実行する（タイムアウトしたスレッドは待たずに放置する）
+        started = time.perf_counter()
+        running = []
+        for key, title, timeout in self.sections:
+            holder = {}
+            thread = threading.Thread(target=self._run_section, args=(key, holder), daemon=True)
+            thread.start()
+            running.append((key, title, timeout, thread, holder))
+
+        sections = OrderedDict()
+        for key, title, timeout, thread, holder in running:
+            deadline = started + timeout
+            while thread.is_alive() and not self.cancel_token.cancelled and time.perf_counter() < deadline:
+                thread.join(min(0.1, max(0.0, deadline - time.perf_counter())))
+            if thread.is_alive():
+                if self.cancel_token.cancelled:
+                    section = {'status': "cancelled", 'error': "キャンセルされました"}
+                else:
+                    section = {'status': "timeout", 'error': f"{timeout}秒以内に取得できませんでした"}
+                phases.append({'name': key, 'wall_seconds': round(time.perf_counter() - started, 6),
+                               'status': section['status']})
+            else:
+                section = holder['section']
+                phases.append(holder['phase'])
+            section['title'] = title
+            sections[key] = section
+
+        with PhaseTimer("write") as phase:
+            report = {
+                'generated': datetime.now().isoformat(timespec='seconds'),
+                'sections': sections,
+            }
+            with open_hashed(text_file, 'w', encoding='utf-8') as f:
+                f.write(self.format_text(report))
+            self.checksums[text_file] = checksum_of(f)
+            if json_file:
+                with open_hashed(json_file, 'w', encoding='utf-8') as f:
+                    json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+                self.checksums[json_file] = checksum_of(f)
+            phase.info['bytes'] = sum(checksum['bytes'] for checksum in self.checksums.values())
+        phases.append(phase.to_dict())
+
+        if msinfo32 is not None:
+            phases.append(self._wait_msinfo32(msinfo32, msinfo32_file))
+
+        if self.cancel_token.cancelled:
+            raise CollectionCancelled("キャンセルされたため取得済みのセクションだけを出力しました", text_file)
+        if all(section['status'] != "ok" for section in sections.values()):
+            raise Exception("システム情報を取得できませんでした")
+        return sections
+
+    def _run_section(self, key, holder):
+        with PhaseTimer(key) as phase:
+            try:
+                holder['section'] = {'status': "ok", 'data': getattr(self, f"section_{key}")()}
+            except Exception as e:
+                holder['section'] = {'status': "error", 'error': str(e)}
+            phase.info['status'] = holder['section']['status']
+        holder['phase'] = phase.to_dict()
+
+    def _start_msinfo32(self, output_file):
+        """msinfo32 /report をバックグラウンドで開始する"""
+        process = subprocess.Popen(["msinfo32", "/report", output_file],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return process, time.perf_counter()
+
+    def _wait_msinfo32(self, msinfo32, output_file):
+        """期限まで msinfo32 の終了を待ち、過ぎた場合は打ち切る"""
+        process, started = msinfo32
+        phase = {'name': "msinfo32"}
+        unregister = self.cancel_token.register(process.kill)
+        try:
+            phase['returncode'] = process.wait(max(0.0, started + self.msinfo32_timeout - time.perf_counter()))
+            if self.cancel_token.cancelled:
+                phase['status'] = "cancelled"
+            elif phase['returncode'] == 0 and os.path.exists(output_file):
+                phase['status'] = "ok"
+            else:
+                phase['status'] = "error"
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            phase['status'] = "timeout"
+        finally:
+            unregister()
+        phase['wall_seconds'] = round(time.perf_counter() - started, 6)
+        return phase
+
+    @staticmethod
+    def format_text(report):
+        """レポートをセクションごとの見出し付きテキストにする"""
+        lines = ["=== システム情報 ===", f"取得日時: {report['generated']}", ""]
+        for section in report['sections'].values():
+            lines.append(f"=== {section['title']} ===")
+            if section['status'] == "timeout":
+                lines.append(f"（タイムアウト: {section['error']}）")
+            elif section['status'] == "cancelled":
+                lines.append("（キャンセルされたため省略）")
+            elif section['status'] != "ok":
+                lines.append(f"（取得失敗: {section['error']}）")
+            elif isinstance(section['data'], dict):
+                width = max((len(name) for name in section['data']), default=0)
+                lines.extend(f"{name.ljust(width)} : {value}" for name, value in section['data'].items())
+            else:
+                lines.extend(_format_table(row.values() for row in section['data']))
+            lines.append("")
+        return "\n".join(lines)
+
+    def section_os(self):
+        info = OrderedDict([
+            ('hostname', socket.gethostname()),
+            ('system', platform.system()),
+            ('release', platform.release()),
+            ('version', platform.version()),
+            ('machine', platform.machine()),
+        ])
+        info.update(_registry_values(r"SOFTWARE\Microsoft\Windows NT\CurrentVersion",
+                                     ("ProductName", "DisplayVersion", "CurrentBuild", "RegisteredOwner")))
+        uptime = _uptime_seconds()
+        if uptime is not None:
+            info['boot_time'] = (datetime.now() - timedelta(seconds=uptime)).isoformat(timespec='seconds')
+        return info
+
+    def section_cpu(self):
+        info = OrderedDict([
+            ('processor', platform.processor()),
+            ('logical_processors', os.cpu_count()),
+        ])
+        registry = _registry_values(r"HARDWARE\DESCRIPTION\System\CentralProcessor\0",
+                                    ("ProcessorNameString", "~MHz"))
+        if registry:
+            info['name'] = registry.get("ProcessorNameString", "").strip()
+            info['mhz'] = registry.get("~MHz")
+        elif os.path.exists("/proc/cpuinfo"):
+            with open("/proc/cpuinfo", encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    if line.startswith("model name"):
+                        info['name'] = line.split(":", 1)[1].strip()
+                        break
+        return info
+
+    def section_memory(self):
+        if sys.platform == "win32":
+            import ctypes
+
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [
+                    ("dwLength", ctypes.c_ulong),
+                    ("dwMemoryLoad", ctypes.c_ulong),
+                    ("ullTotalPhys", ctypes.c_ulonglong),
+                    ("ullAvailPhys", ctypes.c_ulonglong),
+                    ("ullTotalPageFile", ctypes.c_ulonglong),
+                    ("ullAvailPageFile", ctypes.c_ulonglong),
+                    ("ullTotalVirtual", ctypes.c_ulonglong),
+                    ("ullAvailVirtual", ctypes.c_ulonglong),
+                    ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+                ]
+
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                raise ctypes.WinError()
+            return OrderedDict([
+                ('total', format_bytes(status.ullTotalPhys)),
+                ('available', format_bytes(status.ullAvailPhys)),
+                ('load_percent', status.dwMemoryLoad),
+                ('page_file_total', format_bytes(status.ullTotalPageFile)),
+                ('page_file_available', format_bytes(status.ullAvailPageFile)),
+            ])
+        page_size = os.sysconf("SC_PAGE_SIZE")
+        return OrderedDict([
+            ('total', format_bytes(page_size * os.sysconf("SC_PHYS_PAGES"))),
+            ('available', format_bytes(page_size * os.sysconf("SC_AVPHYS_PAGES"))),
+        ])
+
+    def section_disks(self):
+        disks = []
+        for root, drive_type in _disk_roots():
+            try:
+                usage = shutil.disk_usage(root)
+            except OSError:
+                continue
+            disks.append(OrderedDict([
+                ('drive', root),
+                ('type', drive_type),
+                ('total', format_bytes(usage.total)),
+                ('used', format_bytes(usage.used)),
+                ('free', format_bytes(usage.free)),
+                ('used_percent', f"{usage.used * 100 / usage.total:.1f}%" if usage.total else "-"),
+            ]))
+        return disks
+
+    def section_network(self):
+        hostname = socket.gethostname()
+        addresses = []
+        for _, _, _, _, sockaddr in socket.getaddrinfo(hostname, None):
+            address = sockaddr[0]
+            if address not in addresses:
+                addresses.append(address)
+        return OrderedDict([
+            ('hostname', hostname),
+            ('fqdn', socket.getfqdn()),
+            ('addresses', ", ".join(addresses)),
+        ])
+
+    def section_updates(self):
+        command = ["powershell", "-NoProfile", "-NonInteractive", "-Command",
+                   "Get-HotFix | Select-Object HotFixID,Description,InstalledOn | ConvertTo-Csv -NoTypeInformation"]
+        result = run_process(command, timeout=self.timeouts['updates'], cancel_token=self.cancel_token,
+                             text=True, errors='replace')
+        if result.returncode != 0:
+            raise Exception(result.stderr.strip() or f"Get-HotFix が失敗しました（終了コード {result.returncode}）")
+        return [OrderedDict([('id', row.get('HotFixID', "")),
+                             ('description', row.get('Description', "")),
+                             ('installed_on', row.get('InstalledOn', ""))])
+                for row in csv.DictReader(result.stdout.splitlines())]
+
+    def section_services(self):
+        import win32service
+        manager = win32service.OpenSCManager(None, None, win32service.SC_MANAGER_ENUMERATE_SERVICE)
+        try:
+            services = win32service.EnumServicesStatus(manager)
+        finally:
+            win32service.CloseServiceHandle(manager)
+        states = {
+            win32service.SERVICE_RUNNING: "Running",
+            win32service.SERVICE_STOPPED: "Stopped",
+            win32service.SERVICE_PAUSED: "Paused",
+        }
+        return [OrderedDict([('name', name), ('state', states.get(status[1], "Pending")), ('display_name', display)])
+                for name, display, status in sorted(services)]
+
+
+def _registry_values(path, names):
+    """HKEY_LOCAL_MACHINE のキーから値を読み出す（Windows以外・読めない値は含めない）"""
+    try:
+        import winreg
+    except ImportError:
+        return {}
+    values = OrderedDict()
+    try:
+        with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, path) as key:
+            for name in names:
+                try:
+                    values[name] = winreg.QueryValueEx(key, name)[0]
+                except OSError:
+                    pass
+    except OSError:
+        pass
+    return values
+
+
+def _uptime_seconds():
+    """起動してからの秒数（取得できない場合はNone）"""
+    if sys.platform == "win32":
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        kernel32.GetTickCount64.restype = ctypes.c_ulonglong
+        return kernel32.GetTickCount64() / 1000
+    try:
+        with open("/proc/uptime") as f:
+            return float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# GetDriveType の戻り値（リムーバブル・CD-ROM はメディアの確認で待たされるため対象外）
+_DRIVE_TYPES = {3: "fixed", 4: "remote", 6: "ramdisk"}
+
+
+def _disk_roots():
+    """容量を調べるドライブと種類の一覧（Windows以外は / のみ）"""
+    if sys.platform != "win32":
+        return [("/", "fixed")]
+    import ctypes
+    kernel32 = ctypes.windll.kernel32
+    roots = []
+    mask = kernel32.GetLogicalDrives()
+    for i in range(26):
+        if mask & (1 << i):
+            root = f"{chr(ord('A') + i)}:\\"
+            drive_type = _DRIVE_TYPES.get(kernel32.GetDriveTypeW(root))
+            if drive_type:
+                roots.append((root, drive_type))
+    return roots
+
+
+class Collector:
+    """イベントログ・システム情報の収集処理（GUI・CLI共通）"""
+    
+    DEFAULT_CHANNELS = ("System", "Application")
+    
+    # イベントログを同時に読み込むワーカー数の上限
+    MAX_CHANNEL_WORKERS = 4
+    
+    # 稼働中のイベントログの読み込み方式（legacy: ReadEventLog, evtquery: EvtQuery/EvtNext）
+    READERS = ("legacy", "evtquery")
+    
+    def __init__(self, output_root=None, max_workers=None, reader="legacy", batch_size=None, profile=False,
+                 msinfo32=False, sysinfo_timeout=None, index_events=False, part_bytes=None, part_rows=None,
+                 formats=("csv",)):
+        # 出力フォルダの設定（フォルダは最初に出力するときに作成する）
+        self.output_root = os.path.abspath(output_root or os.getcwd())
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M")
+        self._output_folder = os.path.join(self.output_root, timestamp)
+        
+        # 差分取得用のブックマーク（出力ルートに保存）
+        self.bookmarks = BookmarkStore(self.output_root)
+        
+        # イベントメッセージのキャッシュ（スレッド間で共有）
+        self.message_cache = MessageFormatCache(Win32MessageFormatter())
+        
+        self.max_workers = max_workers or self.MAX_CHANNEL_WORKERS
+        
+        if reader not in self.READERS:
+            raise ValueError(f"不明な読み込み方式です: {reader}")
+        self.reader = reader
+        self.batch_size = batch_size or EvtQuerySource.DEFAULT_BATCH_SIZE
+        
+        # 進捗の通知先（ProgressQueue、Noneなら通知しない）
+        self.progress = None
+        
+        # Trueの場合はイベントログの各ステージの cProfile の結果を出力フォルダに保存する
+        self.profile = profile
+        
+        # システム情報: msinfo32 のレポートも（期限付きで）出力するか、セクションごとの制限時間
+        self.msinfo32 = msinfo32
+        self.sysinfo_timeout = sysinfo_timeout
+        
+        # 実行中の収集を止めるためのトークン（GUIでは実行のたびに作り直す）
+        self.cancel_token = CancelToken()
+        
+        # 直前に使ったタイムスタンプと連番（同じ秒の収集でファイル名が重ならないようにする）
+        self._last_timestamp = [None, 1]
+        self._timestamp_lock = threading.Lock()
+        
+        # イベントログのCSVを分けるサイズ・行数（どちらもNoneなら1つのファイルに出力する、差分取得は対象外）
+        self.part_bytes = part_bytes
+        self.part_rows = part_rows
+        
+        # イベントログの出力形式（EXPORT_FORMATS の名前、差分取得はCSVのみ）
+        self.formats = self._check_formats(formats or ("csv",))
+        
+        # 出力したイベントを検索用の索引にも登録するか（出力と同じ量を書き込むため既定では登録しない。
+        # 登録しなかったCSVも検索時に取り込む）。索引は最初に使うときに出力ルートに作成する
+        self.index_events = index_events
+        self._search_index = None
+        self._search_index_lock = threading.Lock()
+    
+    def _progress_task(self, name, total, limit):
+        """進捗の通知先があればジョブの進捗を作成する"""
+        if self.progress is None:
+            return None
+        if limit is not None:
+            total = limit if total is None else min(total, limit)
+        return self.progress.task(name, total)
+    
+    def open_source(self, log_name, event_filter=None, reader=None):
+        """稼働中のイベントログを選択された方式（reader を省略した場合は self.reader）で開く"""
+        if (reader or self.reader) == "evtquery":
+            return EvtQuerySource(log_name, event_filter=event_filter, batch_size=self.batch_size)
+        return Win32EventLogSource(log_name)
+    
+    @property
+    def output_folder(self):
+        """タイムスタンプ付きの出力フォルダ（初回参照時に作成する）"""
+        if not os.path.exists(self._output_folder):
+            os.makedirs(self._output_folder, exist_ok=True)
+        return self._output_folder
+    
+    def collect(self, channels=None, systeminfo=True, limit=1000, incremental=False, evtx_files=(),
+                event_filter=None, channel_limits=None, timeline=False, formats=None):
+        """イベントログ・.evtxファイル・システム情報を同時に収集し、ジョブごとの結果を返す
+        
+        channels を省略した場合、.evtxファイルの指定がなければ System と Application を収集する。
+        チャネルごとに出力ファイル・件数上限（channel_limits で個別に指定可）・結果を持ち、
+        上限 max_workers のワーカーで並列に読み込むため、1つのチャネルの遅延やアクセス拒否が
+        他のチャネルを妨げない。
+        event_filter（EventFilter）を指定した場合は条件に合うイベントだけを出力する。
+        formats（省略した場合は self.formats）を複数指定した場合は、1回の読み込みで形式ごとに出力する。
+        成功したジョブの value は {'file': 出力ファイル, 'events': 件数} の辞書（'files' は形式ごとの出力ファイル）。
+        cancel_token がキャンセルされたジョブは CollectionCancelled で失敗する。
+        timeline が True の場合は、出力できたイベントログを日時順に1つにまとめた
+        Timeline_<タイムスタンプ>.csv も出力し、その結果を最後のジョブとして加える（差分取得は対象外）。
+        """
+        if channels is None:
+            channels = () if evtx_files else self.DEFAULT_CHANNELS
+        channel_limits = channel_limits or {}
+        started = datetime.now()
+        timestamp = self._new_timestamp(started)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        
+        # システム情報は専用のワーカーで最初に開始する
+        log_jobs = len(channels) + len(evtx_files)
+        scheduler = JobScheduler(max_workers=min(self.max_workers, max(log_jobs, 1)) + (1 if systeminfo else 0))
+        
+        if systeminfo:
+            output_file = os.path.join(self.output_folder, f"SystemInfo_{timestamp}.txt")
+            scheduler.add("システム情報", self._export_systeminfo_job, output_file)
+        
+        for log_name in channels:
+            channel_limit = channel_limits.get(log_name, limit)
+            if incremental:
+                scheduler.add(f"{log_name}イベントログ", self._export_channel_incremental,
+                              log_name, channel_limit, event_filter)
+            else:
+                output_file = os.path.join(
+                    self.output_folder, f"{channel_filename(log_name)}_EventLog_{timestamp}.csv"
+                )
+                scheduler.add(f"{log_name}イベントログ", self._export_channel,
+                              log_name, output_file, channel_limit, event_filter, formats)
+        
+        for evtx_file in evtx_files:
+            stem = os.path.splitext(os.path.basename(evtx_file))[0]
+            output_file = os.path.join(self.output_folder, f"{stem}_Evtx_{timestamp}.csv")
+            scheduler.add(os.path.basename(evtx_file), self._export_evtx, evtx_file, output_file, limit, event_filter,
+                          formats)
+        
+        results = scheduler.run(self.cancel_token)
+        
+        # チャネルごとのCSVを書き終えてから、それらを読んでタイムラインにまとめる
+        if timeline and not incremental:
+            streams = [(result.value['channel'], export_csv_files(result.value['files']['csv']))
+                       for result in results if result.ok and 'csv' in result.value.get('files', ())]
+            if streams:
+                output_file = os.path.join(self.output_folder, f"Timeline_{timestamp}.csv")
+                scheduler.add("タイムライン", self._export_timeline, output_file, streams)
+                results += scheduler.run(self.cancel_token)
+        
+        self.save_run_manifest({
+            'kind': "collect",
+            'started': started.isoformat(timespec='seconds'),
+            'wall_seconds': round(time.perf_counter() - wall_start, 6),
+            'cpu_seconds': round(time.process_time() - cpu_start, 6),
+            'options': {
+                'channels': list(channels),
+                'channel_limits': channel_limits,
+                'evtx_files': list(evtx_files),
+                'systeminfo': systeminfo,
+                'limit': limit,
+                'incremental': incremental,
+                'timeline': timeline,
+                'formats': self._check_formats(formats or self.formats),
+                'reader': self.reader,
+                'filter': event_filter.describe() if event_filter is not None else "なし",
+            },
+            'message_cache': self.message_cache.stats(),
+            'jobs': [self._job_manifest(result) for result in results],
+        })
+        return results
+    
+    # フリート収集で同時に接続するホスト数・ホストごとの制限時間（秒）・接続の再試行回数の既定値
+    MAX_HOSTS = 8
+    HOST_TIMEOUT = 600
+    HOST_RETRIES = 2
+    
+    def collect_fleet(self, hosts, channels=None, limit=1000, incremental=False, event_filter=None,
+                      channel_limits=None, max_hosts=None, host_timeout=None, retries=None, retry_delay=2.0,
+                      timeline=False):
+        """複数のホストからイベントログを同時に収集し、ホストごとの結果を返す
+        
+        同時に接続するホストは max_hosts 台まで（ホスト内のチャネルは1つの接続で順に読み込む）。
+        host_timeout 秒を過ぎたホストはキャンセルし、書き込み済みの分までを残す。
+        出力は出力フォルダのホスト名のサブフォルダに書き込む（timeline の場合はホストごとにタイムラインも出力する）。
+        成功したジョブの value は {'host', 'folder', 'results'（チャネルごとの JobResult）, 'events',
+        'timed_out', 'attempts'} の辞書。
+        """
+        started = datetime.now()
+        wall_start = time.perf_counter()
+        host_timeout = self.HOST_TIMEOUT if host_timeout is None else host_timeout
+        retries = self.HOST_RETRIES if retries is None else retries
+        
+        scheduler = JobScheduler(max_workers=max_hosts or self.MAX_HOSTS)
+        for host in hosts:
+            scheduler.add(host, self._collect_host, host, channels, limit, incremental, event_filter,
+                          channel_limits, host_timeout, retries, retry_delay, timeline)
+        results = scheduler.run(self.cancel_token)
+        
+        self.save_run_manifest({
+            'kind': "fleet",
+            'started': started.isoformat(timespec='seconds'),
+            'wall_seconds': round(time.perf_counter() - wall_start, 6),
+            'options': {
+                'hosts': list(hosts),
+                'channels': list(channels) if channels is not None else list(self.DEFAULT_CHANNELS),
+                'limit': limit,
+                'incremental': incremental,
+                'timeline': timeline,
+                'reader': self.reader,
+                'max_hosts': max_hosts or self.MAX_HOSTS,
+                'host_timeout': host_timeout,
+                'retries': retries,
+                'filter': event_filter.describe() if event_filter is not None else "なし",
+            },
+            'hosts': [self._host_manifest(result) for result in results],
+        })
+        return results
+    
+    def _collect_host(self, host, channels, limit, incremental, event_filter, channel_limits, host_timeout,
+                      retries, retry_delay, timeline):
+        """1台のホストを収集する（制限時間を過ぎたらそのホストだけをキャンセルする）"""
+        collector = HostCollector(self, host, retries=retries, retry_delay=retry_delay)
+        timed_out = threading.Event()
+        
+        def on_timeout():
+            timed_out.set()
+            collector.cancel_token.cancel()
+        
+        unregister = self.cancel_token.register(collector.cancel_token.cancel)
+        timer = threading.Timer(host_timeout, on_timeout) if host_timeout else None
+        if timer is not None:
+            timer.daemon = True
+            timer.start()
+        try:
+            results = collector.collect(
+                channels=channels,
+                systeminfo=False,
+                limit=limit,
+                incremental=incremental,
+                event_filter=event_filter,
+                channel_limits=channel_limits,
+                timeline=timeline
+            )
+        finally:
+            if timer is not None:
+                timer.cancel()
+            unregister()
+            collector.close()
+        return {
+            'host': host,
+            'folder': collector.output_root if incremental else collector._output_folder,
+            'results': results,
+            'events': sum(r.value['events'] for r in results if r.ok and r.value.get('channel')),
+            'timed_out': timed_out.is_set(),
+            'attempts': collector.connection.attempts,
+        }
+    
+    @staticmethod
+    def _host_manifest(result):
+        """ホスト1台分の記録"""
+        host = {'host': result.name, 'ok': result.ok, 'elapsed_seconds': round(result.elapsed, 6)}
+        if not result.ok:
+            host['error'] = str(result.error)
+            return host
+        value = result.value
+        host['ok'] = all(r.ok for r in value['results'])
+        host.update(folder=value['folder'], events=value['events'], timed_out=value['timed_out'],
+                    attempts=value['attempts'])
+        failures = {r.name: str(r.error) for r in value['results'] if not r.ok}
+        if failures:
+            host['errors'] = failures
+        return host
+    
+    def find_interrupted(self):
+        """異常終了して続きから出力できるエクスポートのチェックポイントを (パス, 内容) のリストで返す"""
+        return ExportCheckpoint.find(self.output_root)
+    
+    def resume_interrupted(self, checkpoints=None):
+        """異常終了したエクスポートを続きから出力し、ジョブごとの結果を返す
+        
+        checkpoints を省略した場合は find_interrupted() で探す。成功したジョブの value は collect() と
+        同じ形式（'events' は中断前の分を含む件数）。出力ファイルが見つからない・チェックポイントと
+        一致しないものは再開できないため、チェックポイントを削除して失敗とする。
+        実行の記録は再開した出力のフォルダの run_manifest.json に追記する。
+        """
+        if checkpoints is None:
+            checkpoints = self.find_interrupted()
+        started = datetime.now()
+        wall_start = time.perf_counter()
+        
+        scheduler = JobScheduler(max_workers=min(self.max_workers, max(len(checkpoints), 1)))
+        for path, state in checkpoints:
+            host = f"{state['host']} " if state.get('host') else ""
+            scheduler.add(f"{host}{state['log_name']}イベントログ（再開）", self._resume_job, path, state)
+        results = scheduler.run(self.cancel_token)
+        
+        folders = OrderedDict()
+        for (path, _), result in zip(checkpoints, results):
+            folders.setdefault(os.path.dirname(path), []).append(self._job_manifest(result))
+        for folder, jobs in folders.items():
+            try:
+                RunManifest(folder).append({
+                    'kind': "resume",
+                    'started': started.isoformat(timespec='seconds'),
+                    'wall_seconds': round(time.perf_counter() - wall_start, 6),
+                    'message_cache': self.message_cache.stats(),
+                    'jobs': jobs,
+                })
+            except OSError:
+                pass
+        return results
+    
+    def _resume_job(self, checkpoint_path, state):
+        # フリート収集の出力はそのホストに接続し直して再開する
+        collector = self
+        if state.get('host'):
+            collector = HostCollector(self, state['host'], reader=state.get('reader'))
+            unregister = self.cancel_token.register(collector.cancel_token.cancel)
+        base_file = os.path.join(os.path.dirname(checkpoint_path), state['file'])
+        try:
+            files, stats = collector.resume_eventlog(checkpoint_path, state)
+        except ValueError:
+            ExportCheckpoint(base_file, None).remove()
+            raise
+        finally:
+            if collector is not self:
+                unregister()
+                collector.close()
+        return {'file': next(iter(files.values())), 'files': files, 'events': state['rows'] + stats['write'].items,
+                'stats': stats, 'bytes': stats['write'].bytes, 'summary': summary_file(base_file)}
+    
+    def _new_timestamp(self, started):
+        """出力ファイル名に付けるタイムスタンプ（同じ秒に続けて収集した場合も重ならないよう連番を付ける）"""
+        timestamp = started.strftime("%Y%m%d_%H%M%S")
+        with self._timestamp_lock:
+            if timestamp == self._last_timestamp[0]:
+                self._last_timestamp[1] += 1
+                return f"{timestamp}_{self._last_timestamp[1]}"
+            self._last_timestamp = [timestamp, 1]
+        return timestamp
+    
+    @staticmethod
+    def _job_manifest(result):
+        """ジョブ1件分の記録（フェーズごとの計測結果を含む）"""
+        job = {'name': result.name, 'ok': result.ok, 'elapsed_seconds': round(result.elapsed, 6)}
+        if result.ok:
+            value = result.value
+            job['file'] = value.get('file')
+            if len(value.get('files') or ()) > 1:
+                job['files'] = list(value['files'].values())
+            if value.get('summary'):
+                job['summary'] = value['summary']
+            if value.get('events') is not None:
+                job['events'] = value['events']
+            if value.get('bytes') is not None:
+                job['bytes'] = value['bytes']
+            elif value.get('file') and os.path.exists(value['file']):
+                job['bytes'] = os.path.getsize(value['file'])
+            if 'stats' in value:
+                job['phases'] = [stage.to_dict() for stage in value['stats'].values()]
+            elif 'phases' in value:
+                job['phases'] = value['phases']
+        else:
+            job['error'] = str(result.error)
+            if isinstance(result.error, CollectionCancelled):
+                job['cancelled'] = True
+                job['file'] = result.error.output_file
+            if getattr(result.error, 'phases', None):
+                job['phases'] = result.error.phases
+        return job
+    
+    def save_run_manifest(self, run):
+        """出力フォルダの run_manifest.json に実行1回分の記録を追記する（失敗しても収集は続ける）"""
+        try:
+            RunManifest(self.output_folder).append(run)
+        except OSError:
+            pass
+    
+    def save_checksum(self, path, checksum):
+        """出力ファイルのハッシュを同じフォルダの checksums.json に記録する（失敗しても収集は続ける）"""
+        try:
+            ChecksumManifest(os.path.dirname(path)).record(path, checksum)
+        except OSError:
+            pass
+    
+    def _profile_prefix(self, log_name):
+        """cProfile の結果の保存先（プロファイルしない場合はNone）"""
+        if not self.profile:
+            return None
+        return os.path.join(self.output_folder, f"profile_{channel_filename(log_name)}")
+    
+    def _export_systeminfo_job(self, output_file):
+        task = self._progress_task("システム情報", None, None)
+        phases = []
+        try:
+            self.export_systeminfo(output_file, phases)
+        except Exception as e:
+            # 失敗した場合も run_manifest.json にコマンドごとの計測結果を残す
+            e.phases = phases
+            raise
+        if task is not None:
+            task.finish(bytes_written=os.path.getsize(output_file))
+        return {'file': output_file, 'phases': phases}
+    
+    def _export_channel(self, log_name, output_file, limit, event_filter, formats):
+        stats = self.get_eventlog(log_name, output_file, limit=limit, event_filter=event_filter, formats=formats)
+        return self._export_value(output_file, stats, log_name, formats)
+    
+    def _export_evtx(self, evtx_file, output_file, limit, event_filter, formats):
+        source = EvtxFileSource(evtx_file)
+        stats = self.get_eventlog(source.log_name, output_file, limit=limit, source=source, event_filter=event_filter,
+                                  formats=formats)
+        value = self._export_value(output_file, stats, os.path.basename(evtx_file), formats)
+        value['skipped'] = source.skipped
+        return value
+    
+    def _export_value(self, output_file, stats, channel, formats):
+        """get_eventlog() の結果（'files' は形式ごとの出力ファイル、'file' は最初の形式のもの、'bytes' はその合計）
+        
+        CSVをパートに分けた場合の出力ファイルはパートの一覧。'channel' はタイムラインでその行の出力元として表示する名前。
+        """
+        files = export_files(output_file, self._check_formats(formats or self.formats), self.part_bytes or self.part_rows)
+        return {'file': next(iter(files.values())), 'files': files, 'events': stats['write'].items, 'stats': stats,
+                'bytes': stats['write'].bytes, 'summary': summary_file(output_file), 'channel': channel}
+    
+    def _export_channel_incremental(self, log_name, limit, event_filter):
+        output_file, stats = self._eventlog_incremental(log_name, limit, event_filter)
+        return {'file': output_file, 'events': stats['write'].items, 'stats': stats,
+                'summary': summary_file(output_file), 'channel': log_name}
+    
+    def _export_timeline(self, output_file, streams):
+        """エクスポートしたCSVを merge_timeline() で1つにまとめる（キャンセルした場合は途中までのファイルを消す）"""
+        self.cancel_token.check()
+        task = self._progress_task("タイムライン", None, None)
+        try:
+            count, checksum = merge_timeline(streams, output_file, self.cancel_token)
+        except BaseException:
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            raise
+        self.save_checksum(output_file, checksum)
+        if task is not None:
+            task.finish(count, checksum['bytes'])
+        return {'file': output_file, 'events': count, 'bytes': checksum['bytes']}
+    
+    def export_systeminfo(self, output_file, phases=None):
+        """システム情報をセクションごとに並列で取得し、テキスト（output_file）とJSONに出力する
+        
+        制限時間内に取得できなかったセクションは飛ばす。msinfo32 が有効な場合は
+        <出力ファイル名>_msinfo32.txt をバックグラウンドで期限付きで出力する。
+        phases にリストを渡した場合はセクションごとの計測結果を追加する。
+        """
+        stem = os.path.splitext(output_file)[0]
+        collector = SystemInfoCollector(timeout=self.sysinfo_timeout, cancel_token=self.cancel_token)
+        try:
+            collector.collect(
+                output_file,
+                json_file=f"{stem}.json",
+                phases=phases,
+                msinfo32_file=f"{stem}_msinfo32.txt" if self.msinfo32 else None
+            )
+        finally:
+            for path, checksum in collector.checksums.items():
+                self.save_checksum(path, checksum)
+        return output_file
+    
+    def get_eventlog(self, log_name, output_file, limit=1000, source=None, event_filter=None, formats=None):
+        """指定されたイベントログを取得してCSVなどに保存する（ステージごとの統計を返す）
+        
+        source を省略した場合は稼働中のイベントログを open_source() で開いて読み込む。
+        formats（EXPORT_FORMATS の名前、省略した場合は self.formats）を複数指定した場合は、1回の読み込みと
+        整形の結果を FanOutWriter で形式ごとの書き込み先に渡し、output_file の拡張子を替えたファイルにも出力する。
+        同じ読み込みで集計した結果を <名前>_summary.txt に出力する。
+        part_bytes・part_rows が設定されている場合は CSV を RotatingCsvWriter でパートに分けて書き込み、
+        パートの一覧を parts_index_file(output_file) に保存する。
+        キャンセルされた場合は書き込み済みの行までを <名前>.partial.csv（パートに分けた場合は
+        最後のパート）などとして閉じ、CollectionCancelled を送出する。
+        書き込み中は ExportCheckpoint で途中経過を定期的に保存し、プロセスが異常終了した場合は
+        resume_eventlog() で続きから出力できる。
+        """
+        self.cancel_token.check()
+        formats = self._check_formats(formats or self.formats)
+        if source is None:
+            source = self.open_source(log_name, event_filter)
+        
+        checkpoint = ExportCheckpoint(output_file, {
+            'log_name': log_name,
+            'file': os.path.basename(output_file),
+            'evtx': os.path.abspath(source.path) if isinstance(source, EvtxFileSource) else None,
+            'host': getattr(self, 'host', None),
+            'reader': self.reader,
+            'limit': limit,
+            'filter': event_filter.to_dict() if event_filter is not None else None,
+            'formats': formats,
+            'part_bytes': self.part_bytes,
+            'part_rows': self.part_rows,
+            'started': datetime.now().isoformat(timespec='seconds'),
+        })
+        return self._write_eventlog(log_name, output_file, source, limit, event_filter, formats, checkpoint)
+    
+    def _check_formats(self, formats):
+        """出力形式を EXPORT_FORMATS の順に並べて返す（不明な形式は ValueError）"""
+        unknown = [name for name in formats if name not in EXPORT_FORMATS]
+        if unknown:
+            raise ValueError(f"不明な出力形式です: {', '.join(unknown)}")
+        return [name for name in EXPORT_FORMATS if name in formats]
+    
+    def resume_eventlog(self, checkpoint_path, state, source=None):
+        """異常終了したエクスポートをチェックポイント（ExportCheckpoint の内容）の続きから出力する
+        
+        出力を記録した位置まで切り詰め、最後に書き込んだイベントより古いイベントから読み込みを
+        再開する（ログを最初から読み直さない）。集計は中断前に書き込んだ行も含めて作り直す。
+        ({形式: 出力ファイル（CSVをパートに分けた場合はパートの一覧）}, ステージごとの統計) を返す。
+        """
+        self.cancel_token.check()
+        if 'outputs' not in state:
+            # 出力形式を選べるようになる前のチェックポイント（CSVのみ）
+            state = dict(state, formats=['csv'], outputs={'csv': state})
+        log_name = state['log_name']
+        event_filter = EventFilter.from_dict(state['filter']) if state.get('filter') else None
+        if source is None:
+            if state.get('evtx'):
+                source = EvtxFileSource(state['evtx'])
+            else:
+                # 中断前と同じ読み込み方式で開く（メッセージの整形方法をそろえる）
+                source = self.open_source(log_name, event_filter, state.get('reader'))
+        output_file = os.path.join(os.path.dirname(checkpoint_path), state['file'])
+        checkpoint = ExportCheckpoint(output_file, {key: value for key, value in state.items()
+                                                    if key not in ('outputs', 'parts', 'offset', 'sha256', 'rows',
+                                                                   'last_record', 'updated')})
+        stats = self._write_eventlog(log_name, output_file, source, state['limit'], event_filter, state['formats'],
+                                     checkpoint, state)
+        return export_files(output_file, state['formats'], state['part_bytes'] or state['part_rows']), stats
+    
+    def _open_writers(self, log_name, output_file, formats, part_bytes, part_rows, resume):
+        """形式ごとの書き込み先を開いて FanOutWriter にまとめる（途中で失敗した場合は開いた分を閉じる）"""
+        files = export_files(output_file, formats)
+        outputs = resume['outputs'] if resume is not None else {}
+        writers = {}
+        try:
+            for name in formats:
+                if name == 'csv':
+                    # 索引への登録は書き込み先のパートが決まる書き込みステージで行う
+                    writers[name] = RotatingCsvWriter(
+                        output_file,
+                        ['日時', 'イベントID', 'レベル', 'ソース', 'メッセージ'],
+                        max_bytes=part_bytes,
+                        max_rows=part_rows,
+                        open_indexer=lambda path, keep_from: self.open_index_writer(path, log_name,
+                                                                                    keep_from_record=keep_from),
+                        resume=outputs.get(name)
+                    )
+                elif name == 'jsonl':
+                    writers[name] = JsonLinesWriter(files[name], log_name, resume=outputs.get(name))
+                else:
+                    writers[name] = SqliteEventWriter(files[name], log_name, resume=outputs.get(name))
+        except BaseException:
+            for writer in writers.values():
+                writer.abort()
+            raise
+        return FanOutWriter(writers, resume)
+    
+    def _write_eventlog(self, log_name, output_file, source, limit, event_filter, formats, checkpoint, resume=None):
+        """source のイベントを形式ごとに出力する（resume にチェックポイントの内容を渡した場合は続きから）"""
+        if not checkpoint.acquire():
+            source.close()
+            raise RuntimeError(f"他のプロセスが出力中です: {output_file}")
+        with source:
+            if resume is not None and resume['last_record'] is not None:
+                batches = source.batches_before(resume['last_record'])
+            else:
+                batches = source.batches()
+            if event_filter is not None and event_filter.active:
+                batches = event_filter.apply(batches)
+            
+            try:
+                writer = self._open_writers(
+                    log_name, output_file, formats,
+                    self.part_bytes if resume is None else resume['part_bytes'],
+                    self.part_rows if resume is None else resume['part_rows'],
+                    resume
+                )
+            except BaseException:
+                checkpoint.release()
+                raise
+            summary = EventSummary(log_name)
+            if resume is not None:
+                for event in writer.read_events():
+                    summary.add(event)
+                if limit is not None:
+                    limit -= writer.rows
+                    if limit <= 0:
+                        batches, limit = (), None
+            
+            pipeline = None
+            try:
+                # 整形ステージはメッセージまでを作り、形式ごとの行への変換は各書き込み先が行う
+                def format_event(event):
+                    summary.add(event)
+                    return event, self.event_message(event, log_name, source.format_message)
+                
+                task = self._progress_task(log_name, source.count(), limit)
+                progress = self._progress_callback(task, writer)
+                
+                def on_write(stats):
+                    checkpoint.save(writer)
+                    if progress is not None:
+                        progress(stats)
+                
+                checkpoint.save(writer, force=True)
+                pipeline = EventPipeline(
+                    batches,
+                    format_event,
+                    writer.writerows,
+                    limit=limit,
+                    on_write=on_write,
+                    profile_prefix=self._profile_prefix(log_name),
+                    cancel_token=self.cancel_token
+                )
+                stats = pipeline.run()
+            except BaseException:
+                # チェックポイントを残し、次回の起動で続きから出力できるようにする
+                writer.abort()
+                checkpoint.release()
+                raise
+            output_files = writer.close(partial=pipeline.cancelled)
+            checkpoint.remove()
+        
+        # CSV・JSON Lines のハッシュとバイト数は書き込みと同時に計算済み（読み直さない）
+        stats['write'].bytes = writer.bytes_written
+        if task is not None:
+            task.finish(stats['write'].items, stats['write'].bytes)
+        
+        for path, checksum in writer.checksums():
+            self.save_checksum(path, checksum)
+        summary_path = summary_file(output_file)
+        self.save_checksum(summary_path, summary.write(summary_path))
+        if pipeline.cancelled:
+            error = CollectionCancelled(
+                f"キャンセルされたため途中（{stats['write'].items}件）まで出力しました", output_files[formats[0]]
+            )
+            error.phases = [stage.to_dict() for stage in stats.values()]
+            raise error
+        return stats
+    
+    def get_eventlog_incremental(self, log_name, limit=None, event_filter=None):
+        """前回のブックマークより新しいイベントだけを出力ルートのCSVに追記する
+        
+        (出力ファイル, 追記件数) を返す。CSVをディスクに書き切ってからブックマークを
+        更新し、次回は記録されたサイズまでCSVを切り詰めてから追記するため、
+        途中で中断してもイベントの欠落・重複は起こらない。書き込み中も一定間隔で
+        ブックマークを更新するため、異常終了した場合も次回は書き込んだ所の続きから追記する。
+        """
+        output_file, stats = self._eventlog_incremental(log_name, limit, event_filter)
+        return output_file, stats['write'].items
+    
+    def _eventlog_incremental(self, log_name, limit, event_filter):
+        """差分の追記を行い (出力ファイル, ステージごとの統計) を返す"""
+        self.cancel_token.check()
+        output_file = os.path.join(self.output_root, f"{channel_filename(log_name)}_EventLog_incremental.csv")
+        bookmark = self.bookmarks.get(log_name) or {}
+        start_record = bookmark.get('record_number', 0) + 1
+        
+        os.makedirs(self.output_root, exist_ok=True)
+        
+        # ブックマーク更新前に中断した書き込みを捨てる（最初のブックマークの保存前に異常終了した
+        # ファイルは記録済みの分がないため空にし、ヘッダーから書き直す）
+        committed_size = bookmark.get('size', 0)
+        if os.path.exists(output_file) and os.path.getsize(output_file) > committed_size:
+            with open(output_file, 'r+b') as f:
+                f.truncate(committed_size)
+        
+        with self.open_source(log_name, event_filter) as source:
+            oldest, newest = source.record_range()
+            if start_record > newest + 1:
+                # ログがクリアされて番号が巻き戻った場合は最初から取り直す
+                start_record = oldest
+            start_record = max(start_record, oldest)
+            
+            is_new_file = not os.path.exists(output_file) or os.path.getsize(output_file) == 0
+            start_size = 0 if is_new_file else os.path.getsize(output_file)
+            last_record = [start_record - 1]  # 最後に書き込んだイベントの RecordNumber
+            summary = EventSummary(log_name)
+            # 中断して捨てた書き込みの分は索引からも削除する
+            indexer = self.open_index_writer(output_file, log_name, bookmark.get('record_number'))
+            
+            def format_event(event):
+                summary.add(event)
+                return event, self.format_event_row(event, log_name, source.format_message)
+            
+            with open_hashed(output_file, 'a', newline='', encoding='utf-8-sig' if is_new_file else 'utf-8') as csvfile:
+                writer = csv.writer(csvfile)
+                
+                if is_new_file:
+                    writer.writerow([
+                        '日時', 'イベントID', 'レベル', 'ソース', 'メッセージ'
+                    ])
+                
+                batches = source.batches_from(start_record) if start_record <= newest else ()
+                if event_filter is not None and event_filter.active:
+                    batches = event_filter.apply(batches, newest_first=False)
+                
+                # 索引への登録はブックマークと順序をそろえるため書き込みステージで行う
+                def write_rows(items):
+                    writer.writerows([row for _, row in items])
+                    last_record[0] = items[-1][0].record_number
+                    if indexer is not None:
+                        for event, row in items:
+                            indexer.add(event, row[-1])
+                
+                task = self._progress_task(log_name, max(newest - start_record + 1, 0), limit)
+                progress = self._progress_callback(task, csvfile)
+                saved = [time.monotonic()]
+                
+                def on_write(stats):
+                    # 書き込んだ所までを定期的にブックマークに記録し、異常終了しても次回はその続きから追記する
+                    if time.monotonic() - saved[0] >= ExportCheckpoint.INTERVAL:
+                        if indexer is not None:
+                            indexer.sync()
+                        csvfile.flush()
+                        os.fsync(csvfile.fileno())
+                        self.bookmarks.update(log_name, last_record[0], output_file,
+                                              os.fstat(csvfile.fileno()).st_size)
+                        saved[0] = time.monotonic()
+                    if progress is not None:
+                        progress(stats)
+                
+                pipeline = EventPipeline(
+                    batches,
+                    format_event,
+                    write_rows,
+                    limit=limit,
+                    on_write=on_write,
+                    profile_prefix=self._profile_prefix(log_name),
+                    cancel_token=self.cancel_token
+                )
+                stats = pipeline.run()
+                if task is not None:
+                    task.finish(stats['write'].items, csvfile.tell())
+                
+                csvfile.flush()
+                os.fsync(csvfile.fileno())
+                size = os.fstat(csvfile.fileno()).st_size
+                stats['write'].bytes = size - start_size
+        
+        # キャンセルされた場合も書き込んだ所までブックマークを進め、次回はその続きから追記する
+        self.bookmarks.update(log_name, last_record[0], output_file, size)
+        if indexer is not None:
+            indexer.close(output_file)
+        # 追記したCSVは今回追記した部分（offset 以降）のハッシュを記録する
+        self.save_checksum(output_file, checksum_of(csvfile))
+        summary_path = summary_file(output_file)
+        self.save_checksum(summary_path, summary.write(summary_path))
+        if pipeline.cancelled:
+            error = CollectionCancelled(
+                f"キャンセルされたため途中（{stats['write'].items}件）まで追記しました", output_file
+            )
+            error.phases = [stage.to_dict() for stage in stats.values()]
+            raise error
+        return output_file, stats
+    
+    @staticmethod
+    def _progress_callback(task, csvfile):
+        """パイプラインの書き込みごとに進捗を更新する関数を返す"""
+        if task is None:
+            return None
+        return lambda stats: task.update(stats['read'].items, stats['write'].items, csvfile.tell)
+    
+    def format_event_row(self, event, log_name, format_message=None):
+        """イベント（EventRecord）1件をCSVの1行に変換する（format_message を省略した場合はメッセージDLLで整形する）"""
+        return event_csv_row(event, self.event_message(event, log_name, format_message))
+    
+    def event_message(self, event, log_name, format_message=None):
+        """イベントのメッセージを整形する（改行はそのまま、整形できない場合は代わりの文言を返す）"""
+        try:
+            if format_message is not None:
+                message = format_message(event)
+            else:
+                message = self.message_cache.format(event, log_name)
+            if message is None:
+                message = "メッセージを取得できませんでした"
+        except:
+            message = "メッセージを取得できませんでした"
+        return message
+    
+    @property
+    def search_index(self):
+        """出力ルートの検索用の索引（EventSearchIndex）"""
+        with self._search_index_lock:
+            if self._search_index is None:
+                self._search_index = EventSearchIndex(self.output_root)
+            return self._search_index
+    
+    def open_index_writer(self, output_file, log_name, keep_through_record=None, keep_from_record=None):
+        """出力ファイルの検索用の索引への登録を開始する（登録しない・索引を開けない場合はNone、収集は続ける）"""
+        if not self.index_events:
+            return None
+        try:
+            return self.search_index.writer(output_file, log_name, keep_through_record, keep_from_record)
+        except (sqlite3.Error, OSError):
+            return None
+    
+    def search(self, keyword=None, event_filter=None, limit=100):
+        """過去の収集を含めて出力したイベントを検索する（索引にないCSVは先に取り込む）"""
+        self.search_index.sync(self.cancel_token)
+        return self.search_index.search(keyword, event_filter, limit)
+    
+    def close(self):
+        """読み込んだメッセージDLLなどを解放する"""
+        self.message_cache.close()
+        with self._search_index_lock:
+            if self._search_index is not None:
+                self._search_index.close()
+                self._search_index = None
+
+
+class HostCollector(Collector):
+    """フリート収集で1台のホストからイベントログを収集する
+
+    出力は親の出力フォルダ（差分取得の場合は出力ルート）のホスト名のサブフォルダに書き込み、
+    チャネルは1つの接続（HostConnection）で順に読み込む。メッセージのキャッシュと検索用の索引、
+    進捗の通知先は親と共有する。
+    """
+
+    def __init__(self, parent, host, retries=2, retry_delay=2.0, reader=None):
+        folder = channel_filename(host)
+        Collector.__init__(
+            self,
+            os.path.join(parent.output_root, folder),
+            max_workers=1,
+            reader=reader or parent.reader,
+            batch_size=parent.batch_size,
+            profile=parent.profile,
+            index_events=parent.index_events,
+            part_bytes=parent.part_bytes,
+            part_rows=parent.part_rows,
+            formats=parent.formats
+        )
+        self.host = host
+        self.parent = parent
+        self._output_folder = os.path.join(parent._output_folder, folder)
+        self.message_cache = parent.message_cache
+        self.progress = parent.progress
+        self.connection = HostConnection(host, self.reader, self.batch_size, retries=retries,
+                                         retry_delay=retry_delay, cancel_token=self.cancel_token)
+    
+    @property
+    def search_index(self):
+        return self.parent.search_index
+    
+    def open_source(self, log_name, event_filter=None, reader=None):
+        # 読み込み方式は接続ごとに決まっている
+        return self.connection.open_source(log_name, event_filter)
+    
+    def _progress_task(self, name, total, limit):
+        return Collector._progress_task(self, f"{self.host} {name}", total, limit)
+    
+    def close(self):
+        """接続を閉じる（共有しているキャッシュと索引は親が閉じる）"""
+        self.connection.close()
+
+
+class ModernILCollector(Collector):
     WINDOW_TITLE_SUFFIX = "ILCollector - イベントログ収集ツール"
+    
+    # ワーカースレッドからの通知を画面に反映する間隔（ミリ秒）
+    UI_POLL_MS = 100
 
-    def __init__(self):
+    def __init__(self, output_root=None):
+        load_tkinter()
+        Collector.__init__(self, output_root)
+        
         # メインウィンドウの作成
         self.root = tk.Tk()
         self.root.title(self.WINDOW_TITLE_SUFFIX)
@@ -45,16 +2756,35 @@ class ModernILCollector:
         # 処理中メッセージウィンドウ用
         self.progress_window = None
         
-        # 出力フォルダの設定
-        current_dir = os.getcwd()
-        timestamp = datetime.now().strftime("%Y%m%d-%H%M")
-        self.output_folder = os.path.join(current_dir, timestamp)
+        # ワーカースレッドからの通知（進捗・画面の処理を一定間隔でまとめて反映する）
+        self.ui_queue = ProgressQueue()
+        self.progress = self.ui_queue
+        self.progress_tasks = {}
+        
+        # ボタンから投入された処理（同じ処理の重複を除き、同時に2つまで実行する）
+        self.jobs = JobQueue(max_running=2)
         
-        if not os.path.exists(self.output_folder):
-            os.makedirs(self.output_folder)
+        # 差分取得の切り替え
+        self.incremental_var = tk.BooleanVar(value=False)
+        
+        # チャネルを日時順にまとめたタイムラインも出力するか
+        self.timeline_var = tk.BooleanVar(value=False)
+        
+        # 出力したイベントを検索用の索引にも登録するか
+        self.index_var = tk.BooleanVar(value=self.index_events)
+        
+        # イベントログの出力形式（複数選択すると1回の読み込みでそれぞれに出力する）
+        self.format_vars = {name: tk.BooleanVar(value=name in self.formats) for name in EXPORT_FORMATS}
+        
+        # 収集するイベントログ（カンマ区切り、"名前:件数" で個別の件数上限）
+        self.channels_var = tk.StringVar(value=", ".join(Collector.DEFAULT_CHANNELS))
         
         self.setup_styles()
         self.create_modern_widgets()
+        
+        self.root.after(self.UI_POLL_MS, self._poll_ui_queue)
+        # 前回異常終了したエクスポートがあれば続きから出力するか確認する
+        self.root.after_idle(self.offer_resume)
     
     def setup_styles(self):
         """モダンなスタイルを設定"""
@@ -99,6 +2829,15 @@ class ModernILCollector:
                             focuscolor='none',
                             padding=(40, 25),  # パディング設定を追加
                             font=(self.font_family, 12, 'bold'))  # フォント設定を追加)
+        
+        # CSVの表示・検索結果の一覧
+        self.style.configure('Viewer.Treeview',
+                             rowheight=EventViewer.ROW_HEIGHT,
+                             background=self.colors['bg_card'],
+                             fieldbackground=self.colors['bg_card'],
+                             foreground=self.colors['text_primary'],
+                             font=(self.font_family, 9))
+        self.style.configure('Viewer.Treeview.Heading', font=(self.font_family, 9, 'bold'))
     
     def create_modern_widgets(self):
         """モダンなUIコンポーネントを作成"""
@@ -134,6 +2873,9 @@ class ModernILCollector:
         # ヘッダーセクション
         self.create_header(main_container)
         
+        # 絞り込み条件
+        self.create_filter_panel(main_container)
+        
         # カードコンテナ
         cards_container = tk.Frame(main_container, bg=self.colors['bg_primary'])
         cards_container.pack(fill="both", expand=True, pady=(30, 0))
@@ -205,6 +2947,134 @@ class ModernILCollector:
         separator = tk.Frame(header_frame, height=2, bg=self.colors['accent_blue'])
         separator.pack(fill="x", pady=(20, 0))
     
+    def create_filter_panel(self, parent):
+        """イベントログの絞り込み条件の入力欄を作成"""
+        panel = tk.Frame(parent, bg=self.colors['bg_card'])
+        panel.pack(fill="x", pady=(30, 0), padx=10)
+        
+        content_frame = tk.Frame(panel, bg=self.colors['bg_card'])
+        content_frame.pack(fill="x", padx=25, pady=20)
+        
+        title_label = tk.Label(
+            content_frame,
+            text="🔎 絞り込み条件（イベントログ）",
+            font=(self.font_family, 12, 'bold'),
+            fg=self.colors['text_primary'],
+            bg=self.colors['bg_card']
+        )
+        title_label.grid(row=0, column=0, columnspan=4, sticky="w", pady=(0, 10))
+        
+        self.filter_vars = {
+            'since': tk.StringVar(),
+            'until': tk.StringVar(),
+            'event_ids': tk.StringVar(),
+            'sources': tk.StringVar(),
+            'limit': tk.StringVar(value="1000"),
+        }
+        self.filter_vars['channels'] = self.channels_var
+        fields = [
+            ("イベントログ", 'channels', "カンマ区切り（例: System, Security:5000, Setup）"),
+            ("開始日時", 'since', "例: 2025-01-31 09:00 / 24h / 7d"),
+            ("終了日時", 'until', "例: 2025-01-31 18:00（空欄で現在まで）"),
+            ("イベントID", 'event_ids', "カンマ区切り（例: 41, 6008）"),
+            ("ソース", 'sources', "カンマ区切り（例: Disk, Ntfs）"),
+            ("最大件数", 'limit', "ログごと（0で無制限）"),
+        ]
+        for row, (label, key, hint) in enumerate(fields, start=1):
+            tk.Label(
+                content_frame,
+                text=label,
+                font=(self.font_family, 9),
+                fg=self.colors['text_secondary'],
+                bg=self.colors['bg_card']
+            ).grid(row=row, column=0, sticky="w", pady=2)
+            tk.Entry(
+                content_frame,
+                textvariable=self.filter_vars[key],
+                font=(self.font_family, 9),
+                width=24,
+                fg=self.colors['text_primary'],
+                bg=self.colors['bg_secondary'],
+                insertbackground=self.colors['text_primary'],
+                relief='flat'
+            ).grid(row=row, column=1, sticky="w", padx=(10, 10), pady=2)
+            tk.Label(
+                content_frame,
+                text=hint,
+                font=(self.font_family, 8),
+                fg=self.colors['text_secondary'],
+                bg=self.colors['bg_card']
+            ).grid(row=row, column=2, columnspan=2, sticky="w", pady=2)
+        
+        # レベル
+        level_frame = tk.Frame(content_frame, bg=self.colors['bg_card'])
+        level_frame.grid(row=len(fields) + 1, column=0, columnspan=4, sticky="w", pady=(8, 0))
+        tk.Label(
+            level_frame,
+            text="レベル",
+            font=(self.font_family, 9),
+            fg=self.colors['text_secondary'],
+            bg=self.colors['bg_card']
+        ).pack(side="left", padx=(0, 10))
+        self.level_vars = {}
+        for level, label in EventFilter.LEVELS.items():
+            var = tk.BooleanVar(value=True)
+            self.level_vars[level] = var
+            tk.Checkbutton(
+                level_frame,
+                text=label,
+                variable=var,
+                font=(self.font_family, 9),
+                fg=self.colors['text_secondary'],
+                bg=self.colors['bg_card'],
+                activebackground=self.colors['bg_card'],
+                activeforeground=self.colors['text_primary'],
+                selectcolor=self.colors['bg_secondary']
+            ).pack(side="left", padx=(0, 8))
+    
+    def read_filter_options(self):
+        """絞り込み条件の入力欄を読み取り (EventFilter, 最大件数) を返す（入力誤りはValueError）"""
+        values = {key: var.get().strip() for key, var in self.filter_vars.items()}
+        
+        since = parse_time(values['since']) if values['since'] else None
+        until = parse_time(values['until']) if values['until'] else None
+        if since and until and since > until:
+            raise ValueError("開始日時が終了日時より後になっています")
+        
+        try:
+            event_ids = [int(v) for v in re.split(r"[,\s]+", values['event_ids']) if v]
+        except ValueError:
+            raise ValueError(f"イベントIDは数値で指定してください: {values['event_ids']}")
+        sources = [v.strip() for v in values['sources'].split(",") if v.strip()]
+        
+        levels = [level for level, var in self.level_vars.items() if var.get()]
+        if not levels:
+            raise ValueError("レベルを1つ以上選択してください")
+        if len(levels) == len(self.level_vars):
+            levels = None
+        
+        try:
+            limit = int(values['limit'] or 0)
+        except ValueError:
+            raise ValueError(f"最大件数は数値で指定してください: {values['limit']}")
+        
+        event_filter = EventFilter(since=since, until=until, levels=levels, event_ids=event_ids, sources=sources)
+        return event_filter, (limit if limit > 0 else None)
+    
+    def read_format_options(self):
+        """出力形式のチェックボックスを読み取り、選択された形式のリストを返す"""
+        formats = [name for name, var in self.format_vars.items() if var.get()]
+        if not formats:
+            raise ValueError("出力形式を1つ以上選択してください")
+        return formats
+    
+    def read_channel_options(self):
+        """収集するイベントログの入力欄を読み取り (チャネル名のリスト, 件数上限の辞書) を返す"""
+        channels, limits = parse_channels([self.channels_var.get()])
+        if not channels:
+            raise ValueError("イベントログを1つ以上指定してください")
+        return channels, limits
+    
     def create_feature_cards(self, parent):
         """機能カードを作成"""
         # カードのグリッド配置用フレーム
@@ -215,11 +3085,73 @@ class ModernILCollector:
         card1 = self.create_card(
             cards_frame,
             "📊 イベントログ出力",
-            "System・Applicationログを\nCSVファイルとして出力",
+            "指定したイベントログを\nCSVファイルとして出力",
             "Primary.TButton",
             self.export_eventlogs,
             row=0, col=0, colspan=1
         )
+        
+        # 差分取得の切り替え
+        incremental_check = tk.Checkbutton(
+            card1,
+            text="前回の続きから差分のみ取得（出力ルートのCSVに追記）",
+            variable=self.incremental_var,
+            font=(self.font_family, 9),
+            fg=self.colors['text_secondary'],
+            bg=self.colors['bg_card'],
+            activebackground=self.colors['bg_card'],
+            activeforeground=self.colors['text_primary'],
+            selectcolor=self.colors['bg_secondary']
+        )
+        incremental_check.pack(pady=(0, 5))
+        
+        timeline_check = tk.Checkbutton(
+            card1,
+            text="各イベントログを日時順にまとめたタイムラインも出力",
+            variable=self.timeline_var,
+            font=(self.font_family, 9),
+            fg=self.colors['text_secondary'],
+            bg=self.colors['bg_card'],
+            activebackground=self.colors['bg_card'],
+            activeforeground=self.colors['text_primary'],
+            selectcolor=self.colors['bg_secondary']
+        )
+        timeline_check.pack(pady=(0, 5))
+        
+        index_check = tk.Checkbutton(
+            card1,
+            text="出力したイベントを検索用の索引にも登録（検索が速くなる）",
+            variable=self.index_var,
+            font=(self.font_family, 9),
+            fg=self.colors['text_secondary'],
+            bg=self.colors['bg_card'],
+            activebackground=self.colors['bg_card'],
+            activeforeground=self.colors['text_primary'],
+            selectcolor=self.colors['bg_secondary']
+        )
+        index_check.pack(pady=(0, 5))
+        
+        format_frame = tk.Frame(card1, bg=self.colors['bg_card'])
+        format_frame.pack(pady=(0, 15))
+        tk.Label(
+            format_frame,
+            text="出力形式",
+            font=(self.font_family, 9),
+            fg=self.colors['text_secondary'],
+            bg=self.colors['bg_card']
+        ).pack(side="left", padx=(0, 10))
+        for name, label in (('csv', "CSV"), ('jsonl', "JSON Lines"), ('sqlite', "SQLite")):
+            tk.Checkbutton(
+                format_frame,
+                text=label,
+                variable=self.format_vars[name],
+                font=(self.font_family, 9),
+                fg=self.colors['text_secondary'],
+                bg=self.colors['bg_card'],
+                activebackground=self.colors['bg_card'],
+                activeforeground=self.colors['text_primary'],
+                selectcolor=self.colors['bg_secondary']
+            ).pack(side="left", padx=(0, 8))
 
         # カード2: システム情報出力
         card2 = self.create_card(
@@ -318,6 +3250,30 @@ class ModernILCollector:
         )
         folder_btn.pack(side="left", padx=(0, 15))
         
+        # .evtxファイル変換ボタン
+        evtx_btn = ttk.Button(
+            button_container,
+            text="📂 evtxファイルを変換",
+            command=self.export_evtx
+        )
+        evtx_btn.pack(side="left", padx=(0, 15))
+        
+        # 出力したCSVの表示ボタン
+        viewer_btn = ttk.Button(
+            button_container,
+            text="🔍 CSVを表示",
+            command=self.open_viewer
+        )
+        viewer_btn.pack(side="left", padx=(0, 15))
+        
+        # 過去の収集を含めた検索ボタン
+        search_btn = ttk.Button(
+            button_container,
+            text="🔎 イベントを検索",
+            command=self.open_search
+        )
+        search_btn.pack(side="left", padx=(0, 15))
+        
         # 終了ボタン
         exit_btn = ttk.Button(
             button_container,
@@ -357,6 +3313,22 @@ class ModernILCollector:
         except Exception as e:
             self.show_modern_error("エラー", f"フォルダを開けませんでした:\n{str(e)}")
     
+    def open_viewer(self):
+        """出力したCSVを選択してアプリ内のビューアで表示する"""
+        path = filedialog.askopenfilename(
+            parent=self.root,
+            title=f"表示するCSVファイルを選択 - {self.WINDOW_TITLE_SUFFIX}",
+            initialdir=self.output_folder,
+            filetypes=[("CSVファイル", "*.csv"), ("すべてのファイル", "*.*")]
+        )
+        if not path:
+            return
+        EventViewer(self, path)
+    
+    def open_search(self):
+        """過去の収集を含めて出力したイベントを検索するウィンドウを開く"""
+        EventSearchWindow(self)
+    
     def show_modern_completion(self, title, message, files_info):
         """モダンな完了ダイアログを表示"""
         dialog = tk.Toplevel(self.root)
@@ -447,7 +3419,7 @@ class ModernILCollector:
         """モダンな処理中ダイアログを表示"""
         self.progress_window = tk.Toplevel(self.root)
         self.progress_window.title(f"処理中 - {self.WINDOW_TITLE_SUFFIX}")
-        self.progress_window.geometry("400x200")  # 幅350→400px、高さ150→200pxに変更
+        self.progress_window.geometry("460x370")  # 進捗バー・件数・キャンセルボタンの分だけ高さを確保
         self.progress_window.resizable(False, False)
         self.progress_window.configure(bg=self.colors['bg_primary'])
         self.progress_window.transient(self.root)
@@ -479,7 +3451,77 @@ class ModernILCollector:
             wraplength=350,  # 文字折り返し幅を300→350に拡大
             justify="center"
         )
-        msg_label.pack(pady=(0, 15))  # 下の余白を20→15に調整    
+        msg_label.pack(pady=(0, 15))  # 下の余白を20→15に調整
+        
+        # 進捗バー（総数が分かるまでは往復表示）
+        self.progress_tasks = {}
+        self.progress_bar = ttk.Progressbar(content_frame, mode='indeterminate', length=380, maximum=100)
+        self.progress_bar.pack(pady=(0, 10))
+        self.progress_bar.start(15)
+        
+        # ジョブごとの件数・速度・残り時間
+        self.progress_detail = tk.Label(
+            content_frame,
+            text="",
+            font=(self.font_family, 9),
+            fg=self.colors['text_secondary'],
+            bg=self.colors['bg_card'],
+            justify="left"
+        )
+        self.progress_detail.pack(pady=(0, 10))
+        
+        # キャンセル（読み込み中のログは書き込み済みの分を .partial.csv として残す）
+        self.cancel_button = ttk.Button(
+            content_frame,
+            text="キャンセル",
+            command=self.cancel_running
+        )
+        self.cancel_button.pack(pady=(0, 10))
+        self.progress_window.protocol("WM_DELETE_WINDOW", self.cancel_running)
+    
+    def cancel_running(self):
+        """実行中の処理にキャンセルを指示する（各処理は区切りのよいところで止まる）"""
+        self.cancel_token.cancel()
+        if self.progress_window:
+            self.cancel_button.configure(text="キャンセルしています...", state="disabled")
+    
+    def update_progress_view(self):
+        """受け取った進捗を処理中ダイアログに反映する"""
+        if not self.progress_window:
+            return
+        tasks = list(self.progress_tasks.values())
+        self.progress_detail.configure(text="\n".join(describe_progress(task) for task in tasks))
+        
+        known = [task for task in tasks if task['total']]
+        if not known:
+            return
+        total = sum(task['total'] for task in known)
+        done = sum(task['total'] if task['done'] else min(task['written'], task['total']) for task in known)
+        if str(self.progress_bar.cget('mode')) != 'determinate':
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode='determinate')
+        self.progress_bar.configure(value=done * 100 / total)
+    
+    def post_ui(self, func, *args):
+        """ワーカースレッドから画面の処理を依頼する（メインスレッドで実行される）"""
+        self.ui_queue.post('call', func, args)
+    
+    def _poll_ui_queue(self):
+        """溜まった通知を一定間隔でまとめて画面に反映する"""
+        try:
+            progress_changed = False
+            for message in self.ui_queue.drain():
+                if message[0] == 'progress':
+                    self.progress_tasks[message[1]['name']] = message[1]
+                    progress_changed = True
+                elif message[0] == 'call':
+                    _, func, args = message
+                    func(*args)
+            if progress_changed:
+                self.update_progress_view()
+        finally:
+            self.root.after(self.UI_POLL_MS, self._poll_ui_queue)
+    
     def show_modern_error(self, title, message):
         """モダンなエラーダイアログを表示"""
         messagebox.showerror(f"{title} - {self.WINDOW_TITLE_SUFFIX}", message)
@@ -500,286 +3542,1019 @@ class ModernILCollector:
     # 以下、元のメソッドをモダンUI対応に修正
     def export_eventlogs(self):
         """イベントログをCSVに出力する（メインスレッド）"""
-        thread = threading.Thread(target=self._export_eventlogs_thread)
-        thread.daemon = True
-        thread.start()
-    
-    def _export_eventlogs_thread(self):
-        """イベントログをCSVに出力する（バックグラウンド処理）"""
         try:
-            self.root.after(0, lambda: self.show_modern_progress("イベントログを収集しています...\n少々お待ちください。"))
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            
-            system_file = os.path.join(self.output_folder, f"System_EventLog_{timestamp}.csv")
-            self.get_eventlog("System", system_file)
-            
-            app_file = os.path.join(self.output_folder, f"Application_EventLog_{timestamp}.csv")
-            self.get_eventlog("Application", app_file)
-            
-            self.root.after(0, self.hide_progress)
-            
-            files_info = f"出力ファイル:\n• {os.path.basename(system_file)}\n• {os.path.basename(app_file)}\n\n出力先:\n{self.output_folder}"
-            self.root.after(0, lambda: self.show_modern_completion(
-                "処理完了",
-                "イベントログの出力が完了しました！",
-                files_info
-            ))
-            
-        except Exception as e:
-            error_msg = f"イベントログの出力中にエラーが発生しました:\n{str(e)}"  # エラーメッセージを変数に保存
-            self.root.after(0, self.hide_progress)
-            self.root.after(0, lambda msg=error_msg: self.show_modern_error("エラー", msg))  # デフォルト引数で値を固定
+            event_filter, limit = self.read_filter_options()
+            channels, channel_limits = self.read_channel_options()
+            formats = self.read_format_options()
+        except ValueError as e:
+            self.show_modern_error("入力エラー", str(e))
+            return
+        self.index_events = self.index_var.get()
+        incremental = self.incremental_var.get()
+        self.run_jobs(
+            "イベントログを収集しています...\n少々お待ちください。",
+            [self._eventlogs_job(incremental, event_filter, limit, channels, channel_limits,
+                                 self.timeline_var.get(), formats)],
+            "イベントログの差分出力が完了しました！" if incremental else "イベントログの出力が完了しました！",
+            "イベントログの出力中にエラーが発生しました",
+            folder=self.output_root if incremental else None
+        )
     
     def export_all(self):
         """すべてのログ・情報を一括取得する（メインスレッド）"""
-        thread = threading.Thread(target=self._export_all_thread)
-        thread.daemon = True
-        thread.start()
+        try:
+            event_filter, limit = self.read_filter_options()
+            channels, channel_limits = self.read_channel_options()
+            formats = self.read_format_options()
+        except ValueError as e:
+            self.show_modern_error("入力エラー", str(e))
+            return
+        self.index_events = self.index_var.get()
+        # イベントログとシステム情報を同時に収集する（実行中の同じ処理があればその結果を使う）
+        self.run_jobs(
+            "すべてのログ・情報を収集しています...\n少々お待ちください。",
+            [self._eventlogs_job(False, event_filter, limit, channels, channel_limits, self.timeline_var.get(),
+                                 formats),
+             self._systeminfo_job()],
+            "すべてのログ・情報の出力が完了しました！",
+            "ログ・情報の出力中にエラーが発生しました"
+        )
     
-    def _export_all_thread(self):
-        """すべてのログ・情報を一括取得する（バックグラウンド処理）"""
+    def export_evtx(self):
+        """.evtxファイルを選択してCSVに変換する（メインスレッド）"""
+        evtx_files = filedialog.askopenfilenames(
+            parent=self.root,
+            title=f"変換する.evtxファイルを選択 - {self.WINDOW_TITLE_SUFFIX}",
+            filetypes=[("イベントログファイル", "*.evtx"), ("すべてのファイル", "*.*")]
+        )
+        if not evtx_files:
+            return
         try:
-            self.root.after(0, lambda: self.show_modern_progress("すべてのログ・情報を収集しています...\n少々お待ちください。"))
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            files_created = []
-            
-            # イベントログの出力
-            system_file = os.path.join(self.output_folder, f"System_EventLog_{timestamp}.csv")
-            self.get_eventlog("System", system_file)
-            files_created.append(os.path.basename(system_file))
-            
-            app_file = os.path.join(self.output_folder, f"Application_EventLog_{timestamp}.csv")
-            self.get_eventlog("Application", app_file)
-            files_created.append(os.path.basename(app_file))
-            
-            # システム情報の出力
-            output_file = os.path.join(self.output_folder, f"SystemInfo_{timestamp}.txt")
-            
-            cmd = f'msinfo32 /report "{output_file}"'
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-            
-            if result.returncode != 0:
-                result = subprocess.run(
-                    'systeminfo', 
-                    shell=True, 
-                    capture_output=True, 
-                    text=True, 
-                    encoding='shift_jis'
-                )
-                
-                if result.returncode == 0:
-                    with open(output_file, 'w', encoding='utf-8') as f:
-                        f.write("=== システム情報 ===\n")
-                        f.write(result.stdout)
-            
-            files_created.append(os.path.basename(output_file))
-            
-            self.root.after(0, self.hide_progress)
-            
-            files_info = "出力ファイル:\n" + "\n".join([f"• {f}" for f in files_created]) + f"\n\n出力先:\n{self.output_folder}"
-            self.root.after(0, lambda: self.show_modern_completion(
-                "処理完了",
-                "すべてのログ・情報の出力が完了しました！",
-                files_info
-            ))
-            
-        except Exception as e:
-            error_msg = f"ログ・情報の出力中にエラーが発生しました:\n{str(e)}"  # エラーメッセージを変数に保存
-            self.root.after(0, self.hide_progress)
-            self.root.after(0, lambda msg=error_msg: self.show_modern_error("エラー", msg))  # デフォルト引数で値を固定
+            event_filter, _ = self.read_filter_options()
+            formats = self.read_format_options()
+        except ValueError as e:
+            self.show_modern_error("入力エラー", str(e))
+            return
+        self.index_events = self.index_var.get()
+        # ファイルの変換は件数の上限なしで全件を出力する
+        key = ('evtx', tuple(evtx_files), event_filter.key(), tuple(formats))
+        self.run_jobs(
+            ".evtxファイルを変換しています...\n少々お待ちください。",
+            [(key, lambda: self.collect(systeminfo=False, limit=None, evtx_files=list(evtx_files),
+                                        event_filter=event_filter, formats=formats))],
+            ".evtxファイルの変換が完了しました！",
+            ".evtxファイルの変換中にエラーが発生しました"
+        )
     
     def export_msinfo(self):
-        """msinfo32の情報をファイルに出力する（メインスレッド）"""
-        thread = threading.Thread(target=self._export_msinfo_thread)
-        thread.daemon = True
-        thread.start()
+        """システム情報をファイルに出力する（メインスレッド）"""
+        self.run_jobs(
+            "システム情報を収集しています...\n少々お待ちください。",
+            [self._systeminfo_job()],
+            "システム情報の出力が完了しました！",
+            "システム情報の出力中にエラーが発生しました"
+        )
+    
+    def offer_resume(self):
+        """異常終了したエクスポートが残っていれば、続きから出力するか確認して実行する（メインスレッド）"""
+        checkpoints = self.find_interrupted()
+        if not checkpoints:
+            return
+        names = "\n".join(f"• {os.path.relpath(os.path.dirname(path), self.output_root)}/{state['file']}"
+                          f"（{state['rows']:,}件まで出力済み）" for path, state in checkpoints)
+        if not messagebox.askyesno(
+            f"中断したエクスポート - {self.WINDOW_TITLE_SUFFIX}",
+            f"前回異常終了したエクスポートがあります。\n\n{names}\n\n続きから出力しますか？",
+            parent=self.root
+        ):
+            return
+        self.run_jobs(
+            "中断したエクスポートを続きから出力しています...\n少々お待ちください。",
+            [(('resume',), lambda: self.resume_interrupted(checkpoints))],
+            "中断したエクスポートの出力が完了しました！",
+            "エクスポートの再開中にエラーが発生しました",
+            folder=os.path.dirname(checkpoints[0][0])
+        )
+    
+    def _eventlogs_job(self, incremental, event_filter, limit, channels, channel_limits, timeline=False,
+                       formats=None):
+        """イベントログの収集を (キー, 関数) にする（同じ条件の収集は同じキーになる）"""
+        key = ('eventlogs', incremental, tuple(channels or ()), tuple(sorted((channel_limits or {}).items())),
+               limit, event_filter.key(), timeline and not incremental,
+               () if incremental else tuple(formats or self.formats))
+        return key, lambda: self.collect(
+            channels=channels,
+            systeminfo=False,
+            limit=limit,
+            incremental=incremental,
+            event_filter=event_filter,
+            channel_limits=channel_limits,
+            timeline=timeline,
+            formats=formats
+        )
+    
+    def _systeminfo_job(self):
+        """システム情報の収集を (キー, 関数) にする"""
+        return ('systeminfo',), lambda: self.collect(channels=(), systeminfo=True)
+    
+    def run_jobs(self, progress_message, jobs, message, error_message, folder=None):
+        """ボタンの処理をジョブキューに投入し、すべて終わったら結果を表示する（メインスレッド）
+        
+        jobs は (キー, 収集結果のリストを返す関数) のリスト。同じキーの処理が待機中・実行中なら
+        その結果を使い、すべてが既存の処理と重なる場合（ボタンの連打など）は何もしない。
+        """
+        if not self.jobs.busy:
+            self.cancel_token = CancelToken()
+        submitted = [self.jobs.submit(key, func) for key, func in jobs]
+        if not any(is_new for _, is_new in submitted):
+            return
+        futures = [future for future, _ in submitted]
+        
+        if not self.progress_window:
+            self.show_modern_progress(progress_message)
+        
+        remaining = [len(futures)]
+        lock = threading.Lock()
+        
+        def on_done(_):
+            with lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                self.post_ui(self._finish_jobs, futures, message, error_message, folder)
+        
+        for future in futures:
+            future.add_done_callback(on_done)
     
-    def _export_msinfo_thread(self):
-        """msinfo32の情報をファイルに出力する（バックグラウンド処理）"""
+    def _finish_jobs(self, futures, message, error_message, folder):
+        """投入した処理の結果をまとめて完了ダイアログに表示する（メインスレッド）"""
+        if not self.jobs.busy:
+            self.hide_progress()
         try:
-            self.root.after(0, lambda: self.show_modern_progress("システム情報を収集しています...\n少々お待ちください。"))
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_file = os.path.join(self.output_folder, f"SystemInfo_{timestamp}.txt")
-            
-            cmd = f'msinfo32 /report "{output_file}"'
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                self.root.after(0, self.hide_progress)
-                files_info = f"出力ファイル:\n• {os.path.basename(output_file)}\n\n出力先:\n{self.output_folder}"
-                self.root.after(0, lambda: self.show_modern_completion(
-                    "処理完了",
-                    "システム情報の出力が完了しました！",
-                    files_info
-                ))
-            else:
-                self.export_systeminfo_alternative(output_file)
-                
+            results = []
+            for future in futures:
+                results.extend(future.result())
+            self.show_results(results, message, folder or self.output_folder)
         except Exception as e:
-            error_msg = f"システム情報の出力中にエラーが発生しました:\n{str(e)}"  # エラーメッセージを変数に保存
-            self.root.after(0, self.hide_progress)
-            self.root.after(0, lambda msg=error_msg: self.show_modern_error("エラー", msg))  # デフォルト引数で値を固定
-    
-    def export_systeminfo_alternative(self, output_file):
-        """代替方法でシステム情報を出力する"""
-        try:
-            result = subprocess.run(
-                'systeminfo', 
-                shell=True, 
-                capture_output=True, 
-                text=True, 
-                encoding='shift_jis'
-            )
-            
-            if result.returncode == 0:
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    f.write("=== システム情報 ===\n")
-                    f.write(result.stdout)
-                
-                self.root.after(0, self.hide_progress)
-                files_info = f"出力ファイル:\n• {os.path.basename(output_file)}\n\n出力先:\n{self.output_folder}"
-                self.root.after(0, lambda: self.show_modern_completion(
-                    "処理完了",
-                    "システム情報の出力が完了しました！",
-                    files_info
-                ))
-            else:
-                raise Exception("systeminfoコマンドも失敗しました")
-                
-        except Exception as e:
-            error_msg = f"システム情報の取得に失敗しました:\n{str(e)}"  # エラーメッセージを変数に保存
-            self.root.after(0, self.hide_progress)
-            self.root.after(0, lambda msg=error_msg: self.show_modern_error("エラー", msg))  # デフォルト引数で値を固定
+            self.hide_progress()
+            error_msg = f"{error_message}:\n{str(e)}"  # エラーメッセージを変数に保存
+            self.show_modern_error("エラー", error_msg)
     
-    def get_eventlog(self, log_name, output_file):
-        """指定されたイベントログを取得してCSVに保存する"""
-        hand = win32evtlog.OpenEventLog(None, log_name)
+    def show_results(self, results, message, folder):
+        """ジョブごとの結果を完了ダイアログに表示する（すべて失敗した場合は例外を送出）"""
+        files_created = []
+        for r in results:
+            if r.ok:
+                count = r.value.get('events')
+                detail = f"（{count}件）" if count is not None else ""
+                skipped = [phase['name'] for phase in r.value.get('phases', ()) if phase.get('status') == "timeout"]
+                if skipped:
+                    detail += f"（タイムアウトで省略: {', '.join(skipped)}）"
+                names = [os.path.basename(path) for path in (r.value.get('files') or {'': r.value['file']}).values()]
+                files_created.append(f"{', '.join(names)}{detail}")
+            elif isinstance(r.error, CollectionCancelled) and r.error.output_file:
+                files_created.append(f"{os.path.basename(r.error.output_file)}（途中まで）")
+        failures = [f"{r.name}: {r.error}" for r in results if not r.ok]
+        cancelled = any(isinstance(r.error, CollectionCancelled) for r in results)
         
-        with open(output_file, 'w', newline='', encoding='utf-8-sig') as csvfile:
-            writer = csv.writer(csvfile)
-            
-            writer.writerow([
-                '日時', 'イベントID', 'レベル', 'ソース', 'メッセージ'
-            ])
-            
-            events = win32evtlog.ReadEventLog(
-                hand, 
-                win32evtlog.EVENTLOG_BACKWARDS_READ | win32evtlog.EVENTLOG_SEQUENTIAL_READ,
-                0
-            )
-            
-            count = 0
-            while events and count < 1000:
-                for event in events:
-                    time_generated = event.TimeGenerated.Format()
-                    
-                    if event.EventType == win32con.EVENTLOG_ERROR_TYPE:
-                        level = "エラー"
-                    elif event.EventType == win32con.EVENTLOG_WARNING_TYPE:
-                        level = "警告"
-                    elif event.EventType == win32con.EVENTLOG_INFORMATION_TYPE:
-                        level = "情報"
-                    else:
-                        level = "その他"
-                    
-                    try:
-                        message = win32evtlogutil.SafeFormatMessage(event, log_name)
-                        if message is None:
-                            message = "メッセージを取得できませんでした"
-                    except:
-                        message = "メッセージを取得できませんでした"
-                    
-                    writer.writerow([
-                        time_generated,
-                        event.EventID & 0xFFFF,
-                        level,
-                        event.SourceName,
-                        message.replace('\n', ' ').replace('\r', '')
-                    ])
-                    
-                    count += 1
-                    if count >= 1000:
-                        break
-                
-                if count < 1000:
-                    events = win32evtlog.ReadEventLog(
-                        hand, 
-                        win32evtlog.EVENTLOG_BACKWARDS_READ | win32evtlog.EVENTLOG_SEQUENTIAL_READ,
-                        0
-                    )
-                else:
-                    break
+        if not files_created:
+            raise Exception("\n".join(failures))
         
-        win32evtlog.CloseEventLog(hand)
+        files_info = "出力ファイル:\n" + "\n".join([f"• {f}" for f in files_created])
+        if failures:
+            files_info += "\n\n失敗した処理:\n" + "\n".join([f"• {f}" for f in failures])
+            message = "処理をキャンセルしました。" if cancelled else "一部の処理でエラーが発生しました。"
+        files_info += f"\n\n出力先:\n{folder}"
+        
+        self.show_modern_completion(
+            "処理完了",
+            message,
+            files_info
+        )
     
     def run(self):
         """アプリケーションを実行する"""
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            # 実行中の処理を止めてから、読み込んだメッセージDLLなどを解放する
+            self.cancel_token.cancel()
+            self.jobs.shutdown()
+            self.close()
 
-# メイン実行部分
-if __name__ == "__main__":
-    # 管理者権限の確認
-    import ctypes
+class EventViewer:
+    """出力したイベントログのCSVを表示するウィンドウ
 
-    # グローバル変数として宣言
-    should_start_app = True
+    EventCsvIndex で作った索引を使い、Treeview には画面に見えている行だけを描画する。
+    スクロール位置は表示順の行番号で管理するため、数百万行のCSVでも開く・スクロールする・
+    レベルやソースで絞り込む・並べ替える操作が重くならない。
+    """
 
-    def show_admin_dialog():
-        # 関数内でグローバル変数を使う
-        global should_start_app
-        root = tk.Tk()
-        root.withdraw()  # メインウィンドウ非表示
-
-        def on_continue():
-            global should_start_app
-            should_start_app = True
-            root.quit()
-            root.destroy()
-
-        def on_exit():
-            global should_start_app
-            should_start_app = False
-            root.quit()
-            root.destroy()
-
-        dialog = tk.Toplevel()
-        dialog.title(f"権限不足 - ILCollector - イベントログ収集ツール")
-        dialog.geometry("400x180")
-        dialog.resizable(False, False)
-        dialog.grab_set()
-        dialog.configure(bg="#2d2d2d")
-
-        label = tk.Label(
-            dialog,
-            text="このプログラムは管理者権限で実行することを推奨します。\n一部の機能が正常に動作しない可能性があります。",
-            bg="#2d2d2d",
-            fg="#ffffff",
-            font=("メイリオ", 11),
-            wraplength=360,
-            justify="center"
+    COLUMNS = (
+        ('time', "日時", 150),
+        ('event_id', "イベントID", 80),
+        ('level', "レベル", 70),
+        ('source', "ソース", 180),
+        ('message', "メッセージ", 520),
+    )
+    # タイムライン（merge_timeline）のCSVで日時の次に表示する列
+    CHANNEL_COLUMN = ('channel', "チャネル", 160)
+    # 見出しをクリックしたときの並べ替え（None はファイルの順）
+    SORT_KEYS = {'time': None, 'level': 'level', 'source': 'source'}
+    ROW_HEIGHT = 22
+    HEADING_HEIGHT = 28
+    # 読み込んだ行を保持する件数
+    CACHE_ROWS = 5000
+    ALL = "（すべて）"
+
+    def __init__(self, app, path):
+        self.app = app
+        self.path = path
+        self.index = EventCsvIndex(path)
+        self.columns = self.COLUMNS
+        self.cache = LRUCache(self.CACHE_ROWS)
+        self.cancel_token = CancelToken()
+        # 表示順に並べた行番号と、先頭に表示している位置
+        self.rows = array('I')
+        self.top = 0
+        self.visible = 20
+        self.selected = None
+        self.sort_by = None
+        self.reverse = False
+        self.loaded = False
+        self.closed = False
+        self._generation = 0
+        
+        self.window = tk.Toplevel(app.root)
+        self.window.title(f"{os.path.basename(path)} - {app.WINDOW_TITLE_SUFFIX}")
+        self.window.geometry("1000x640")
+        self.window.configure(bg=app.colors['bg_primary'])
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.create_widgets()
+        
+        thread = threading.Thread(target=self._build_index)
+        thread.daemon = True
+        thread.start()
+    
+    def create_widgets(self):
+        colors = self.app.colors
+        font_family = self.app.font_family
+        
+        # 絞り込み条件と件数
+        toolbar = tk.Frame(self.window, bg=colors['bg_primary'])
+        toolbar.pack(fill="x", padx=10, pady=(10, 5))
+        
+        self.level_var = tk.StringVar(value=self.ALL)
+        self.source_var = tk.StringVar(value=self.ALL)
+        self.combos = []
+        for label, var in (("レベル", self.level_var), ("ソース", self.source_var)):
+            tk.Label(
+                toolbar,
+                text=label,
+                font=(font_family, 9),
+                fg=colors['text_secondary'],
+                bg=colors['bg_primary']
+            ).pack(side="left", padx=(0, 5))
+            combo = ttk.Combobox(toolbar, textvariable=var, values=[self.ALL], state="disabled", width=24)
+            combo.bind("<<ComboboxSelected>>", lambda event: self.refresh_view())
+            combo.pack(side="left", padx=(0, 15))
+            self.combos.append(combo)
+        
+        self.status_label = tk.Label(
+            toolbar,
+            text="読み込んでいます...",
+            font=(font_family, 9),
+            fg=colors['text_secondary'],
+            bg=colors['bg_primary']
+        )
+        self.status_label.pack(side="right")
+        
+        # 一覧（見えている行だけを Treeview に入れ、スクロールバーは自分で位置を計算する）
+        body = tk.Frame(self.window, bg=colors['bg_primary'])
+        body.pack(fill="both", expand=True, padx=10)
+        
+        self.tree = ttk.Treeview(body, show="headings", selectmode="browse", style='Viewer.Treeview')
+        self.setup_columns()
+        self.tree.tag_configure(LEVEL_LABELS[LEVEL_ERROR], foreground='#ff6b6b')
+        self.tree.tag_configure(LEVEL_LABELS[LEVEL_WARNING], foreground=colors['accent_yellow'])
+        
+        self.scrollbar = ttk.Scrollbar(body, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+        
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll(-3 if event.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(3))
+        self.tree.bind("<Prior>", lambda event: self.scroll(-self.visible))
+        self.tree.bind("<Next>", lambda event: self.scroll(self.visible))
+        self.tree.bind("<Home>", lambda event: self.scroll(-len(self.rows)))
+        self.tree.bind("<End>", lambda event: self.scroll(len(self.rows)))
+        self.tree.bind("<Up>", lambda event: self.move_selection(-1))
+        self.tree.bind("<Down>", lambda event: self.move_selection(1))
+        
+        # 選択した行のメッセージ全文
+        self.detail = tk.Text(
+            self.window,
+            height=8,
+            wrap="word",
+            font=(font_family, 9),
+            bg=colors['bg_secondary'],
+            fg=colors['text_primary'],
+            relief="flat"
+        )
+        self.detail.pack(fill="x", padx=10, pady=(5, 10))
+        self.detail.configure(state="disabled")
+    
+    def setup_columns(self):
+        """一覧の列と見出しを self.columns に合わせる"""
+        self.tree.configure(columns=[key for key, _, _ in self.columns])
+        for key, title, width in self.columns:
+            if key in self.SORT_KEYS:
+                self.tree.heading(key, text=title, command=lambda key=key: self.sort(key))
+            else:
+                self.tree.heading(key, text=title)
+            self.tree.column(key, width=width, stretch=(key == 'message'))
+    
+    def _build_index(self):
+        """索引を作る（バックグラウンド処理）"""
+        def on_progress(done, total):
+            percent = done * 100 // total if total else 100
+            self.app.post_ui(self._set_status, f"読み込んでいます... {percent}%")
+        
+        try:
+            self.index.build(self.cancel_token, on_progress)
+        except CollectionCancelled:
+            return
+        except Exception as e:
+            self.app.post_ui(self._set_status, f"読み込めませんでした: {e}")
+            return
+        self.app.post_ui(self._on_loaded)
+    
+    def _on_loaded(self):
+        if self.closed:
+            return
+        self.loaded = True
+        if self.index.header[1:2] == [self.CHANNEL_COLUMN[1]]:
+            self.columns = self.COLUMNS[:1] + (self.CHANNEL_COLUMN,) + self.COLUMNS[1:]
+            self.setup_columns()
+        levels = sorted(self.index.level_names, key=lambda name: (
+            LEVEL_LABELS.index(name) if name in LEVEL_LABELS else len(LEVEL_LABELS), name))
+        sources = sorted(self.index.source_names, key=str.casefold)
+        for combo, names in zip(self.combos, (levels, sources)):
+            combo.configure(values=[self.ALL] + names, state="readonly")
+        self.refresh_view()
+    
+    def _set_status(self, text):
+        if not self.closed:
+            self.status_label.configure(text=text)
+    
+    def sort(self, column):
+        """見出しのクリックで並べ替える（同じ見出しをもう一度クリックすると逆順）"""
+        sort_by = self.SORT_KEYS[column]
+        if sort_by == self.sort_by:
+            self.reverse = not self.reverse
+        else:
+            self.sort_by = sort_by
+            self.reverse = False
+        self.refresh_view()
+    
+    def refresh_view(self):
+        """絞り込み・並べ替えの条件から表示順を作り直す（行数が多い場合に備えてバックグラウンドで処理）"""
+        if not self.loaded:
+            return
+        self._generation += 1
+        generation = self._generation
+        level = self.level_var.get()
+        source = self.source_var.get()
+        levels = None if level == self.ALL else {level}
+        sources = None if source == self.ALL else {source}
+        sort_by, reverse = self.sort_by, self.reverse
+        self._set_status("絞り込んでいます...")
+        
+        def run():
+            rows = self.index.view(levels, sources, sort_by, reverse)
+            self.app.post_ui(self._show_view, generation, rows)
+        
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+    
+    def _show_view(self, generation, rows):
+        # 条件を続けて変えた場合は最後の結果だけを表示する
+        if self.closed or generation != self._generation:
+            return
+        self.rows = rows
+        self.top = 0
+        self._set_status(f"{len(rows):,} 件 / 全 {len(self.index):,} 件")
+        self.render()
+    
+    def render(self):
+        """先頭位置から見えている分の行だけを Treeview に描画する"""
+        total = len(self.rows)
+        self.top = max(0, min(self.top, total - self.visible))
+        rows = self.rows[self.top:self.top + self.visible]
+        self.tree.delete(*self.tree.get_children())
+        for row, values in zip(rows, self.read_rows(rows)):
+            values = (list(values) + [""] * len(self.columns))[:len(self.columns)]
+            lines = values[-1].splitlines()
+            values[-1] = lines[0] + " …" if len(lines) > 1 else values[-1]
+            self.tree.insert("", "end", iid=str(row), values=values, tags=(values[self.index.level_column],))
+        if self.selected is not None and self.tree.exists(str(self.selected)):
+            self.tree.selection_set(str(self.selected))
+        if total:
+            self.scrollbar.set(self.top / total, min(self.top + self.visible, total) / total)
+        else:
+            self.scrollbar.set(0, 1)
+    
+    def read_rows(self, rows):
+        """行の内容を返す（読み込んでいない行だけをまとめてCSVから読む）"""
+        missing = sorted(row for row in rows if not self.cache.lookup(row)[0])
+        for row, values in zip(missing, self.index.read_rows(missing)):
+            self.cache.put(row, values)
+        return [self.cache.lookup(row)[1] for row in rows]
+    
+    def scroll(self, delta):
+        self.top += delta
+        self.render()
+        return "break"
+    
+    def move_selection(self, delta):
+        """上下キーで選択を移動し、画面の端ではスクロールする"""
+        if not self.rows:
+            return "break"
+        children = self.tree.get_children()
+        if self.selected is not None and str(self.selected) in children:
+            position = self.top + children.index(str(self.selected)) + delta
+        else:
+            position = self.top
+        position = max(0, min(position, len(self.rows) - 1))
+        if position < self.top:
+            self.top = position
+        elif position >= self.top + self.visible:
+            self.top = position - self.visible + 1
+        self.selected = self.rows[position]
+        self.render()
+        return "break"
+    
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == 'moveto':
+            self.top = int(float(amount) * len(self.rows))
+        elif action == 'scroll':
+            self.top += int(amount) * (self.visible if unit == 'pages' else 1)
+        self.render()
+    
+    def _on_resize(self, event):
+        visible = max(1, (event.height - self.HEADING_HEIGHT) // self.ROW_HEIGHT)
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
+    
+    def _on_select(self, event):
+        selection = self.tree.selection()
+        if not selection:
+            return
+        self.selected = int(selection[0])
+        values = self.read_rows([self.selected])[0]
+        header = self.index.header or [title for _, title, _ in self.columns]
+        text = "\n".join(f"{name}: {value}" for name, value in zip(header[:-1], values[:-1]))
+        text += "\n\n" + (values[-1] if len(values) >= len(header) else "")
+        self.detail.configure(state="normal")
+        self.detail.delete("1.0", "end")
+        self.detail.insert("1.0", text)
+        self.detail.configure(state="disabled")
+    
+    def close(self):
+        """読み込みを止めてウィンドウを閉じる"""
+        self.closed = True
+        self.cancel_token.cancel()
+        self.index.close()
+        self.window.destroy()
+
+
+class EventSearchWindow:
+    """過去の収集を含めて出力したイベントを検索するウィンドウ
+
+    キーワードはこのウィンドウで、期間・レベル・イベントID・ソースはメイン画面の絞り込み条件で指定する。
+    結果をダブルクリックすると、そのCSVを EventViewer で開く。
+    """
+
+    COLUMNS = (
+        ('time', "日時", 140),
+        ('event_id', "イベントID", 70),
+        ('level', "レベル", 60),
+        ('source', "ソース", 140),
+        ('message', "メッセージ", 380),
+        ('file', "ファイル", 220),
+    )
+    # 表示する最大件数（新しい順）
+    LIMIT = 1000
+
+    def __init__(self, app):
+        self.app = app
+        self.hits = []
+        self.closed = False
+        self.cancel_token = CancelToken()
+        self._generation = 0
+        
+        self.window = tk.Toplevel(app.root)
+        self.window.title(f"イベントの検索 - {app.WINDOW_TITLE_SUFFIX}")
+        self.window.geometry("1000x600")
+        self.window.configure(bg=app.colors['bg_primary'])
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.create_widgets()
+    
+    def create_widgets(self):
+        colors = self.app.colors
+        font_family = self.app.font_family
+        
+        toolbar = tk.Frame(self.window, bg=colors['bg_primary'])
+        toolbar.pack(fill="x", padx=10, pady=(10, 5))
+        
+        tk.Label(
+            toolbar,
+            text="キーワード",
+            font=(font_family, 9),
+            fg=colors['text_secondary'],
+            bg=colors['bg_primary']
+        ).pack(side="left", padx=(0, 5))
+        self.keyword_var = tk.StringVar()
+        entry = tk.Entry(toolbar, textvariable=self.keyword_var, width=40, font=(font_family, 10))
+        entry.pack(side="left", padx=(0, 10))
+        entry.bind("<Return>", lambda event: self.search())
+        entry.focus_set()
+        ttk.Button(toolbar, text="🔎 検索", command=self.search).pack(side="left")
+        
+        self.status_label = tk.Label(
+            toolbar,
+            text="期間・レベル・イベントID・ソースはメイン画面の絞り込み条件を使います",
+            font=(font_family, 9),
+            fg=colors['text_secondary'],
+            bg=colors['bg_primary']
+        )
+        self.status_label.pack(side="right")
+        
+        body = tk.Frame(self.window, bg=colors['bg_primary'])
+        body.pack(fill="both", expand=True, padx=10)
+        self.tree = ttk.Treeview(
+            body,
+            columns=[key for key, _, _ in self.COLUMNS],
+            show="headings",
+            selectmode="browse",
+            style='Viewer.Treeview'
         )
-        label.pack(pady=(30, 20))
+        for key, title, width in self.COLUMNS:
+            self.tree.heading(key, text=title)
+            self.tree.column(key, width=width, stretch=(key == 'message'))
+        self.tree.tag_configure(LEVEL_LABELS[LEVEL_ERROR], foreground='#ff6b6b')
+        self.tree.tag_configure(LEVEL_LABELS[LEVEL_WARNING], foreground=colors['accent_yellow'])
+        scrollbar = ttk.Scrollbar(body, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree.bind("<Double-1>", self._on_open)
+        
+        self.detail = tk.Text(
+            self.window,
+            height=8,
+            wrap="word",
+            font=(font_family, 9),
+            bg=colors['bg_secondary'],
+            fg=colors['text_primary'],
+            relief="flat"
+        )
+        self.detail.pack(fill="x", padx=10, pady=(5, 10))
+        self.detail.configure(state="disabled")
+    
+    def search(self):
+        """入力された条件で検索する（索引にないCSVの取り込みを含めてバックグラウンドで処理）"""
+        try:
+            event_filter, _ = self.app.read_filter_options()
+        except ValueError as e:
+            self.app.show_modern_error("入力エラー", str(e))
+            return
+        keyword = self.keyword_var.get().strip()
+        self._generation += 1
+        generation = self._generation
+        self.status_label.configure(text="検索しています...")
+        
+        def run():
+            started = time.perf_counter()
+            try:
+                index = self.app.search_index
+                index.sync(self.cancel_token)
+                hits = index.search(keyword, event_filter, limit=self.LIMIT)
+            except CollectionCancelled:
+                return
+            except Exception as e:
+                self.app.post_ui(self._show_error, generation, e)
+                return
+            self.app.post_ui(self._show_hits, generation, hits, time.perf_counter() - started)
+        
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+    
+    def _show_error(self, generation, error):
+        if self.closed or generation != self._generation:
+            return
+        self.status_label.configure(text="検索できませんでした")
+        self.app.show_modern_error("エラー", f"検索中にエラーが発生しました:\n{error}")
+    
+    def _show_hits(self, generation, hits, elapsed):
+        # 続けて検索した場合は最後の結果だけを表示する
+        if self.closed or generation != self._generation:
+            return
+        self.hits = hits
+        self.tree.delete(*self.tree.get_children())
+        for i, hit in enumerate(hits):
+            lines = (hit['message'] or "").splitlines()
+            level = LEVEL_LABELS[hit['level']]
+            self.tree.insert("", "end", iid=str(i), tags=(level,), values=[
+                format_timestamp(hit['time']) if hit['time'] is not None else "",
+                hit['event_id'],
+                level,
+                hit['source'],
+                lines[0] + " …" if len(lines) > 1 else (lines[0] if lines else ""),
+                os.path.relpath(hit['file'], self.app.output_root),
+            ])
+        more = f"（新しい順に{self.LIMIT}件まで表示）" if len(hits) >= self.LIMIT else ""
+        self.status_label.configure(text=f"{len(hits):,} 件{more}（{elapsed * 1000:.0f}ミリ秒）")
+    
+    def _selected_hit(self):
+        selection = self.tree.selection()
+        return self.hits[int(selection[0])] if selection else None
+    
+    def _on_select(self, event):
+        hit = self._selected_hit()
+        if hit is None:
+            return
+        text = (f"日時: {format_timestamp(hit['time']) if hit['time'] is not None else ''}\n"
+                f"イベントID: {hit['event_id']}\nレベル: {LEVEL_LABELS[hit['level']]}\n"
+                f"ソース: {hit['source']}\nファイル: {hit['file']}\n\n{hit['message'] or ''}")
+        self.detail.configure(state="normal")
+        self.detail.delete("1.0", "end")
+        self.detail.insert("1.0", text)
+        self.detail.configure(state="disabled")
+    
+    def _on_open(self, event):
+        hit = self._selected_hit()
+        if hit is None:
+            return
+        if not os.path.exists(hit['file']):
+            self.app.show_modern_error("エラー", f"ファイルが見つかりません:\n{hit['file']}")
+            return
+        EventViewer(self.app, hit['file'])
+    
+    def close(self):
+        """検索を止めてウィンドウを閉じる"""
+        self.closed = True
+        self.cancel_token.cancel()
+        self.window.destroy()
+
+
+def confirm_without_admin():
+    """管理者権限がない場合に続行するかを確認する（続行する場合はTrue）"""
+    should_start_app = True
+    root = tk.Tk()
+    root.withdraw()  # メインウィンドウ非表示
+
+    def on_continue():
+        nonlocal should_start_app
+        should_start_app = True
+        root.quit()
+        root.destroy()
+
+    def on_exit():
+        nonlocal should_start_app
+        should_start_app = False
+        root.quit()
+        root.destroy()
+
+    dialog = tk.Toplevel()
+    dialog.title(f"権限不足 - ILCollector - イベントログ収集ツール")
+    dialog.geometry("400x180")
+    dialog.resizable(False, False)
+    dialog.grab_set()
+    dialog.configure(bg="#2d2d2d")
+
+    label = tk.Label(
+        dialog,
+        text="このプログラムは管理者権限で実行することを推奨します。\n一部の機能が正常に動作しない可能性があります。",
+        bg="#2d2d2d",
+        fg="#ffffff",
+        font=("メイリオ", 11),
+        wraplength=360,
+        justify="center"
+    )
+    label.pack(pady=(30, 20))
+
+    btn_frame = tk.Frame(dialog, bg="#2d2d2d")
+    btn_frame.pack(pady=(0, 20))
 
-        btn_frame = tk.Frame(dialog, bg="#2d2d2d")
-        btn_frame.pack(pady=(0, 20))
+    continue_btn = ttk.Button(btn_frame, text="続行", command=on_continue)
+    continue_btn.pack(side="left", padx=15)
+    exit_btn = ttk.Button(btn_frame, text="終了", command=on_exit)
+    exit_btn.pack(side="left", padx=15)
 
-        continue_btn = ttk.Button(btn_frame, text="続行", command=on_continue)
-        continue_btn.pack(side="left", padx=15)
-        exit_btn = ttk.Button(btn_frame, text="終了", command=on_exit)
-        exit_btn.pack(side="left", padx=15)
+    root.mainloop()
+    return should_start_app
 
-        root.mainloop()
 
+def is_admin():
+    """管理者権限で実行されているか（判定できない場合はTrue）"""
     try:
-        if not ctypes.windll.shell32.IsUserAnAdmin():
-            show_admin_dialog()
+        import ctypes
+        return bool(ctypes.windll.shell32.IsUserAnAdmin())
     except Exception:
-        pass
+        return True
+
 
+def launch_gui(output_root=None):
+    """GUIを起動する"""
+    load_tkinter()
+    
+    # 管理者権限の確認
+    if not is_admin() and not confirm_without_admin():
+        return
+    
     # アプリケーションの起動
-    if should_start_app:
-        app = ModernILCollector()
-        app.run()
\ No newline at end of file
+    app = ModernILCollector(output_root)
+    app.run()
+
+
+def build_parser():
+    """コマンドライン引数の定義"""
+    parser = argparse.ArgumentParser(
+        prog="ILCollector",
+        description="Windows Server イベントログ & システム情報収集ツール（引数なしで起動するとGUIを表示）"
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    
+    collect_parser = subparsers.add_parser("collect", help="GUIを使わずに収集する")
+    collect_parser.add_argument("-c", "--channels", nargs="*", default=None, metavar="CHANNEL[:LIMIT]",
+                                help="収集するイベントログ（既定: System Application）。"
+                                     "\"Security:5000\" のように件数上限を個別に指定できる")
+    collect_parser.add_argument("--evtx", nargs="+", default=[], metavar="FILE",
+                                help="稼働中のログの代わりに.evtxファイルを読み込んでCSVに変換する")
+    collect_parser.add_argument("-o", "--output", default=None,
+                                help="出力ルート（既定: カレントディレクトリ）")
+    collect_parser.add_argument("-n", "--limit", type=int, default=1000,
+                                help="ログごとの最大件数（0で無制限）")
+    collect_parser.add_argument("-j", "--workers", type=int, default=Collector.MAX_CHANNEL_WORKERS,
+                                help="イベントログを同時に読み込むワーカー数")
+    collect_parser.add_argument("--reader", choices=Collector.READERS, default="legacy",
+                                help="稼働中のイベントログの読み込み方式"
+                                     "（evtquery: 絞り込み条件をサーバー側で適用するEvtQuery/EvtNext）")
+    collect_parser.add_argument("--batch-size", type=int, default=EvtQuerySource.DEFAULT_BATCH_SIZE,
+                                help="evtquery で1回のEvtNextで取得する件数")
+    collect_parser.add_argument("--profile", action="store_true",
+                                help="イベントログの読み込み・整形・書き込みの cProfile の結果を出力フォルダに保存する")
+    collect_parser.add_argument("--hosts", nargs="+", default=None, metavar="HOST",
+                                help="フリート収集: 指定したホストのイベントログをホストごとのサブフォルダに収集する")
+    collect_parser.add_argument("--hosts-file", default=None, metavar="FILE",
+                                help="フリート収集のホストの一覧（1行に1台、#以降はコメント）")
+    collect_parser.add_argument("--max-hosts", type=int, default=Collector.MAX_HOSTS,
+                                help="フリート収集で同時に接続するホスト数")
+    collect_parser.add_argument("--host-timeout", type=float, default=Collector.HOST_TIMEOUT, metavar="SECONDS",
+                                help="フリート収集のホストごとの制限時間（超えたホストは書き込み済みの分までで打ち切る）")
+    collect_parser.add_argument("--retries", type=int, default=Collector.HOST_RETRIES,
+                                help="フリート収集でホストへの接続に失敗したときの再試行回数")
+    collect_parser.add_argument("-f", "--format", dest="formats", nargs="+", choices=list(EXPORT_FORMATS),
+                                default=["csv"],
+                                help="イベントログの出力形式（複数指定すると1回の読み込みでそれぞれの形式に出力する）")
+    collect_parser.add_argument("--split-size", type=parse_size, default=None, metavar="SIZE",
+                                help="イベントログのCSVをこのサイズ（例: 500MB, 2GB）を目安に番号付きのファイルに分ける")
+    collect_parser.add_argument("--split-rows", type=int, default=None, metavar="ROWS",
+                                help="イベントログのCSVをこの行数ごとに番号付きのファイルに分ける")
+    add_filter_arguments(collect_parser, "出力する")
+    collect_parser.add_argument("--index", action="store_true",
+                                help="出力したイベントを検索用の索引（event_index.sqlite3）にも登録する"
+                                     "（登録しなかったCSVは search の実行時に取り込む）")
+    collect_parser.add_argument("--incremental", action="store_true",
+                                help="前回の続きから差分のみ出力ルートのCSVに追記する")
+    collect_parser.add_argument("--timeline", action="store_true",
+                                help="出力したイベントログを日時順に1つにまとめた Timeline_<日時>.csv も出力する（差分取得は対象外）")
+    collect_parser.add_argument("--resume", action="store_true",
+                                help="異常終了した（チェックポイントが残った）エクスポートを続きから出力する")
+    collect_parser.add_argument("--systeminfo", action="store_true",
+                                help="システム情報も出力する")
+    collect_parser.add_argument("--sysinfo-timeout", type=float, default=None, metavar="SECONDS",
+                                help="システム情報の各セクションの制限時間（超えたセクションは省略する）")
+    collect_parser.add_argument("--msinfo32", action="store_true",
+                                help="msinfo32 のレポートもバックグラウンドで出力する"
+                                     f"（{SystemInfoCollector.MSINFO32_TIMEOUT}秒で打ち切り）")
+    
+    search_parser = subparsers.add_parser("search", help="過去の収集を含めて出力したイベントを検索する")
+    search_parser.add_argument("keywords", nargs="*", metavar="KEYWORD",
+                               help="メッセージに含まれる語（複数指定するとすべてを含むもの）")
+    search_parser.add_argument("-o", "--output", default=None,
+                               help="出力ルート（既定: カレントディレクトリ）")
+    search_parser.add_argument("-n", "--limit", type=int, default=100,
+                               help="表示する最大件数（新しい順、0で無制限）")
+    add_filter_arguments(search_parser, "検索する")
+    
+    return parser
+
+
+def add_filter_arguments(parser, verb):
+    """絞り込み条件の引数を追加する"""
+    parser.add_argument("--since", type=parse_time, default=None,
+                        help=f"この日時以降のイベントだけを{verb}（例: \"2025-01-31 09:00\", 24h, 7d）")
+    parser.add_argument("--until", type=parse_time, default=None,
+                        help=f"この日時以前のイベントだけを{verb}")
+    parser.add_argument("--levels", nargs="+", choices=list(EventFilter.LEVELS), default=None,
+                        help=f"{verb}レベル")
+    parser.add_argument("--event-ids", nargs="+", type=int, default=None, metavar="ID",
+                        help=f"{verb}イベントID")
+    parser.add_argument("--sources", nargs="+", default=None, metavar="SOURCE",
+                        help=f"{verb}ソース名")
+
+
+def filter_from_args(args):
+    """引数の絞り込み条件から EventFilter を作る"""
+    return EventFilter(
+        since=args.since,
+        until=args.until,
+        levels=args.levels,
+        event_ids=args.event_ids,
+        sources=args.sources
+    )
+
+
+def run_cli(args):
+    """コマンドラインで収集を実行する（終了コードを返す）"""
+    if not is_admin():
+        print("警告: 管理者権限で実行していないため、一部のログを取得できない可能性があります。", file=sys.stderr)
+    
+    try:
+        channels, channel_limits = (None, {}) if args.channels is None else parse_channels(args.channels)
+    except ValueError as e:
+        print(f"エラー: {e}", file=sys.stderr)
+        return 1
+    
+    event_filter = filter_from_args(args)
+    
+    try:
+        hosts = read_hosts(args.hosts, args.hosts_file)
+    except OSError as e:
+        print(f"エラー: ホストの一覧を読み込めませんでした: {e}", file=sys.stderr)
+        return 1
+    if hosts and args.evtx:
+        print("エラー: --evtx はフリート収集と同時に指定できません", file=sys.stderr)
+        return 1
+    
+    collector = Collector(
+        args.output,
+        max_workers=args.workers,
+        reader=args.reader,
+        batch_size=args.batch_size,
+        profile=args.profile,
+        msinfo32=args.msinfo32,
+        sysinfo_timeout=args.sysinfo_timeout,
+        index_events=args.index,
+        part_bytes=args.split_size,
+        part_rows=args.split_rows or None,
+        formats=args.formats
+    )
+    if args.resume:
+        try:
+            results = collector.resume_interrupted()
+        finally:
+            collector.close()
+        if not results:
+            print("再開するエクスポートはありません。", file=sys.stderr)
+        print_results(results)
+        return 0 if all(r.ok for r in results) else 1
+    
+    interrupted = collector.find_interrupted()
+    if interrupted:
+        print(f"警告: 異常終了したエクスポートが{len(interrupted)}件あります（--resume で続きから出力できます）。",
+              file=sys.stderr)
+    
+    if args.timeline and args.incremental:
+        print("警告: 差分取得ではタイムラインを出力しません。", file=sys.stderr)
+    elif args.timeline and "csv" not in args.formats:
+        print("警告: タイムラインはCSVから作るため、--format に csv がない場合は出力しません。", file=sys.stderr)
+    if args.incremental and args.formats != ["csv"]:
+        print("警告: 差分取得はCSVにのみ追記します。", file=sys.stderr)
+    
+    if hosts:
+        if args.systeminfo:
+            print("警告: フリート収集ではシステム情報を出力しません。", file=sys.stderr)
+        try:
+            results = collector.collect_fleet(
+                hosts,
+                channels=channels,
+                limit=args.limit or None,
+                incremental=args.incremental,
+                event_filter=event_filter,
+                channel_limits=channel_limits,
+                max_hosts=args.max_hosts,
+                host_timeout=args.host_timeout or None,
+                retries=args.retries,
+                timeline=args.timeline
+            )
+        finally:
+            collector.close()
+        return print_fleet_results(results)
+    
+    try:
+        results = collector.collect(
+            channels=channels,
+            systeminfo=args.systeminfo,
+            limit=args.limit or None,
+            incremental=args.incremental,
+            evtx_files=args.evtx,
+            event_filter=event_filter,
+            channel_limits=channel_limits,
+            timeline=args.timeline
+        )
+    finally:
+        collector.close()
+    
+    print_results(results)
+    return 0 if all(r.ok for r in results) else 1
+
+
+def print_results(results, indent=""):
+    """ジョブごとの結果を表示する"""
+    for result in results:
+        if result.ok:
+            count = result.value.get('events')
+            detail = f"（{count}件）" if count is not None else ""
+            files = ", ".join((result.value.get('files') or {'': result.value['file']}).values())
+            print(f"{indent}OK  {result.name}: {files}{detail}")
+        elif isinstance(result.error, CollectionCancelled) and result.error.output_file:
+            print(f"{indent}中断 {result.name}: {result.error.output_file}（{result.error}）", file=sys.stderr)
+        else:
+            print(f"{indent}NG  {result.name}: {result.error}", file=sys.stderr)
+
+
+def print_fleet_results(results):
+    """フリート収集のホストごとの結果を表示する（終了コードを返す）"""
+    failed = 0
+    for result in results:
+        if not result.ok:
+            failed += 1
+            print(f"NG  {result.name}: {result.error}", file=sys.stderr)
+            continue
+        value = result.value
+        ok = all(r.ok for r in value['results'])
+        failed += not ok
+        status = "OK " if ok else ("時間切れ" if value['timed_out'] else "NG ")
+        print(f"{status} {result.name}: {value['folder']}（{value['events']}件）")
+        print_results(value['results'], indent="    ")
+    print(f"{len(results) - failed}/{len(results)}台のホストを収集しました", file=sys.stderr)
+    return 0 if not failed else 1
+
+
+def run_search(args):
+    """出力したイベントを検索して表示する（終了コードを返す）"""
+    collector = Collector(args.output)
+    started = time.perf_counter()
+    try:
+        hits = collector.search(" ".join(args.keywords), filter_from_args(args), limit=args.limit or None)
+    except sqlite3.Error as e:
+        print(f"エラー: 索引を検索できませんでした: {e}", file=sys.stderr)
+        return 1
+    finally:
+        collector.close()
+    elapsed = time.perf_counter() - started
+    
+    rows = []
+    for hit in hits:
+        lines = (hit['message'] or "").splitlines()
+        rows.append([
+            format_timestamp(hit['time']) if hit['time'] is not None else "",
+            hit['event_id'],
+            LEVEL_LABELS[hit['level']],
+            hit['source'],
+            (lines[0][:80] if lines else "") + (" …" if len(lines) > 1 or (lines and len(lines[0]) > 80) else ""),
+            os.path.relpath(hit['file'], collector.output_root),
+        ])
+    if rows:
+        for line in _format_table(rows, ['日時', 'イベントID', 'レベル', 'ソース', 'メッセージ', 'ファイル']):
+            print(line)
+    print(f"{len(hits)}件（{elapsed * 1000:.0f}ミリ秒）", file=sys.stderr)
+    return 0 if hits else 1
+
+
+def main(argv=None):
+    """エントリポイント（サブコマンドがなければGUIを起動する）"""
+    args = build_parser().parse_args(argv)
+    
+    if args.command == "collect":
+        return run_cli(args)
+    if args.command == "search":
+        return run_search(args)
+    
+    launch_gui()
+    return 0
+
+
+# メイン実行部分
+if __name__ == "__main__":
+    sys.exit(main())
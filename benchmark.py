@@ -0,0 +1,899 @@
+"""ILCollector のベンチマーク
+
+Windows 以外の環境でも実行できるよう、擬似データと擬似フォーマッタ・擬似 win32evtlog を使って計測する。
+
+    python benchmark.py cache --events 20000 --sources 20 --ids 50
+    python benchmark.py startup --runs 10
+    python benchmark.py reader --events 50000 --levels error --batch-sizes 16 64 256 1024
+    python benchmark.py suite --sizes 1000 10000 100000 --save baseline.json
+    python benchmark.py suite --sizes 1000 10000 100000 --baseline baseline.json
+    python benchmark.py fleet --hosts 50 --down 2 --flaky 3 --slow 1 --max-hosts 8
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from event_records import (
+    EVENTLOG_ERROR_TYPE, EVENTLOG_INFORMATION_TYPE, EVENTLOG_WARNING_TYPE, EventTime, decode_eventlog_records,
+)
+from eventlog_readers import EventFilter
+from ILCollector import Collector, FakeMessageFormatter, MessageFormatCache, apply_inserts
+
+
+class SyntheticEvent:
+    """計測用の擬似イベントレコード（ReadEventLog が返すpywin32のイベントオブジェクトと同じ属性）"""
+
+    __slots__ = ('RecordNumber', 'TimeGenerated', 'EventID', 'EventType', 'SourceName', 'StringInserts',
+                 'ComputerName', 'EventCategory')
+
+    def __init__(self, record_number, event_id, source_name, string_inserts,
+                 time_generated=None, event_type=EVENTLOG_INFORMATION_TYPE):
+        self.RecordNumber = record_number
+        self.TimeGenerated = time_generated
+        self.EventID = event_id
+        self.EventType = event_type
+        self.SourceName = source_name
+        self.StringInserts = string_inserts
+        self.ComputerName = "BENCH"
+        self.EventCategory = 0
+
+
+# 擬似イベントの種類の割合（エラー:警告:情報 = 1:2:7）
+_EVENT_TYPES = [EVENTLOG_ERROR_TYPE] + [EVENTLOG_WARNING_TYPE] * 2 + [EVENTLOG_INFORMATION_TYPE] * 7
+
+
+class SyntheticLog:
+    """レコード番号から決定的に生成する擬似イベントログ
+
+    イベントは参照されるたびに生成するため、100万件でもメモリを使わない。
+    ソースの種類数・イベントIDの種類数・挿入文字列の数と長さを変えられる。
+    """
+
+    def __init__(self, count, sources=20, ids=50, inserts=2, message_length=80, seed=0,
+                 start=datetime(2025, 1, 1), interval=timedelta(seconds=10)):
+        self.count = count
+        self.sources = [f"Source{i:03d}" for i in range(sources)]
+        self.ids = ids
+        self.inserts = inserts
+        self.message_length = message_length
+        self.seed = seed
+        self._start = start.timestamp()
+        self._interval = interval.total_seconds()
+        self._filler = "x" * max(message_length // max(inserts, 1), 1)
+
+    def event(self, number):
+        """RecordNumber（1始まり）のイベントを返す"""
+        h = (number * 2654435761 + self.seed * 40503) & 0xFFFFFFFF
+        return SyntheticEvent(
+            number,
+            (h >> 4) % self.ids,
+            self.sources[(h >> 12) % len(self.sources)],
+            tuple(f"{i}-{number}-{self._filler}" for i in range(self.inserts)),
+            EventTime.fromtimestamp(self._start + self._interval * number),
+            _EVENT_TYPES[(h >> 20) % len(_EVENT_TYPES)]
+        )
+
+    def __iter__(self):
+        return (self.event(number) for number in range(1, self.count + 1))
+
+    def describe(self):
+        return (f"{self.count}件 ソース{len(self.sources)} ID{self.ids} "
+                f"挿入{self.inserts}個 メッセージ{self.message_length}文字")
+
+
+def generate_events(count, sources, ids, seed=0):
+    """ソース数・イベントID数を指定して擬似イベントを生成する（古い順）"""
+    return iter(SyntheticLog(count, sources, ids, seed=seed))
+
+
+class FakeEventLogApi:
+    """ReadEventLog と EvtQuery/EvtNext の両方を提供する擬似 win32evtlog
+
+    API呼び出し1回ごとの遅延（call_delay）と、転送するイベント1件ごとの遅延
+    （event_delay）を再現する。ReadEventLog はバッファ（64KB）に収まる件数ずつ返し、
+    EvtQuery はXPathのうち Level / EventID / TimeCreated / EventRecordID の条件を
+    サーバー側で適用する。
+    """
+
+    EVENTLOG_SEQUENTIAL_READ = 0x0001
+    EVENTLOG_SEEK_READ = 0x0002
+    EVENTLOG_FORWARDS_READ = 0x0004
+    EVENTLOG_BACKWARDS_READ = 0x0008
+
+    EvtQueryChannelPath = 0x1
+    EvtQueryForwardDirection = 0x100
+    EvtQueryReverseDirection = 0x200
+    EvtRenderContextSystem = 1
+    EvtRenderContextUser = 2
+    EvtRenderEventValues = 0
+    EvtFormatMessageEvent = 1
+    EvtRpcLogin = 1
+    EvtRpcLoginAuthDefault = 0
+
+    (EvtSystemProviderName, EvtSystemProviderGuid, EvtSystemEventID, EvtSystemQualifiers, EvtSystemLevel,
+     EvtSystemTask, EvtSystemOpcode, EvtSystemKeywords, EvtSystemTimeCreated, EvtSystemEventRecordId,
+     EvtSystemActivityID, EvtSystemRelatedActivityID, EvtSystemProcessID, EvtSystemThreadID,
+     EvtSystemChannel, EvtSystemComputer, EvtSystemUserID, EvtSystemVersion) = range(18)
+
+    _LEVELS = {EVENTLOG_ERROR_TYPE: 2, EVENTLOG_WARNING_TYPE: 3, EVENTLOG_INFORMATION_TYPE: 4}
+
+    def __init__(self, log, call_delay=0.002, event_delay=0.000005, buffer_size=0x10000):
+        self.log = log
+        self.call_delay = call_delay
+        self.event_delay = event_delay
+        record_size = 200 + 2 * log.message_length
+        self.per_buffer = max(1, buffer_size // record_size)
+        self.calls = 0
+
+    def _spend(self, count):
+        self.calls += 1
+        delay = self.call_delay + self.event_delay * count
+        if delay > 0:
+            time.sleep(delay)
+
+    def module(self):
+        """win32evtlog として sys.modules に登録できるモジュールを返す"""
+        module = types.ModuleType("win32evtlog")
+        for name in dir(self):
+            if not name.startswith("_") and name not in ("log", "module", "calls"):
+                setattr(module, name, getattr(self, name))
+        return module
+
+    # ReadEventLog
+    def OpenEventLog(self, server, log_name):
+        return {'next': None}
+
+    def GetOldestEventLogRecord(self, handle):
+        return 1 if self.log.count else 0
+
+    def GetNumberOfEventLogRecords(self, handle):
+        return self.log.count
+
+    def ReadEventLog(self, handle, flags, offset):
+        backwards = flags & self.EVENTLOG_BACKWARDS_READ
+        if flags & self.EVENTLOG_SEEK_READ:
+            handle['next'] = offset
+        elif handle['next'] is None:
+            handle['next'] = self.log.count if backwards else 1
+        start = handle['next']
+        if backwards:
+            numbers = range(start, max(start - self.per_buffer, 0), -1)
+        else:
+            numbers = range(start, min(start + self.per_buffer, self.log.count + 1))
+        batch = [self.log.event(number) for number in numbers]
+        handle['next'] = start - len(batch) if backwards else start + len(batch)
+        self._spend(len(batch))
+        return batch
+
+    def CloseEventLog(self, handle):
+        pass
+
+    # EvtQuery / EvtNext
+    def EvtQuery(self, path, flags, query=None, session=None):
+        matches = self._compile(query or "*")
+        if flags & self.EvtQueryReverseDirection:
+            numbers = range(self.log.count, 0, -1)
+        else:
+            numbers = range(1, self.log.count + 1)
+        self._spend(0)
+        return (event for event in map(self.log.event, numbers) if matches(event))
+
+    def _compile(self, query):
+        levels = {int(v) for v in re.findall(r"Level=(\d+)", query)}
+        ids = {int(v) for v in re.findall(r"EventID=(\d+)", query)}
+        since = re.search(r"@SystemTime>='([^']+)'", query)
+        until = re.search(r"@SystemTime<='([^']+)'", query)
+        start = re.search(r"EventRecordID>=(\d+)", query)
+        since = _parse_system_time(since.group(1)) if since else None
+        until = _parse_system_time(until.group(1)) if until else None
+        start = int(start.group(1)) if start else None
+
+        def matches(event):
+            if levels and self._LEVELS[event.EventType] not in levels:
+                return False
+            if ids and event.EventID not in ids:
+                return False
+            if since is not None and event.TimeGenerated.timestamp() < since:
+                return False
+            if until is not None and event.TimeGenerated.timestamp() > until:
+                return False
+            return start is None or event.RecordNumber >= start
+        return matches
+
+    def EvtNext(self, result_set, count, timeout=-1, flags=0):
+        batch = []
+        for event in result_set:
+            batch.append(event)
+            if len(batch) >= count:
+                break
+        self._spend(len(batch))
+        return tuple(batch)
+
+    def EvtCreateRenderContext(self, flags):
+        return flags
+
+    def EvtRender(self, event, flags, Context=None):
+        if Context == self.EvtRenderContextUser:
+            return [(value, 1) for value in event.StringInserts]
+        values = [(None, 0)] * 18
+        values[self.EvtSystemProviderName] = (event.SourceName, 1)
+        values[self.EvtSystemEventID] = (event.EventID, 6)
+        values[self.EvtSystemLevel] = (self._LEVELS[event.EventType], 4)
+        values[self.EvtSystemKeywords] = (0, 21)
+        values[self.EvtSystemTimeCreated] = (event.TimeGenerated.astimezone(timezone.utc), 17)
+        values[self.EvtSystemEventRecordId] = (event.RecordNumber, 10)
+        values[self.EvtSystemChannel] = ("System", 1)
+        values[self.EvtSystemComputer] = ("BENCH", 1)
+        return values
+
+    def EvtOpenPublisherMetadata(self, name, session=None):
+        return name
+
+    def EvtFormatMessage(self, metadata, event, flags):
+        template = f"{metadata} event {event.EventID}: %1 / %2 {'x' * self.log.message_length}"
+        return apply_inserts(template, event.StringInserts)
+
+
+class FakeRpcError(Exception):
+    """擬似のRPCエラー（pywintypes.error と同じく winerror を持つ）"""
+
+    def __init__(self, winerror, funcname, message):
+        super().__init__(winerror, funcname, message)
+        self.winerror = winerror
+
+
+class FakeHost:
+    """擬似のリモートホスト
+
+    down のホストは接続のたびに RPC_S_SERVER_UNAVAILABLE（1722）、failures を指定したホストは
+    最初のその回数の接続に失敗する。latency は接続とAPI呼び出しごとの遅延（秒）。
+    """
+
+    def __init__(self, name, latency=0.01, down=False, failures=0):
+        self.name = name
+        self.latency = latency
+        self.down = down
+        self.failures = failures
+
+
+class _FakeResultSet:
+    def __init__(self, events, host):
+        self.events = events
+        self.host = host
+
+    def __iter__(self):
+        return self.events
+
+
+class FakeFleetApi(FakeEventLogApi):
+    """複数のホストを再現する擬似 win32evtlog（フリート収集の計測・動作確認用のサーバーの代わり）
+
+    ホストごとに接続の失敗と遅延を再現し、接続・セッション・プロバイダーのメタデータを開いた回数を数える。
+    どのホストも同じ擬似イベントログを返す。
+    """
+
+    EvtOpenChannelPath = 1
+
+    def __init__(self, log, hosts, **kwargs):
+        super().__init__(log, **kwargs)
+        self.hosts = {host.name: host for host in hosts}
+        self.connects = 0
+        self.sessions = 0
+        self.publisher_opens = 0
+        self._lock = threading.Lock()
+
+    def _connect(self, server, funcname):
+        host = self.hosts.get(server)
+        with self._lock:
+            self.connects += 1
+            if host is None or host.down:
+                raise FakeRpcError(1722, funcname, "RPC サーバーを利用できません。")
+            if host.failures:
+                host.failures -= 1
+                raise FakeRpcError(1727, funcname, "リモート プロシージャ コールに失敗し、実行されませんでした。")
+        time.sleep(host.latency)
+        return host
+
+    # ReadEventLog
+    def OpenEventLog(self, server, log_name):
+        return {'next': None, 'host': self._connect(server, "OpenEventLog")}
+
+    def ReadEventLog(self, handle, flags, offset):
+        time.sleep(handle['host'].latency)
+        return super().ReadEventLog(handle, flags, offset)
+
+    # EvtQuery / EvtNext
+    def EvtOpenSession(self, login, login_class, timeout=0, flags=0):
+        # 実際の API と同じく、セッションを開いただけでは接続しない
+        with self._lock:
+            self.sessions += 1
+        return {'server': login[0]}
+
+    def EvtOpenLog(self, path, flags, session=None):
+        return self._connect(session['server'] if session else None, "EvtOpenLog")
+
+    def EvtQuery(self, path, flags, query=None, session=None):
+        host = self._connect(session['server'] if session else None, "EvtQuery")
+        return _FakeResultSet(super().EvtQuery(path, flags, query, session), host)
+
+    def EvtNext(self, result_set, count, timeout=-1, flags=0):
+        time.sleep(result_set.host.latency)
+        return super().EvtNext(iter(result_set), count, timeout, flags)
+
+    def EvtOpenPublisherMetadata(self, name, session=None):
+        with self._lock:
+            self.publisher_opens += 1
+        if session is not None:
+            time.sleep(self.hosts[session['server']].latency)
+        return name
+
+
+def _parse_system_time(text):
+    return datetime.strptime(text, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc).timestamp()
+
+
+def install_fake_win32(api):
+    """擬似 win32evtlog / win32evtlogutil / win32con を sys.modules に登録する"""
+    formatter = FakeMessageFormatter(load_delay=0, template_delay=0, message_length=api.log.message_length)
+    util = types.ModuleType("win32evtlogutil")
+    util.SafeFormatMessage = lambda event, logType=None: formatter.safe_format_message(event, logType)
+    sys.modules["win32evtlog"] = api.module()
+    sys.modules["win32evtlogutil"] = util
+    sys.modules.setdefault("win32con", types.ModuleType("win32con"))
+
+
+def _evtx_name_hash(name):
+    value = 0
+    for char in name:
+        value = (value * 65599 + ord(char)) & 0xFFFFFFFF
+    return value & 0xFFFF
+
+
+class _EvtxChunkBuilder:
+    """合成 .evtx の64KBチャンクを1つ組み立てる（テンプレートは挿入文字列の数ごとに1つ）"""
+
+    SIZE = 0x10000
+    HEADER_SIZE = 0x200
+
+    _LEVELS = {EVENTLOG_ERROR_TYPE: 2, EVENTLOG_WARNING_TYPE: 3, EVENTLOG_INFORMATION_TYPE: 4}
+
+    def __init__(self):
+        self.buf = bytearray(self.HEADER_SIZE)
+        self.names = {}
+        self.templates = {}
+        self.first = self.last = None
+        self.last_offset = 0
+
+    def _name(self, name):
+        offset = self.names.get(name)
+        if offset is not None:
+            self.buf += struct.pack('<I', offset)
+            return
+        offset = len(self.buf) + 4
+        self.names[name] = offset
+        self.buf += struct.pack('<I', offset)
+        self.buf += struct.pack('<IHH', 0, _evtx_name_hash(name), len(name)) + name.encode('utf-16-le') + b"\0\0"
+
+    def _value(self, value):
+        if isinstance(value, tuple):
+            token = 0x0d if value[0] == 'normal' else 0x0e
+            self.buf += struct.pack('<BHB', token, value[1], value[2])
+        else:
+            self.buf += struct.pack('<BBH', 0x05, 0x01, len(value)) + value.encode('utf-16-le')
+
+    def _element(self, name, attrs=(), children=()):
+        self.buf += struct.pack('<BHI', 0x41 if attrs else 0x01, 0xFFFF, 0)
+        self._name(name)
+        if attrs:
+            self.buf += struct.pack('<I', 0)
+            for i, (attr_name, attr_value) in enumerate(attrs):
+                self.buf.append(0x46 if i < len(attrs) - 1 else 0x06)
+                self._name(attr_name)
+                self._value(attr_value)
+        if not children:
+            self.buf.append(0x03)
+            return
+        self.buf.append(0x02)
+        for child in children:
+            if isinstance(child, list):
+                self._element(*child)
+            else:
+                self._value(child)
+        self.buf.append(0x04)
+
+    def _template(self, inserts):
+        offset = self.templates.get(inserts)
+        if offset is not None:
+            self.buf += struct.pack('<BBII', 0x0c, 0x01, inserts, offset)
+            return
+        offset = len(self.buf) + 10
+        self.templates[inserts] = offset
+        self.buf += struct.pack('<BBII', 0x0c, 0x01, inserts, offset)
+        size_pos = len(self.buf) + 20
+        self.buf += struct.pack('<I16sI', 0, bytes(16), 0)
+        fragment_start = len(self.buf)
+        self.buf += b"\x0f\x01\x01\x00"
+        optional = lambda index, value_type: ('optional', index, value_type)
+        self._element('Event', [('xmlns', "http://schemas.microsoft.com/win/2004/08/events/event")], [
+            ['System', [], [
+                ['Provider', [('Name', optional(0, 0x01))]],
+                ['EventID', [('Qualifiers', optional(1, 0x06))], [('normal', 2, 0x06)]],
+                ['Level', [], [optional(3, 0x04)]],
+                ['Task', [], [optional(4, 0x06)]],
+                ['Keywords', [], [optional(5, 0x15)]],
+                ['TimeCreated', [('SystemTime', optional(6, 0x11))]],
+                ['EventRecordID', [], [optional(7, 0x0a)]],
+                ['Channel', [], [optional(8, 0x01)]],
+                ['Computer', [], [optional(9, 0x01)]],
+            ]],
+            ['EventData', [], [['Data', [('Name', f"param{i + 1}")], [optional(10 + i, 0x01)]]
+                               for i in range(inserts)]],
+        ])
+        self.buf.append(0x00)
+        struct.pack_into('<I', self.buf, size_pos, len(self.buf) - fragment_start)
+
+    def add(self, event, filetime, channel="System", computer="BENCH"):
+        """レコードを追加する（チャンクに収まらない場合はFalse）"""
+        start = len(self.buf)
+        names, templates = dict(self.names), dict(self.templates)
+        self.buf += bytes(24)
+        self.buf += b"\x0f\x01\x01\x00"
+        self._template(len(event.StringInserts))
+        values = [
+            (event.SourceName.encode('utf-16-le'), 0x01),
+            (struct.pack('<H', event.EventID >> 16), 0x06),
+            (struct.pack('<H', event.EventID & 0xFFFF), 0x06),
+            (struct.pack('<B', self._LEVELS.get(event.EventType, 4)), 0x04),
+            (struct.pack('<H', 0), 0x06),
+            (struct.pack('<Q', 0x8080000000000000), 0x15),
+            (struct.pack('<Q', filetime), 0x11),
+            (struct.pack('<Q', event.RecordNumber), 0x0a),
+            (channel.encode('utf-16-le'), 0x01),
+            (computer.encode('utf-16-le'), 0x01),
+        ] + [(text.encode('utf-16-le'), 0x01) for text in event.StringInserts]
+        self.buf += struct.pack('<I', len(values))
+        for data, value_type in values:
+            self.buf += struct.pack('<HBB', len(data), value_type, 0)
+        for data, _ in values:
+            self.buf += data
+        size = len(self.buf) - start + 4
+        if start + size > self.SIZE:
+            del self.buf[start:]
+            self.names, self.templates = names, templates
+            return False
+        struct.pack_into('<4sIQQ', self.buf, start, b"\x2a\x2a\x00\x00", size, event.RecordNumber, filetime)
+        self.buf += struct.pack('<I', size)
+        if self.first is None:
+            self.first = event.RecordNumber
+        self.last = event.RecordNumber
+        self.last_offset = start
+        return True
+
+    def finish(self):
+        free_space = len(self.buf)
+        buf = self.buf + bytes(self.SIZE - free_space)
+        struct.pack_into('<8sQQQQIII', buf, 0, b"ElfChnk\x00", self.first, self.last, self.first, self.last,
+                         128, self.last_offset, free_space)
+        struct.pack_into('<I', buf, 52, zlib.crc32(bytes(buf[self.HEADER_SIZE:free_space])))
+
+        def chain(table, slots, entries):
+            tails = {}
+            for key, offset in entries:
+                slot = key % slots
+                struct.pack_into('<I', buf, tails[slot] if slot in tails else table + slot * 4, offset)
+                tails[slot] = offset
+        chain(128, 64, [(_evtx_name_hash(name), offset) for name, offset in self.names.items()])
+        chain(384, 32, list(self.templates.items()))
+        struct.pack_into('<I', buf, 124, zlib.crc32(bytes(buf[0:120]) + bytes(buf[128:self.HEADER_SIZE])))
+        return bytes(buf)
+
+
+def write_synthetic_evtx(path, events):
+    """擬似イベントから .evtx ファイルを作成する（件数を返す）"""
+    filetime_offset = 116444736000000000
+    chunk_count = count = 0
+    last_record = 0
+    with open(path, 'wb') as f:
+        f.write(bytes(0x1000))
+        builder = _EvtxChunkBuilder()
+        for event in events:
+            filetime = int(event.TimeGenerated.timestamp() * 10 ** 7) + filetime_offset
+            if not builder.add(event, filetime):
+                f.write(builder.finish())
+                chunk_count += 1
+                builder = _EvtxChunkBuilder()
+                if not builder.add(event, filetime):
+                    raise ValueError(f"レコードがチャンクに収まりません: {event.RecordNumber}")
+            count += 1
+            last_record = event.RecordNumber
+        if builder.first is not None:
+            f.write(builder.finish())
+            chunk_count += 1
+        header = bytearray(0x1000)
+        struct.pack_into('<8sQQQIHHHH', header, 0, b"ElfFile\x00", 0, max(chunk_count - 1, 0), last_record + 1,
+                         128, 1, 3, 0x1000, chunk_count)
+        struct.pack_into('<I', header, 124, zlib.crc32(bytes(header[:120])))
+        f.seek(0)
+        f.write(header)
+    return count
+
+
+def bench_cache(args):
+    """メッセージキャッシュのヒット率と高速化率を計測する"""
+    events = list(generate_events(args.events, args.sources, args.ids, args.seed))
+
+    formatter = FakeMessageFormatter(load_delay=args.load_delay, template_delay=args.template_delay)
+    start = time.perf_counter()
+    for event in events:
+        formatter.safe_format_message(event, "System")
+    uncached = time.perf_counter() - start
+
+    cache = MessageFormatCache(
+        FakeMessageFormatter(load_delay=args.load_delay, template_delay=args.template_delay),
+        max_templates=args.max_templates,
+        max_modules=args.max_modules
+    )
+    records = decode_eventlog_records(events)
+    start = time.perf_counter()
+    for record in records:
+        cache.format(record, "System")
+    cached = time.perf_counter() - start
+    stats = cache.stats()
+    cache.close()
+
+    print(f"events           : {len(events)}")
+    print(f"uncached         : {uncached:.3f}s ({len(events) / uncached:,.0f} events/s)")
+    print(f"cached           : {cached:.3f}s ({len(events) / cached:,.0f} events/s)")
+    print(f"speedup          : {uncached / cached:.1f}x")
+    print(f"template hit/miss: {stats['template_hits']} / {stats['template_misses']}")
+    print(f"module hit/miss  : {stats['module_hits']} / {stats['module_misses']}")
+    print(f"hit rate         : {stats['hit_rate']:.1%}")
+
+
+def bench_startup(args):
+    """CLI経路の起動時間を計測する（GUI・pywin32を読み込んでいないことも確認する）"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ILCollector.py")
+
+    check = subprocess.run(
+        [sys.executable, "-c",
+         "import sys, ILCollector; print(sorted(m for m in ('tkinter', 'win32evtlog', 'win32api') if m in sys.modules))"],
+        cwd=os.path.dirname(script), capture_output=True, text=True
+    )
+    print(f"loaded at import : {check.stdout.strip() or check.stderr.strip()}")
+
+    timings = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, script, "collect", "--help"], capture_output=True, check=True)
+        timings.append(time.perf_counter() - start)
+
+    print(f"runs             : {args.runs}")
+    print(f"collect --help   : min {min(timings) * 1000:.1f}ms / "
+          f"median {statistics.median(timings) * 1000:.1f}ms / max {max(timings) * 1000:.1f}ms")
+
+
+def _bench_collector(root, log, reader="legacy", batch_size=None, formats=("csv",)):
+    collector = Collector(root, reader=reader, batch_size=batch_size, formats=formats)
+    collector.message_cache = MessageFormatCache(
+        FakeMessageFormatter(load_delay=0, template_delay=0, message_length=log.message_length)
+    )
+    return collector
+
+
+def bench_reader(args):
+    """ReadEventLog（legacy）と EvtQuery/EvtNext（evtquery）の読み込みを擬似APIで比較する"""
+    log = SyntheticLog(args.events, args.sources, args.ids, seed=args.seed)
+    api = FakeEventLogApi(log, call_delay=args.call_delay, event_delay=args.event_delay)
+    install_fake_win32(api)
+
+    since = log.event(log.count).TimeGenerated - timedelta(hours=args.hours) if args.hours else None
+    event_filter = EventFilter(since=since, levels=args.levels, event_ids=args.event_ids)
+    print(f"events           : {log.count}")
+    print(f"filter           : {event_filter.describe()}")
+    print(f"xpath            : {event_filter.to_xpath()}")
+
+    runs = [("legacy", None)] + [("evtquery", size) for size in args.batch_sizes]
+    with tempfile.TemporaryDirectory() as root:
+        for reader, batch_size in runs:
+            collector = _bench_collector(root, log, reader, batch_size)
+            api.calls = 0
+            start = time.perf_counter()
+            stats = collector.get_eventlog("System", os.path.join(root, "out.csv"), limit=None,
+                                           event_filter=event_filter)
+            elapsed = time.perf_counter() - start
+            collector.close()
+            label = reader if batch_size is None else f"{reader}({batch_size})"
+            print(f"{label:<17}: {elapsed:.3f}s {stats['write'].items}件 "
+                  f"read {stats['read'].items}件 API呼び出し {api.calls}回")
+
+
+# 計測するエクスポート経路と出力形式（"+" でつないだものは1回の読み込みで同時に出力する）
+EXPORT_PATHS = ("legacy", "evtquery", "incremental", "evtx")
+EXPORT_FORMATS = ("csv", "jsonl", "sqlite", "csv+jsonl+sqlite")
+
+
+def _run_export(path, export_format, root, log, evtx_file):
+    """エクスポートを1回実行し (件数, 出力ファイルのリスト) を返す"""
+    collector = _bench_collector(root, log, reader="evtquery" if path == "evtquery" else "legacy",
+                                 formats=export_format.split("+"))
+    try:
+        if path == "evtx":
+            results = collector.collect(systeminfo=False, limit=None, evtx_files=[evtx_file])
+        else:
+            results = collector.collect(channels=["System"], systeminfo=False, limit=None,
+                                        incremental=path == "incremental")
+    finally:
+        collector.close()
+    result = results[0]
+    if not result.ok:
+        raise result.error
+    return result.value['events'], list((result.value.get('files') or {'': result.value['file']}).values())
+
+
+def _measure_case(path, export_format, log, evtx_file, memory):
+    """1ケースを計測する（ピークメモリは別の実行で tracemalloc により計測する）"""
+    with tempfile.TemporaryDirectory() as root:
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        events, output_files = _run_export(path, export_format, root, log, evtx_file)
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+        output_bytes = sum(os.path.getsize(output_file) for output_file in output_files)
+
+    peak = None
+    if memory:
+        with tempfile.TemporaryDirectory() as root:
+            tracemalloc.start()
+            try:
+                _run_export(path, export_format, root, log, evtx_file)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+    return {
+        'events': events,
+        'seconds': elapsed,
+        'cpu_seconds': cpu,
+        'events_per_second': events / elapsed if elapsed > 0 else 0.0,
+        'peak_memory_bytes': peak,
+        'output_bytes': output_bytes,
+    }
+
+
+def _case_key(case):
+    return "/".join(str(case[key]) for key in ('events_total', 'sources', 'inserts', 'message_length',
+                                               'path', 'format'))
+
+
+def bench_suite(args):
+    """エクスポート経路・出力形式・データの規模ごとに速度・ピークメモリ・出力サイズを計測する"""
+    cases = []
+    with tempfile.TemporaryDirectory() as work:
+        for size in args.sizes:
+            for sources in args.sources:
+                for inserts in args.inserts:
+                    for message_length in args.message_lengths:
+                        log = SyntheticLog(size, sources, args.ids, inserts, message_length, seed=args.seed)
+                        install_fake_win32(FakeEventLogApi(log, call_delay=args.call_delay,
+                                                           event_delay=args.event_delay))
+                        evtx_file = None
+                        if "evtx" in args.paths:
+                            evtx_file = os.path.join(work, "System.evtx")
+                            write_synthetic_evtx(evtx_file, log)
+                        print(f"# {log.describe()}")
+                        for path in args.paths:
+                            for export_format in args.formats:
+                                # 差分取得はCSVにのみ追記する
+                                if path == "incremental" and export_format != "csv":
+                                    continue
+                                result = _measure_case(path, export_format, log, evtx_file, not args.no_memory)
+                                case = {
+                                    'events_total': size,
+                                    'sources': sources,
+                                    'inserts': inserts,
+                                    'message_length': message_length,
+                                    'path': path,
+                                    'format': export_format,
+                                }
+                                case.update(result)
+                                cases.append(case)
+                                _print_case(case)
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'revision': _git_revision(),
+        'cases': cases,
+    }
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"saved baseline   : {args.save}")
+    if args.baseline:
+        return _compare_baseline(cases, args.baseline, args.threshold)
+    return 0
+
+
+def bench_fleet(args):
+    """擬似ホストの群からフリート収集し、ホストの状態ごとの結果と接続・セッションの回数を表示する"""
+    log = SyntheticLog(args.events, args.sources, args.ids, seed=args.seed)
+    hosts = []
+    for i in range(args.hosts):
+        name = f"srv{i + 1:03d}"
+        if i < args.down:
+            hosts.append(FakeHost(name, args.latency, down=True))
+        elif i < args.down + args.flaky:
+            hosts.append(FakeHost(name, args.latency, failures=1))
+        elif i < args.down + args.flaky + args.slow:
+            hosts.append(FakeHost(name, args.slow_latency))
+        else:
+            hosts.append(FakeHost(name, args.latency))
+    api = FakeFleetApi(log, hosts, call_delay=0, event_delay=0)
+    install_fake_win32(api)
+    print(f"hosts            : {args.hosts}（停止 {args.down} / 不安定 {args.flaky} / 低速 {args.slow}）")
+    print(f"events           : {log.count}件 × {len(args.channels)}チャネル / ホスト")
+
+    with tempfile.TemporaryDirectory() as root:
+        collector = _bench_collector(root, log, reader=args.reader)
+        start = time.perf_counter()
+        try:
+            results = collector.collect_fleet(
+                [host.name for host in hosts],
+                channels=args.channels,
+                limit=None,
+                max_hosts=args.max_hosts,
+                host_timeout=args.host_timeout,
+                retries=args.retries,
+                retry_delay=args.retry_delay
+            )
+        finally:
+            collector.close()
+        elapsed = time.perf_counter() - start
+
+    statuses = {}
+    events = 0
+    for result in results:
+        value = result.value
+        if not result.ok:
+            status = "失敗"
+        elif value['timed_out']:
+            status = "時間切れ"
+        elif all(r.ok for r in value['results']):
+            status = "成功"
+        else:
+            status = "失敗"
+        statuses[status] = statuses.get(status, 0) + 1
+        if result.ok:
+            events += value['events']
+    print(f"max hosts        : {args.max_hosts}  host timeout {args.host_timeout}s  retries {args.retries}")
+    print(f"wall             : {elapsed:.3f}s  {events}件 ({events / elapsed:,.0f}件/秒)")
+    print("hosts            : " + " / ".join(f"{name} {count}" for name, count in statuses.items()))
+    print(f"connects         : {api.connects}  sessions {api.sessions}  publisher metadata {api.publisher_opens}")
+
+
+def _print_case(case):
+    peak = case['peak_memory_bytes']
+    peak_text = f"{peak / 2 ** 20:7.1f}MB" if peak is not None else "      -"
+    print(f"{case['path']:<12} {case['format']:<16} {case['events']:>9}件 {case['seconds']:8.3f}s "
+          f"{case['events_per_second']:>10,.0f}件/秒 peak {peak_text} "
+          f"out {case['output_bytes'] / 2 ** 20:8.1f}MB")
+
+
+def _git_revision():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _compare_baseline(cases, baseline_file, threshold):
+    """ベースラインと比較し、速度が閾値を超えて低下したケースがあれば 1 を返す"""
+    with open(baseline_file, encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {_case_key(case): case for case in baseline['cases']}
+    print(f"# baseline {baseline_file} (revision {baseline.get('revision')}, {baseline.get('created')})")
+    regressions = 0
+    for case in cases:
+        old = previous.get(_case_key(case))
+        if old is None or not old['events_per_second']:
+            continue
+        change = case['events_per_second'] / old['events_per_second'] - 1
+        mark = ""
+        if change < -threshold:
+            mark = "  << 低下"
+            regressions += 1
+        print(f"{_case_key(case):<40} {old['events_per_second']:>10,.0f} -> "
+              f"{case['events_per_second']:>10,.0f}件/秒 ({change:+.1%}){mark}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ILCollector ベンチマーク")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    cache_parser = subparsers.add_parser("cache", help="メッセージキャッシュの計測")
+    cache_parser.add_argument("--events", type=int, default=20000)
+    cache_parser.add_argument("--sources", type=int, default=20)
+    cache_parser.add_argument("--ids", type=int, default=50)
+    cache_parser.add_argument("--max-templates", type=int, default=4096)
+    cache_parser.add_argument("--max-modules", type=int, default=64)
+    cache_parser.add_argument("--load-delay", type=float, default=0.0002)
+    cache_parser.add_argument("--template-delay", type=float, default=0.00005)
+    cache_parser.add_argument("--seed", type=int, default=0)
+    cache_parser.set_defaults(func=bench_cache)
+
+    startup_parser = subparsers.add_parser("startup", help="CLIの起動時間の計測")
+    startup_parser.add_argument("--runs", type=int, default=10)
+    startup_parser.set_defaults(func=bench_startup)
+
+    reader_parser = subparsers.add_parser("reader", help="イベントログの読み込み方式の比較")
+    reader_parser.add_argument("--events", type=int, default=50000)
+    reader_parser.add_argument("--sources", type=int, default=20)
+    reader_parser.add_argument("--ids", type=int, default=50)
+    reader_parser.add_argument("--levels", nargs="+", choices=list(EventFilter.LEVELS), default=None)
+    reader_parser.add_argument("--event-ids", nargs="+", type=int, default=None)
+    reader_parser.add_argument("--hours", type=float, default=None, help="直近の指定時間だけを対象にする")
+    reader_parser.add_argument("--batch-sizes", nargs="+", type=int, default=[16, 64, 256, 1024])
+    reader_parser.add_argument("--call-delay", type=float, default=0.002)
+    reader_parser.add_argument("--event-delay", type=float, default=0.000005)
+    reader_parser.add_argument("--seed", type=int, default=0)
+    reader_parser.set_defaults(func=bench_reader)
+
+    suite_parser = subparsers.add_parser("suite", help="エクスポート経路・出力形式ごとの計測とベースライン比較")
+    suite_parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000])
+    suite_parser.add_argument("--sources", nargs="+", type=int, default=[20])
+    suite_parser.add_argument("--inserts", nargs="+", type=int, default=[2])
+    suite_parser.add_argument("--message-lengths", nargs="+", type=int, default=[80])
+    suite_parser.add_argument("--ids", type=int, default=50)
+    suite_parser.add_argument("--paths", nargs="+", choices=EXPORT_PATHS, default=list(EXPORT_PATHS))
+    suite_parser.add_argument("--formats", nargs="+", choices=EXPORT_FORMATS, default=list(EXPORT_FORMATS))
+    suite_parser.add_argument("--call-delay", type=float, default=0.0)
+    suite_parser.add_argument("--event-delay", type=float, default=0.0)
+    suite_parser.add_argument("--no-memory", action="store_true", help="ピークメモリを計測しない（計測時間が半分になる）")
+    suite_parser.add_argument("--save", metavar="FILE", help="結果をベースラインとして保存する")
+    suite_parser.add_argument("--baseline", metavar="FILE", help="保存したベースラインと比較する")
+    suite_parser.add_argument("--threshold", type=float, default=0.10, help="低下とみなす速度の変化率")
+    suite_parser.add_argument("--seed", type=int, default=0)
+    suite_parser.set_defaults(func=bench_suite)
+
+    fleet_parser = subparsers.add_parser("fleet", help="擬似ホストの群からのフリート収集の計測")
+    fleet_parser.add_argument("--hosts", type=int, default=50)
+    fleet_parser.add_argument("--down", type=int, default=2, help="停止中のホスト数")
+    fleet_parser.add_argument("--flaky", type=int, default=3, help="最初の接続に失敗するホスト数")
+    fleet_parser.add_argument("--slow", type=int, default=1, help="制限時間を超える低速なホスト数")
+    fleet_parser.add_argument("--events", type=int, default=2000)
+    fleet_parser.add_argument("--sources", type=int, default=20)
+    fleet_parser.add_argument("--ids", type=int, default=50)
+    fleet_parser.add_argument("--channels", nargs="+", default=["System", "Application"])
+    fleet_parser.add_argument("--reader", choices=Collector.READERS, default="evtquery")
+    fleet_parser.add_argument("--latency", type=float, default=0.005, help="API呼び出しごとの遅延（秒）")
+    fleet_parser.add_argument("--slow-latency", type=float, default=0.5)
+    fleet_parser.add_argument("--max-hosts", type=int, default=Collector.MAX_HOSTS)
+    fleet_parser.add_argument("--host-timeout", type=float, default=10.0)
+    fleet_parser.add_argument("--retries", type=int, default=Collector.HOST_RETRIES)
+    fleet_parser.add_argument("--retry-delay", type=float, default=0.1)
+    fleet_parser.add_argument("--seed", type=int, default=0)
+    fleet_parser.set_defaults(func=bench_fleet)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args) or 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""ILCollector が扱うイベントの共通の形
+
+読み込み元（稼働中のイベントログ・EvtQuery・.evtxファイル）に関係なくエクスポート処理が扱う
+EventRecord とレベルの区分、読み込み元の基底クラス EventSource、CSV・JSON Lines の日時の形式。
+"""
+import sys
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+
+
+# イベントの種類（winnt.h の EVENTLOG_*_TYPE と同じ値）
+EVENTLOG_ERROR_TYPE = 0x0001
+EVENTLOG_WARNING_TYPE = 0x0002
+EVENTLOG_INFORMATION_TYPE = 0x0004
+
+
+class EventTime(datetime):
+    """pywin32の時刻オブジェクトと同じく Format() を持つ datetime"""
+
+    def Format(self, fmt='%c'):
+        return self.strftime(fmt)
+
+
+# レベル（CSVのレベル列の区分）。EventRecord.level はこの並びの添字
+LEVEL_NAMES = ('error', 'warning', 'info', 'other')
+LEVEL_LABELS = ("エラー", "警告", "情報", "その他")
+LEVEL_ERROR, LEVEL_WARNING, LEVEL_INFO, LEVEL_OTHER = range(4)
+
+_EVENT_TYPE_LEVELS = {
+    EVENTLOG_ERROR_TYPE: LEVEL_ERROR,
+    EVENTLOG_WARNING_TYPE: LEVEL_WARNING,
+    EVENTLOG_INFORMATION_TYPE: LEVEL_INFO,
+}
+
+
+class EventRecord:
+    """読み込み元に関係なくエクスポート処理が扱うイベント1件
+
+    日時はUNIX時刻（秒）の整数、レベルは LEVEL_NAMES の添字、ソース名と
+    コンピューター名は intern した文字列で持ち、1件あたりのメモリと
+    整形・集計・絞り込みのたびの変換を減らす。event_id は Qualifiers を含む値。
+    """
+
+    __slots__ = ('record_number', 'timestamp', 'event_id', 'level', 'source', 'inserts', 'computer', 'category')
+
+    def __init__(self, record_number, timestamp, event_id=0, level=LEVEL_INFO, source="", inserts=(),
+                 computer="", category=0):
+        self.record_number = record_number
+        self.timestamp = timestamp
+        self.event_id = event_id
+        self.level = level
+        self.source = source
+        self.inserts = inserts
+        self.computer = computer
+        self.category = category
+
+    def __repr__(self):
+        return (f"EventRecord({self.record_number}, {self.timestamp}, event_id={self.event_id & 0xFFFF}, "
+                f"level={LEVEL_NAMES[self.level]!r}, source={self.source!r})")
+
+
+def decode_eventlog_records(events):
+    """ReadEventLog が返したpywin32のイベントオブジェクトのバッチを EventRecord のリストにする"""
+    intern = sys.intern
+    levels = _EVENT_TYPE_LEVELS
+    return [
+        EventRecord(
+            event.RecordNumber,
+            int(event.TimeGenerated.timestamp()),
+            event.EventID,
+            levels.get(event.EventType, LEVEL_OTHER),
+            intern(event.SourceName or ""),
+            event.StringInserts or (),
+            intern(event.ComputerName or ""),
+            event.EventCategory
+        )
+        for event in events
+    ]
+
+
+# CSVの日時列の形式（従来の TimeGenerated.Format() と同じロケールの %c。差分取得で既存のCSVに追記するため変えない）
+_LOCAL_TIME_FORMAT = "%c"
+# 日時列を読み込むときに受け付ける形式（%c と、一時期の版が出力した形式）
+_CSV_TIME_FORMATS = (_LOCAL_TIME_FORMAT, "%Y/%m/%d %H:%M:%S")
+
+
+def format_timestamp(timestamp):
+    """UNIX時刻をCSVの日時列の形式（ローカル時刻）にする"""
+    try:
+        return time.strftime(_LOCAL_TIME_FORMAT, time.localtime(timestamp))
+    except (OverflowError, OSError, ValueError):
+        return ""
+
+
+@lru_cache(maxsize=4096)
+def parse_csv_time(text):
+    """CSVの日時列（format_timestamp の形式）をエポック秒にする（読めなければNone）"""
+    for fmt in _CSV_TIME_FORMATS:
+        try:
+            return int(datetime.strptime(text, fmt).timestamp())
+        except (ValueError, OverflowError, OSError):
+            continue
+    return None
+
+
+_UTC_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def format_utc(timestamp):
+    """UNIX時刻をJSON Lines・SQLiteの日時の形式（UTCのISO 8601）にする"""
+    try:
+        return time.strftime(_UTC_TIME_FORMAT, time.gmtime(timestamp))
+    except (OverflowError, OSError, ValueError):
+        return None
+
+
+def parse_utc(text):
+    """format_utc() の日時をUNIX時刻に戻す（読めなければNone）"""
+    try:
+        return int(datetime.strptime(text, _UTC_TIME_FORMAT).replace(tzinfo=timezone.utc).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+def event_csv_row(event, message):
+    """イベントと整形済みのメッセージをCSVの1行にする（メッセージの改行は空白にする）"""
+    return [
+        format_timestamp(event.timestamp),
+        event.event_id & 0xFFFF,
+        LEVEL_LABELS[event.level],
+        event.source,
+        message.replace('\n', ' ').replace('\r', '')
+    ]
+
+
+class EventSource:
+    """イベントの読み込み元
+
+    エクスポート処理は batches() が返すイベントのバッチだけを扱う。各イベントは
+    EventRecord（読み込み元ごとのデコーダーでバッチ単位に変換したもの）。
+    """
+
+    log_name = None
+
+    # イベントのメッセージを返す関数（None の場合はメッセージDLLのキャッシュで整形する）
+    format_message = None
+
+    def batches(self):
+        """イベントを新しい順にバッチ（リスト）単位で返す"""
+        raise NotImplementedError
+
+    def count(self):
+        """イベントの総数（分からない場合はNone、進捗表示に使う）"""
+        return None
+
+    def close(self):
+        """ハンドルやファイルを解放する"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_FILETIME_EPOCH_OFFSET = 116444736000000000  # 1601-01-01 から 1970-01-01 までの100ナノ秒数
+
+
+def filetime_to_timestamp(filetime):
+    """FILETIME（UTC、100ナノ秒単位）をUNIX時刻（秒）の整数にする"""
+    return (filetime - _FILETIME_EPOCH_OFFSET) // 10 ** 7
+
+
+def filetime_to_datetime(filetime):
+    """FILETIME（UTC）をローカル時刻の EventTime に変換する"""
+    timestamp = (filetime - _FILETIME_EPOCH_OFFSET) / 10 ** 7
+    try:
+        return EventTime.fromtimestamp(timestamp)
+    except (OverflowError, OSError, ValueError):
+        return EventTime(1970, 1, 1)
+
+
+# Level（0:LogAlways 1:重大 2:エラー 3:警告 4:情報 5:詳細）からレベルへの対応（それ以外は情報）
+_LEVEL_CODES = {
+    1: LEVEL_ERROR, 2: LEVEL_ERROR, 3: LEVEL_WARNING,
+}
+_KEYWORD_AUDIT_FAILURE = 0x10000000000000
+_KEYWORD_AUDIT_SUCCESS = 0x20000000000000
+
+
+def event_level(level, keywords):
+    """Level と Keywords をレベルの添字にする（監査の成功・失敗は従来のEventTypeと同じく「その他」）"""
+    if keywords & (_KEYWORD_AUDIT_FAILURE | _KEYWORD_AUDIT_SUCCESS):
+        return LEVEL_OTHER
+    return _LEVEL_CODES.get(level, LEVEL_INFO)
+
+
+def to_int(text):
+    try:
+        return int(text, 0) if text else 0
+    except ValueError:
+        return 0
@@ -0,0 +1,480 @@
+"""稼働中のイベントログの読み込み（pywin32）と絞り込み条件
+
+ReadEventLog（legacy）と EvtQuery/EvtNext（evtquery）の2つの読み込み元、
+メッセージDLLからのテンプレート取得、両方の読み込み元で共通の絞り込み条件（EventFilter）。
+"""
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+
+from event_records import (
+    LEVEL_LABELS, LEVEL_NAMES, EventRecord, EventSource, decode_eventlog_records, event_level, filetime_to_timestamp,
+)
+from jobs import LRUCache
+
+# pywin32 は使用時に読み込む（Windows以外でも .evtx の変換やテストで読み込めるようにする）
+win32evtlog = win32con = None
+
+
+def load_win32():
+    """pywin32のイベントログ関連モジュールを読み込む"""
+    global win32evtlog, win32con
+    import win32con
+    import win32evtlog
+
+
+def describe_unformatted(event):
+    """メッセージDLLが見つからない場合の説明文（SafeFormatMessageと同じ形式）"""
+    desc = ", ".join(event.inserts)
+    return ("<The description for Event ID ( %d ) in Source ( %r ) could not be found. "
+            "It contains the following insertion string(s):%r.>" % (event.event_id & 0xFFFF, event.source, desc))
+
+
+class Win32MessageFormatter:
+    """レジストリとメッセージDLLからメッセージテンプレートを取得する"""
+
+    REGISTRY_KEY = "SYSTEM\\CurrentControlSet\\Services\\EventLog\\{}\\{}"
+
+    def __init__(self):
+        self.win32api = None
+        self.langid = None
+        self.available = True
+
+    def _api(self):
+        if self.win32api is None and self.available:
+            try:
+                load_win32()
+                import win32api
+            except ImportError:
+                # Windows以外で.evtxを変換する場合はメッセージDLLを参照できない
+                self.available = False
+                return None
+            self.langid = win32api.MAKELANGID(win32con.LANG_NEUTRAL, win32con.SUBLANG_NEUTRAL)
+            self.win32api = win32api
+        return self.win32api
+
+    def load_modules(self, log_name, source):
+        """ソースのメッセージDLLを読み込む（ソースが登録されていない場合はNone）"""
+        api = self._api()
+        if api is None:
+            return None
+        try:
+            key = api.RegOpenKey(win32con.HKEY_LOCAL_MACHINE, self.REGISTRY_KEY.format(log_name, source))
+        except api.error:
+            return None
+        try:
+            dll_names = api.RegQueryValueEx(key, "EventMessageFile")[0].split(";")
+        except api.error:
+            return None
+        finally:
+            api.RegCloseKey(key)
+
+        modules = []
+        for dll_name in dll_names:
+            try:
+                dll_path = api.ExpandEnvironmentStrings(dll_name)
+                modules.append(api.LoadLibraryEx(dll_path, 0, win32con.LOAD_LIBRARY_AS_DATAFILE))
+            except api.error:
+                pass
+        return modules
+
+    def load_template(self, modules, event_id):
+        """メッセージDLLから挿入文字列を展開していないテンプレートを取得する"""
+        api = self._api()
+        flags = win32con.FORMAT_MESSAGE_FROM_HMODULE | win32con.FORMAT_MESSAGE_IGNORE_INSERTS
+        for module in modules:
+            try:
+                return api.FormatMessageW(flags, module, event_id, self.langid, None)
+            except api.error:
+                pass
+        return None
+
+    def free_modules(self, modules):
+        """メッセージDLLを解放する"""
+        api = self._api()
+        if api is None:
+            return
+        for module in modules or ():
+            try:
+                api.FreeLibrary(module)
+            except api.error:
+                pass
+
+
+class Win32EventLogSource(EventSource):
+    """ReadEventLog による稼働中のイベントログ"""
+
+    def __init__(self, log_name, server=None):
+        load_win32()
+        self.log_name = log_name
+        self.handle = win32evtlog.OpenEventLog(server, log_name)
+
+    def batches(self):
+        flags = win32evtlog.EVENTLOG_BACKWARDS_READ | win32evtlog.EVENTLOG_SEQUENTIAL_READ
+        while True:
+            events = win32evtlog.ReadEventLog(self.handle, flags, 0)
+            if not events:
+                break
+            yield decode_eventlog_records(events)
+
+    def count(self):
+        return win32evtlog.GetNumberOfEventLogRecords(self.handle)
+
+    def record_range(self):
+        """(最も古いRecordNumber, 最も新しいRecordNumber) を返す"""
+        oldest = win32evtlog.GetOldestEventLogRecord(self.handle)
+        return oldest, oldest + win32evtlog.GetNumberOfEventLogRecords(self.handle) - 1
+
+    def batches_from(self, start_record):
+        """指定したRecordNumberから古い順にバッチ単位で返す"""
+        events = win32evtlog.ReadEventLog(
+            self.handle,
+            win32evtlog.EVENTLOG_FORWARDS_READ | win32evtlog.EVENTLOG_SEEK_READ,
+            start_record
+        )
+        while events:
+            yield decode_eventlog_records(events)
+            events = win32evtlog.ReadEventLog(
+                self.handle,
+                win32evtlog.EVENTLOG_FORWARDS_READ | win32evtlog.EVENTLOG_SEQUENTIAL_READ,
+                0
+            )
+
+    def batches_before(self, end_record):
+        """指定したRecordNumberより古いイベントを新しい順にバッチ単位で返す（中断したエクスポートの再開用）"""
+        oldest, newest = self.record_range()
+        start_record = min(end_record - 1, newest)
+        if start_record < oldest:
+            return
+        flags = win32evtlog.EVENTLOG_BACKWARDS_READ
+        events = win32evtlog.ReadEventLog(self.handle, flags | win32evtlog.EVENTLOG_SEEK_READ, start_record)
+        while events:
+            yield decode_eventlog_records(events)
+            events = win32evtlog.ReadEventLog(self.handle, flags | win32evtlog.EVENTLOG_SEQUENTIAL_READ, 0)
+
+    def close(self):
+        if self.handle is not None:
+            win32evtlog.CloseEventLog(self.handle)
+            self.handle = None
+
+
+_RELATIVE_TIME = re.compile(r"^(\d+)\s*([mhd])$")
+_TIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d", "%Y/%m/%d %H:%M:%S", "%Y/%m/%d %H:%M", "%Y/%m/%d")
+
+
+def parse_time(text, now=None):
+    """日時の指定（"2025-01-31 09:00" などの日時、または "30m" "12h" "7d" の相対指定）を datetime にする"""
+    text = text.strip()
+    match = _RELATIVE_TIME.match(text)
+    if match:
+        amount, unit = int(match.group(1)), match.group(2)
+        delta = {'m': timedelta(minutes=amount), 'h': timedelta(hours=amount), 'd': timedelta(days=amount)}[unit]
+        return (now or datetime.now()) - delta
+    for fmt in _TIME_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    raise ValueError(f"日時の形式が正しくありません: {text}")
+
+
+class EventFilter:
+    """時間範囲・レベル・イベントID・ソースによる絞り込み条件
+
+    読み込みステージでバッチに適用するため、条件に合わないイベントは整形されない。
+    新しい順に読み込んでいる場合、開始日時より古いイベントに達した時点で読み込みをやめる。
+    """
+
+    # レベル名とCSVのレベル列の表記
+    LEVELS = dict(zip(LEVEL_NAMES, LEVEL_LABELS))
+
+    def __init__(self, since=None, until=None, levels=None, event_ids=None, sources=None):
+        self.since = since
+        self.until = until
+        self.levels = set(levels) if levels else None
+        self.event_ids = set(event_ids) if event_ids else None
+        # ソース名は指定された表記のままXPathに使い、読み込んだイベントとは大文字・小文字を区別せずに比較する
+        self.source_names = tuple(sorted(set(sources))) if sources else None
+        self.sources = {source.lower() for source in sources} if sources else None
+        self._since_ts = since.timestamp() if since else None
+        self._until_ts = until.timestamp() if until else None
+        unknown = (self.levels or set()) - set(self.LEVELS)
+        if unknown:
+            raise ValueError(f"不明なレベルです: {', '.join(sorted(unknown))}")
+        self._level_codes = {LEVEL_NAMES.index(level) for level in self.levels} if self.levels else None
+
+    @property
+    def active(self):
+        return any(v is not None for v in (self.since, self.until, self.levels, self.event_ids, self.sources))
+
+    @property
+    def since_timestamp(self):
+        """開始日時のエポック秒（指定なしは None）"""
+        return self._since_ts
+
+    @property
+    def until_timestamp(self):
+        """終了日時のエポック秒（指定なしは None）"""
+        return self._until_ts
+
+    @property
+    def level_codes(self):
+        """対象のレベルの添字（LEVEL_NAMES の添字）の集合（指定なしは None）"""
+        return self._level_codes
+
+    def matches(self, event):
+        """イベント（EventRecord）が条件に合うか"""
+        if self._since_ts is not None and event.timestamp < self._since_ts:
+            return False
+        if self._until_ts is not None and event.timestamp > self._until_ts:
+            return False
+        if self._level_codes is not None and event.level not in self._level_codes:
+            return False
+        if self.event_ids is not None and (event.event_id & 0xFFFF) not in self.event_ids:
+            return False
+        if self.sources is not None and event.source.lower() not in self.sources:
+            return False
+        return True
+
+    def apply(self, batches, newest_first=True):
+        """バッチの列を絞り込む（時間範囲の外に出たら読み込みを打ち切る）"""
+        for batch in batches:
+            kept = []
+            for event in batch:
+                if newest_first and self._since_ts is not None and event.timestamp < self._since_ts:
+                    if kept:
+                        yield kept
+                    return
+                if not newest_first and self._until_ts is not None and event.timestamp > self._until_ts:
+                    if kept:
+                        yield kept
+                    return
+                if self.matches(event):
+                    kept.append(event)
+            if kept:
+                yield kept
+
+    # レベル名に対応する Level の値（event_level と同じ区分。詳細の Level 5 は「情報」、
+    # 「その他」は監査イベントで Level 0 のため 0 だけを送り、監査かどうかは apply() で判定する）
+    XPATH_LEVELS = {
+        'error': (1, 2),
+        'warning': (3,),
+        'info': (0, 4, 5),
+        'other': (0,),
+    }
+
+    def to_xpath(self, start_record=None, end_record=None):
+        """EvtQuery に渡すXPathクエリを返す
+
+        サーバー側では条件を満たす可能性のあるイベントだけに絞り、最終的な判定は
+        apply() で行う（レベルと監査の区分などXPathで表しきれない条件があるため）。
+        """
+        conditions = []
+        if self.levels is not None:
+            values = sorted({value for level in self.levels for value in self.XPATH_LEVELS[level]})
+            conditions.append("(" + " or ".join(f"Level={value}" for value in values) + ")")
+        if self.event_ids is not None:
+            conditions.append("(" + " or ".join(f"EventID={i}" for i in sorted(self.event_ids)) + ")")
+        if self.sources is not None:
+            names = " or ".join(f"@Name='{_xpath_escape(name)}'" for name in self.source_names)
+            conditions.append(f"Provider[{names}]")
+        times = []
+        if self.since is not None:
+            times.append(f"@SystemTime>='{_xpath_time(self.since)}'")
+        if self.until is not None:
+            times.append(f"@SystemTime<='{_xpath_time(self.until)}'")
+        if times:
+            conditions.append("TimeCreated[" + " and ".join(times) + "]")
+        if start_record is not None:
+            conditions.append(f"EventRecordID>={start_record}")
+        if end_record is not None:
+            conditions.append(f"EventRecordID<{end_record}")
+        if not conditions:
+            return "*"
+        return "*[System[" + " and ".join(conditions) + "]]"
+
+    def to_dict(self):
+        """チェックポイントに保存する形（from_dict() で元に戻す）"""
+        return {
+            'since': self.since.isoformat() if self.since else None,
+            'until': self.until.isoformat() if self.until else None,
+            'levels': sorted(self.levels) if self.levels else None,
+            'event_ids': sorted(self.event_ids) if self.event_ids else None,
+            'sources': list(self.source_names) if self.source_names else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data or {})
+        for name in ('since', 'until'):
+            if data.get(name):
+                data[name] = datetime.fromisoformat(data[name])
+        return cls(**data)
+
+    def key(self):
+        """同じ条件かどうかの比較に使う値"""
+        return (self.since, self.until, frozenset(self.levels or ()), frozenset(self.event_ids or ()),
+                frozenset(self.sources or ()))
+
+    def describe(self):
+        """条件を人が読める形で返す"""
+        parts = []
+        if self.since:
+            parts.append(f"開始 {self.since:%Y-%m-%d %H:%M}")
+        if self.until:
+            parts.append(f"終了 {self.until:%Y-%m-%d %H:%M}")
+        if self.levels:
+            parts.append("レベル " + "・".join(self.LEVELS[level] for level in self.LEVELS if level in self.levels))
+        if self.event_ids:
+            parts.append("イベントID " + ",".join(str(i) for i in sorted(self.event_ids)))
+        if self.sources:
+            parts.append("ソース " + ",".join(self.source_names))
+        return " / ".join(parts) if parts else "なし"
+
+
+def _xpath_escape(text):
+    return text.replace("'", "&apos;")
+
+
+def _xpath_time(value):
+    """datetime（naiveはローカル時刻とみなす）をXPathのSystemTime（UTC）の形式にする"""
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def _evt_timestamp(value):
+    """EvtRenderの時刻（UTCのdatetimeまたはFILETIME）をUNIX時刻（秒）の整数にする"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp())
+    return filetime_to_timestamp(value or 0)
+
+
+class EvtQueryRecord(EventRecord):
+    """EvtNextで取得したイベント（メッセージの整形までイベントハンドルを保持する）"""
+
+    __slots__ = ('handle',)
+
+
+class EvtQuerySource(EventSource):
+    """EvtQuery/EvtNext による稼働中のイベントログ
+
+    event_filter はXPathクエリとしてサーバー側で適用され、イベントは batch_size 件ずつ
+    取得する。システムプロパティの取り出しには使い回しのレンダリングコンテキストを使い、
+    メッセージは EvtFormatMessage でプロバイダーのメタデータから整形する。
+    """
+
+    DEFAULT_BATCH_SIZE = 256
+
+    def __init__(self, log_name, event_filter=None, batch_size=DEFAULT_BATCH_SIZE, server=None, max_publishers=64,
+                 session=None, publishers=None):
+        load_win32()
+        self.log_name = log_name
+        self.event_filter = event_filter if event_filter is not None else EventFilter()
+        self.batch_size = batch_size
+        # session / publishers を渡した場合は同じホストの他のチャネルと共有する（閉じるのは渡した側）
+        self.session = session
+        if server and session is None:
+            self.session = open_evt_session(server)
+        self._owns_publishers = publishers is None
+        self.context = win32evtlog.EvtCreateRenderContext(win32evtlog.EvtRenderContextSystem)
+        self._user_context = None
+        self.publishers = LRUCache(max_publishers) if publishers is None else publishers
+
+    def _query(self, query, reverse):
+        flags = win32evtlog.EvtQueryChannelPath
+        flags |= win32evtlog.EvtQueryReverseDirection if reverse else win32evtlog.EvtQueryForwardDirection
+        return win32evtlog.EvtQuery(self.log_name, flags, query, self.session)
+
+    def _read(self, query, reverse):
+        result_set = self._query(query, reverse)
+        while True:
+            handles = win32evtlog.EvtNext(result_set, self.batch_size)
+            if not handles:
+                break
+            yield [self._render(handle) for handle in handles]
+
+    def batches(self):
+        return self._read(self.event_filter.to_xpath(), reverse=True)
+
+    def batches_from(self, start_record):
+        """指定したRecordNumberから古い順にバッチ単位で返す"""
+        return self._read(self.event_filter.to_xpath(start_record), reverse=False)
+
+    def batches_before(self, end_record):
+        """指定したRecordNumberより古いイベントを新しい順にバッチ単位で返す（中断したエクスポートの再開用）"""
+        return self._read(self.event_filter.to_xpath(end_record=end_record), reverse=True)
+
+    def record_range(self):
+        """(最も古いRecordNumber, 最も新しいRecordNumber) を返す"""
+        numbers = []
+        for reverse in (False, True):
+            handles = win32evtlog.EvtNext(self._query("*", reverse), 1)
+            if not handles:
+                return 0, -1
+            numbers.append(self._render(handles[0]).record_number)
+        return numbers[0], numbers[1]
+
+    def _render(self, handle):
+        values = win32evtlog.EvtRender(handle, win32evtlog.EvtRenderEventValues, Context=self.context)
+        qualifiers = values[win32evtlog.EvtSystemQualifiers][0] or 0
+        record = EvtQueryRecord(
+            values[win32evtlog.EvtSystemEventRecordId][0] or 0,
+            _evt_timestamp(values[win32evtlog.EvtSystemTimeCreated][0]),
+            (qualifiers << 16) | (values[win32evtlog.EvtSystemEventID][0] or 0),
+            event_level(values[win32evtlog.EvtSystemLevel][0] or 0, values[win32evtlog.EvtSystemKeywords][0] or 0),
+            sys.intern(values[win32evtlog.EvtSystemProviderName][0] or ""),
+            (),
+            sys.intern(values[win32evtlog.EvtSystemComputer][0] or ""),
+            values[win32evtlog.EvtSystemTask][0] or 0
+        )
+        record.handle = handle
+        return record
+
+    def _publisher(self, name):
+        found, metadata = self.publishers.lookup(name)
+        if not found:
+            try:
+                metadata = win32evtlog.EvtOpenPublisherMetadata(name, self.session)
+            except Exception:
+                metadata = None
+            self.publishers.put(name, metadata)
+        return metadata
+
+    def format_message(self, event):
+        """EvtFormatMessage でメッセージを返す（整形できない場合は挿入文字列を並べる）"""
+        handle, event.handle = event.handle, None
+        metadata = self._publisher(event.source)
+        if metadata is not None:
+            try:
+                return win32evtlog.EvtFormatMessage(metadata, handle, win32evtlog.EvtFormatMessageEvent)
+            except Exception:
+                pass
+        if self._user_context is None:
+            self._user_context = win32evtlog.EvtCreateRenderContext(win32evtlog.EvtRenderContextUser)
+        try:
+            values = win32evtlog.EvtRender(handle, win32evtlog.EvtRenderEventValues, Context=self._user_context)
+            event.inserts = tuple("" if value is None else str(value) for value, _ in values)
+        except Exception:
+            pass
+        return describe_unformatted(event)
+
+    def close(self):
+        if self._owns_publishers:
+            self.publishers.clear()
+        self.context = self._user_context = self.session = None
+
+
+def open_evt_session(server):
+    """リモートのイベントログに EvtQuery するためのセッションを開く"""
+    load_win32()
+    return win32evtlog.EvtOpenSession(
+        (server, None, None, None, win32evtlog.EvtRpcLoginAuthDefault),
+        win32evtlog.EvtRpcLogin
+    )
+
+
+def open_evt_channel(log_name, session=None):
+    """チャネルを開いて接続とチャネルの有無を確かめる（EvtOpenSession だけでは接続しないため）"""
+    load_win32()
+    return win32evtlog.EvtOpenLog(log_name, win32evtlog.EvtOpenChannelPath, session)
@@ -0,0 +1,490 @@
+""".evtx ファイル（Windows XML イベントログ）の読み込み
+
+pywin32 を使わずにファイルのチャンクとバイナリXMLを直接解析するため、障害サーバーから
+コピーした .evtx を Windows 以外の環境でも変換できる。
+"""
+import mmap
+import os
+import struct
+import sys
+import uuid
+
+from event_records import EventRecord, EventSource, event_level, filetime_to_datetime, filetime_to_timestamp, to_int
+
+
+class EvtxParseError(Exception):
+    """.evtxファイルの解析エラー"""
+
+
+class _XmlElement:
+    """バイナリXMLを展開した要素"""
+
+    __slots__ = ('name', 'attrs', 'children', 'static', 'dynamic_attrs')
+
+    def __init__(self, name, attrs, children):
+        self.name = name
+        self.attrs = attrs
+        self.children = children
+        self.static = True           # 置換を含まない（テンプレートの要素をそのまま使える）
+        self.dynamic_attrs = False   # 属性に置換を含む
+
+    def find(self, name):
+        for child in self.children:
+            if isinstance(child, _XmlElement) and child.name == name:
+                return child
+        return None
+
+    def elements(self):
+        return [child for child in self.children if isinstance(child, _XmlElement)]
+
+    def text(self):
+        return "".join(child for child in self.children if isinstance(child, str))
+
+
+# バイナリXMLのトークン
+_BXML_EOF = 0x00
+_BXML_OPEN_START_ELEMENT = 0x01
+_BXML_CLOSE_START_ELEMENT = 0x02
+_BXML_CLOSE_EMPTY_ELEMENT = 0x03
+_BXML_END_ELEMENT = 0x04
+_BXML_VALUE = 0x05
+_BXML_ATTRIBUTE = 0x06
+_BXML_CDATA = 0x07
+_BXML_CHAR_REF = 0x08
+_BXML_ENTITY_REF = 0x09
+_BXML_PI_TARGET = 0x0A
+_BXML_PI_DATA = 0x0B
+_BXML_TEMPLATE_INSTANCE = 0x0C
+_BXML_NORMAL_SUBSTITUTION = 0x0D
+_BXML_OPTIONAL_SUBSTITUTION = 0x0E
+_BXML_FRAGMENT_HEADER = 0x0F
+_BXML_HAS_MORE = 0x40
+
+_BXML_VALUE_TOKENS = frozenset((
+    _BXML_VALUE, _BXML_VALUE | _BXML_HAS_MORE,
+    _BXML_CHAR_REF, _BXML_CHAR_REF | _BXML_HAS_MORE,
+    _BXML_ENTITY_REF, _BXML_ENTITY_REF | _BXML_HAS_MORE,
+    _BXML_NORMAL_SUBSTITUTION, _BXML_OPTIONAL_SUBSTITUTION,
+))
+
+_XML_ENTITIES = {'amp': '&', 'lt': '<', 'gt': '>', 'quot': '"', 'apos': "'"}
+
+# 値の型のうち固定長の数値
+_BXML_NUMBER_FORMATS = {
+    0x03: 'b', 0x04: 'B', 0x05: 'h', 0x06: 'H', 0x07: 'i', 0x08: 'I',
+    0x09: 'q', 0x0A: 'Q', 0x0B: 'f', 0x0C: 'd',
+}
+_BXML_TYPE_BINXML = 0x21
+_BXML_TYPE_ARRAY = 0x80
+
+
+class _EvtxChunkParser:
+    """1チャンク（64KB）分のバイナリXMLを解析する
+
+    テンプレート定義と名前文字列はチャンク内のオフセットで参照されるため、
+    チャンク単位でキャッシュし、レコードごとには置換値だけを読み込む。
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.names = {}
+        self.templates = {}
+
+    def _u8(self, pos):
+        return self.data[pos]
+
+    def _u16(self, pos):
+        return struct.unpack_from('<H', self.data, pos)[0]
+
+    def _u32(self, pos):
+        return struct.unpack_from('<I', self.data, pos)[0]
+
+    def _name(self, offset, pos):
+        """名前文字列を返す（直後に定義が続く場合は読み飛ばした位置も返す）"""
+        name = self.names.get(offset)
+        if name is None:
+            length = self._u16(offset + 6)
+            name = self.data[offset + 8:offset + 8 + length * 2].decode('utf-16-le')
+            self.names[offset] = name
+        if offset >= pos:
+            # 名前の定義がこの位置に続いている
+            pos = offset + 8 + self._u16(offset + 6) * 2 + 2
+        return name, pos
+
+    def read_fragment(self, pos):
+        """フラグメントを読み込み、置換値を埋め込んだノードの一覧を返す"""
+        nodes, pos = self._read_nodes(pos, values=None)
+        return nodes
+
+    def _read_nodes(self, pos, values):
+        """EOFまたはEndElementまでのノードを読み込む"""
+        data = self.data
+        nodes = []
+        while pos < len(data):
+            token = data[pos]
+            base = token & ~_BXML_HAS_MORE
+            if token == _BXML_EOF:
+                pos += 1
+                break
+            if token == _BXML_END_ELEMENT:
+                pos += 1
+                break
+            if token == _BXML_FRAGMENT_HEADER:
+                pos += 4
+            elif base == _BXML_OPEN_START_ELEMENT:
+                element, pos = self._read_element(pos, values)
+                nodes.append(element)
+            elif token == _BXML_TEMPLATE_INSTANCE:
+                # テンプレートの実体は置換値で終わり、フラグメントの終端になる
+                resolved, pos = self._read_template_instance(pos)
+                nodes.extend(resolved)
+                break
+            elif base == _BXML_CDATA:
+                length = self._u16(pos + 1)
+                nodes.append(data[pos + 3:pos + 3 + length * 2].decode('utf-16-le'))
+                pos += 3 + length * 2
+            elif base in (_BXML_PI_TARGET, _BXML_PI_DATA):
+                pos = self._skip_pi(pos)
+            elif token in _BXML_VALUE_TOKENS:
+                node, pos = self._read_value_node(pos, values)
+                if node is not None:
+                    nodes.extend(node if isinstance(node, list) else (node,))
+            else:
+                raise EvtxParseError(f"不明なトークン 0x{token:02x}（オフセット {pos}）")
+        return nodes, pos
+
+    def _skip_pi(self, pos):
+        if self.data[pos] & ~_BXML_HAS_MORE == _BXML_PI_TARGET:
+            _, pos = self._name(self._u32(pos + 1), pos + 5)
+            return pos
+        return pos + 3 + self._u16(pos + 1) * 2
+
+    def _read_element(self, pos, values):
+        has_attributes = self.data[pos] & _BXML_HAS_MORE
+        name, pos = self._name(self._u32(pos + 7), pos + 11)
+
+        attrs = {}
+        if has_attributes:
+            pos += 4  # 属性リストのサイズ
+            while True:
+                token = self.data[pos]
+                if token & ~_BXML_HAS_MORE != _BXML_ATTRIBUTE:
+                    break
+                attr_name, pos = self._name(self._u32(pos + 1), pos + 5)
+                parts = []
+                while self.data[pos] in _BXML_VALUE_TOKENS:
+                    node, pos = self._read_value_node(pos, values)
+                    if node is not None and not isinstance(node, list):
+                        parts.append(node)
+                if len(parts) == 1:
+                    attrs[attr_name] = parts[0]  # テンプレート内では置換の場合がある
+                elif parts:
+                    attrs[attr_name] = "".join(p for p in parts if isinstance(p, str))
+                if not token & _BXML_HAS_MORE:
+                    break
+
+        token = self.data[pos]
+        pos += 1
+        if token == _BXML_CLOSE_EMPTY_ELEMENT:
+            element = _XmlElement(name, attrs, [])
+            if values is None:
+                element.dynamic_attrs = any(isinstance(v, tuple) for v in attrs.values())
+                element.static = not element.dynamic_attrs
+            return element, pos
+        if token != _BXML_CLOSE_START_ELEMENT:
+            raise EvtxParseError(f"要素 {name} の開始タグが閉じられていません（オフセット {pos - 1}）")
+        children, pos = self._read_nodes(pos, values)
+        element = _XmlElement(name, attrs, children)
+        if values is None:
+            element.dynamic_attrs = any(isinstance(v, tuple) for v in attrs.values())
+            element.static = not element.dynamic_attrs and all(
+                isinstance(child, str) or (isinstance(child, _XmlElement) and child.static)
+                for child in children
+            )
+        return element, pos
+
+    def _read_value_node(self, pos, values):
+        """値・文字参照・置換のノードを1つ読み込む"""
+        data = self.data
+        token = data[pos]
+        base = token & ~_BXML_HAS_MORE
+        if base == _BXML_VALUE:
+            length = self._u16(pos + 2)
+            return data[pos + 4:pos + 4 + length * 2].decode('utf-16-le'), pos + 4 + length * 2
+        if base == _BXML_CHAR_REF:
+            return chr(self._u16(pos + 1)), pos + 3
+        if base == _BXML_ENTITY_REF:
+            name, pos = self._name(self._u32(pos + 1), pos + 5)
+            return _XML_ENTITIES.get(name, f"&{name};"), pos
+        # 置換（テンプレート定義の中でだけ現れる）
+        index = self._u16(pos + 1)
+        pos += 4
+        if values is None:
+            return ('subst', index), pos
+        return (values[index] if index < len(values) else None), pos
+
+    def _read_template_instance(self, pos):
+        """テンプレートの実体を読み込み、置換値を埋め込んだノードの一覧を返す"""
+        definition_offset = self._u32(pos + 6)
+        pos += 10
+        template = self.templates.get(definition_offset)
+        if template is None:
+            template, _ = self._read_nodes(definition_offset + 24, values=None)
+            self.templates[definition_offset] = template
+        if definition_offset >= pos:
+            # テンプレートの定義がこの位置に続いている
+            pos = definition_offset + 24 + self._u32(definition_offset + 20)
+
+        count = self._u32(pos)
+        pos += 4
+        descriptors = []
+        for i in range(count):
+            descriptors.append((self._u16(pos), self.data[pos + 2]))
+            pos += 4
+        values = []
+        for size, value_type in descriptors:
+            values.append(self._decode_value(pos, size, value_type))
+            pos += size
+        return _substitute(template, values), pos
+
+    def _decode_value(self, pos, size, value_type):
+        data = self.data
+        if size == 0 or value_type == 0x00:
+            return None
+        raw = data[pos:pos + size]
+        if value_type == 0x01:
+            return raw.decode('utf-16-le', 'replace').rstrip('\x00')
+        if value_type == 0x02:
+            return raw.decode('latin-1').rstrip('\x00')
+        if value_type in _BXML_NUMBER_FORMATS:
+            return str(struct.unpack_from('<' + _BXML_NUMBER_FORMATS[value_type], raw)[0])
+        if value_type == 0x0D:
+            return 'true' if struct.unpack_from('<I', raw)[0] else 'false'
+        if value_type == 0x0E:
+            return raw.hex().upper()
+        if value_type == 0x0F:
+            return '{' + str(uuid.UUID(bytes_le=bytes(raw))).upper() + '}'
+        if value_type == 0x10:
+            return hex(int.from_bytes(raw, 'little'))
+        if value_type == 0x11:
+            return filetime_to_datetime(struct.unpack_from('<Q', raw)[0]).isoformat()
+        if value_type == 0x12:
+            y, mo, _, d, h, mi, sec, ms = struct.unpack_from('<8H', raw)
+            return f"{y:04d}-{mo:02d}-{d:02d}T{h:02d}:{mi:02d}:{sec:02d}.{ms:03d}"
+        if value_type == 0x13:
+            return _format_sid(raw)
+        if value_type == 0x14:
+            return f"0x{struct.unpack_from('<I', raw)[0]:08x}"
+        if value_type == 0x15:
+            return f"0x{struct.unpack_from('<Q', raw)[0]:016x}"
+        if value_type == _BXML_TYPE_BINXML:
+            nodes, _ = self._read_nodes(pos, values=None)
+            return nodes
+        if value_type == _BXML_TYPE_ARRAY | 0x01:
+            return ", ".join(s for s in raw.decode('utf-16-le', 'replace').split('\x00') if s)
+        if value_type & _BXML_TYPE_ARRAY and value_type & ~_BXML_TYPE_ARRAY in _BXML_NUMBER_FORMATS:
+            fmt = '<' + _BXML_NUMBER_FORMATS[value_type & ~_BXML_TYPE_ARRAY]
+            item_size = struct.calcsize(fmt)
+            return ", ".join(str(struct.unpack_from(fmt, raw, i)[0]) for i in range(0, size - item_size + 1, item_size))
+        return raw.hex().upper()
+
+
+def _substitute(nodes, values):
+    """テンプレートのノードに置換値を埋め込む"""
+    result = []
+    for node in nodes:
+        if isinstance(node, _XmlElement):
+            if node.static:
+                result.append(node)
+                continue
+            attrs = node.attrs
+            if node.dynamic_attrs:
+                attrs = {}
+                for key, value in node.attrs.items():
+                    value = _substitute_value(value, values)
+                    if value is not None:
+                        attrs[key] = value
+            result.append(_XmlElement(node.name, attrs, _substitute(node.children, values)))
+        elif isinstance(node, tuple):
+            value = values[node[1]] if node[1] < len(values) else None
+            if isinstance(value, list):
+                result.extend(value)
+            elif value is not None:
+                result.append(value)
+        else:
+            result.append(node)
+    return result
+
+
+def _substitute_value(value, values):
+    if isinstance(value, tuple):
+        value = values[value[1]] if value[1] < len(values) else None
+        return None if isinstance(value, list) else value
+    return value
+
+
+def _format_sid(raw):
+    """SIDのバイト列を S-1-5-... の形式にする"""
+    if len(raw) < 8:
+        return raw.hex().upper()
+    revision, count = raw[0], raw[1]
+    authority = int.from_bytes(raw[2:8], 'big')
+    parts = [str(struct.unpack_from('<I', raw, 8 + i * 4)[0]) for i in range(count) if 12 + i * 4 <= len(raw)]
+    return "-".join(["S", str(revision), str(authority)] + parts)
+
+
+class EvtxFileSource(EventSource):
+    """.evtxファイルを直接解析するイベントソース（pywin32不要）
+
+    ファイルはメモリマップで開き、64KBのチャンク単位で解析するため、
+    ファイルサイズに関係なくメモリ使用量は一定に保たれる。
+    """
+
+    FILE_MAGIC = b"ElfFile\x00"
+    CHUNK_MAGIC = b"ElfChnk\x00"
+    RECORD_MAGIC = b"\x2a\x2a\x00\x00"
+    HEADER_SIZE = 0x1000
+    CHUNK_SIZE = 0x10000
+    CHUNK_HEADER_SIZE = 0x200
+
+    def __init__(self, path, log_name=None, batch_size=256):
+        self.path = path
+        self.log_name = log_name or os.path.splitext(os.path.basename(path))[0]
+        self.batch_size = batch_size
+        self.skipped = 0  # 解析できずに読み飛ばしたレコード数
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise EvtxParseError(f"空のファイルです: {path}")
+        if self._map[:8] != self.FILE_MAGIC:
+            self.close()
+            raise EvtxParseError(f".evtxファイルではありません: {path}")
+
+    def chunk_offsets(self):
+        """有効なチャンクの位置を最初のレコード番号順に返す（循環したログにも対応する）"""
+        chunks = []
+        for offset in range(self.HEADER_SIZE, len(self._map) - self.CHUNK_SIZE + 1, self.CHUNK_SIZE):
+            if self._map[offset:offset + 8] == self.CHUNK_MAGIC:
+                first_record = struct.unpack_from('<Q', self._map, offset + 24)[0]
+                chunks.append((first_record, offset))
+        chunks.sort()
+        return [offset for _, offset in chunks]
+
+    def count(self):
+        """チャンクヘッダーのレコード番号から求めた総数（破損レコードを含む）"""
+        first = last = None
+        for offset in range(self.HEADER_SIZE, len(self._map) - self.CHUNK_SIZE + 1, self.CHUNK_SIZE):
+            if self._map[offset:offset + 8] == self.CHUNK_MAGIC:
+                chunk_first, chunk_last = struct.unpack_from('<QQ', self._map, offset + 24)
+                first = chunk_first if first is None else min(first, chunk_first)
+                last = chunk_last if last is None else max(last, chunk_last)
+        return 0 if first is None else last - first + 1
+
+    def read_chunk(self, offset):
+        """1チャンク分のレコードを古い順に返す"""
+        data = self._map[offset:offset + self.CHUNK_SIZE]
+        parser = _EvtxChunkParser(data)
+        free_space = min(struct.unpack_from('<I', data, 48)[0], self.CHUNK_SIZE)
+        records = []
+        pos = self.CHUNK_HEADER_SIZE
+        while pos + 24 <= free_space and data[pos:pos + 4] == self.RECORD_MAGIC:
+            size, record_id, filetime = struct.unpack_from('<IQQ', data, pos + 4)
+            if size < 28 or pos + size > free_space:
+                break
+            try:
+                records.append(self._build_record(record_id, filetime, parser.read_fragment(pos + 24)))
+            except (EvtxParseError, struct.error, IndexError, UnicodeDecodeError):
+                self.skipped += 1
+            pos += size
+        return records
+
+    def batches(self):
+        return self._batches(reverse=True)
+
+    def batches_from(self, start_record):
+        """指定したRecordNumber以降を古い順にバッチ単位で返す"""
+        for batch in self._batches(reverse=False):
+            batch = [event for event in batch if event.record_number >= start_record]
+            if batch:
+                yield batch
+
+    def batches_before(self, end_record):
+        """指定したRecordNumberより古いイベントを新しい順にバッチ単位で返す（それ以降のチャンクは解析しない）"""
+        for batch in self._batches(reverse=True, end_record=end_record):
+            batch = [event for event in batch if event.record_number < end_record]
+            if batch:
+                yield batch
+
+    def _batches(self, reverse, end_record=None):
+        offsets = self.chunk_offsets()
+        if end_record is not None:
+            offsets = [offset for offset in offsets
+                       if struct.unpack_from('<Q', self._map, offset + 24)[0] < end_record]
+        if reverse:
+            offsets.reverse()
+        batch = []
+        for offset in offsets:
+            records = self.read_chunk(offset)
+            if reverse:
+                records.reverse()
+            for record in records:
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    @staticmethod
+    def _build_record(record_id, filetime, nodes):
+        record = EventRecord(record_id, filetime_to_timestamp(filetime))
+        event = next((node for node in nodes if isinstance(node, _XmlElement)), None)
+        if event is None:
+            return record
+
+        system = event.find('System')
+        if system is not None:
+            provider = system.find('Provider')
+            if provider is not None:
+                record.source = sys.intern(provider.attrs.get('EventSourceName') or provider.attrs.get('Name', ""))
+            event_id = system.find('EventID')
+            if event_id is not None:
+                qualifiers = to_int(event_id.attrs.get('Qualifiers'))
+                record.event_id = (qualifiers << 16) | to_int(event_id.text())
+            record.level = event_level(to_int(_child_text(system, 'Level')),
+                                        to_int(_child_text(system, 'Keywords')))
+            record.category = to_int(_child_text(system, 'Task'))
+            record.computer = sys.intern(_child_text(system, 'Computer'))
+
+        data = event.find('EventData') or event.find('UserData')
+        if data is not None:
+            record.inserts = tuple(_leaf_texts(data))
+        return record
+
+    def close(self):
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _child_text(element, name):
+    child = element.find(name)
+    return child.text() if child is not None else ""
+
+
+def _leaf_texts(element):
+    """子要素を持たない要素のテキストを文書順に返す（EventData/Data, UserData の値）"""
+    texts = []
+    for child in element.elements():
+        if child.elements():
+            texts.extend(_leaf_texts(child))
+        else:
+            texts.append(child.text())
+    if not texts and element.text():
+        texts.append(element.text())
+    return texts
@@ -0,0 +1,86 @@
+"""フリート収集（複数のサーバーからの並列収集）のホストへの接続とホスト一覧
+
+ホストごとの収集処理（HostCollector）は Collector を継承するため ILCollector.py に置く。
+"""
+from collections import OrderedDict
+
+from eventlog_readers import EvtQuerySource, Win32EventLogSource, open_evt_channel, open_evt_session
+from jobs import CancelToken, LRUCache
+
+
+class HostUnreachable(Exception):
+    """フリート収集で、再試行してもホストに接続できなかった"""
+
+
+class HostConnection:
+    """フリート収集で1台のホストへの接続を管理する
+
+    evtquery ではリモートのセッション（EvtOpenSession）とプロバイダーのメタデータのキャッシュを
+    同じホストの全チャネルで使い回す。RPCの接続エラーは retries 回まで間隔を倍にしながら再試行し、
+    それでも接続できないホストは以降のチャネルを試さずに HostUnreachable で失敗させる。
+    """
+
+    # 再試行する接続エラー（winerror）
+    # ネットワークパスが見つからない・RPCサーバーを利用できない・RPCの呼び出しに失敗した など
+    RETRYABLE_ERRORS = {53, 64, 67, 121, 1231, 1722, 1723, 1726, 1727, 1753, 1818}
+
+    def __init__(self, server, reader="legacy", batch_size=None, retries=2, retry_delay=2.0, cancel_token=None):
+        self.server = server
+        self.reader = reader
+        self.batch_size = batch_size or EvtQuerySource.DEFAULT_BATCH_SIZE
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.cancel_token = cancel_token if cancel_token is not None else CancelToken()
+        self.session = None
+        self.publishers = LRUCache(64)
+        self.attempts = 0
+        self.error = None
+
+    @classmethod
+    def is_retryable(cls, error):
+        return getattr(error, 'winerror', None) in cls.RETRYABLE_ERRORS
+
+    def open_source(self, log_name, event_filter=None):
+        """ホストのイベントログを開く（接続エラーは再試行する）"""
+        if self.error is not None:
+            raise HostUnreachable(f"{self.server} に接続できません: {self.error}")
+        for attempt in range(self.retries + 1):
+            self.cancel_token.check()
+            self.attempts += 1
+            try:
+                return self._open(log_name, event_filter)
+            except Exception as e:
+                if not self.is_retryable(e):
+                    raise
+                # 切れたセッションは作り直す
+                self.session = None
+                if attempt == self.retries:
+                    self.error = e
+                    raise HostUnreachable(f"{self.server} に接続できません（{attempt + 1}回試行）: {e}") from e
+                if self.cancel_token.wait(self.retry_delay * 2 ** attempt):
+                    self.cancel_token.check()
+
+    def _open(self, log_name, event_filter):
+        if self.reader != "evtquery":
+            return Win32EventLogSource(log_name, server=self.server)
+        if self.session is None:
+            self.session = open_evt_session(self.server)
+        open_evt_channel(log_name, self.session)
+        return EvtQuerySource(log_name, event_filter=event_filter, batch_size=self.batch_size,
+                              session=self.session, publishers=self.publishers)
+
+    def close(self):
+        self.publishers.clear()
+        self.session = None
+
+
+def read_hosts(hosts=None, hosts_file=None):
+    """引数とファイルからホストの一覧を作る（重複は除く）"""
+    names = list(hosts or [])
+    if hosts_file:
+        with open(hosts_file, encoding='utf-8-sig') as f:
+            for line in f:
+                name = line.split("#", 1)[0].strip()
+                if name:
+                    names.append(name)
+    return list(OrderedDict.fromkeys(names))
@@ -0,0 +1,355 @@
+"""ILCollector のジョブの実行・キャンセル・進捗の通知
+
+チャネルやシステム情報のセクションを並列に実行する JobScheduler、GUIから投入された処理を
+まとめて実行する JobQueue、処理を途中で止める CancelToken、ワーカーから画面へ進捗を渡す
+ProgressQueue と、スレッド間で共有する LRUCache。
+"""
+import queue
+import re
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+
+class JobResult:
+    """ジョブ1件分の実行結果"""
+
+    def __init__(self, name, ok, value=None, error=None, elapsed=0.0):
+        self.name = name
+        self.ok = ok
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+
+class CollectionCancelled(Exception):
+    """キャンセルにより処理を中断した（output_file は途中までの出力）"""
+
+    def __init__(self, message="キャンセルされました", output_file=None):
+        super().__init__(message)
+        self.output_file = output_file
+
+
+class CancelToken:
+    """実行中の処理に停止を伝える
+
+    読み込みループは cancelled を確認して区切りのよいところで止まり、
+    子プロセスなど待ちを伴うものは register() した関数で即座に打ち切る。
+    threading.Event と同じく is_set() で状態を確認できる。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        """キャンセルを指示し、登録された関数を呼び出す"""
+        with self._lock:
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def register(self, callback):
+        """キャンセル時に呼び出す関数を登録し、登録を解除する関数を返す"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._unregister(callback)
+        callback()
+        return lambda: None
+
+    def _unregister(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def check(self):
+        """キャンセルされていれば CollectionCancelled を送出する"""
+        if self._event.is_set():
+            raise CollectionCancelled()
+
+    def wait(self, timeout=None):
+        """キャンセルされるか timeout 秒が経過するまで待つ（キャンセルされたらTrue）"""
+        return self._event.wait(timeout)
+
+
+def run_process(args, timeout=None, cancel_token=None, **kwargs):
+    """子プロセスを実行して出力を返す（timeout 秒を過ぎるかキャンセルされたら終了させる）"""
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs)
+    unregister = cancel_token.register(process.kill) if cancel_token is not None else None
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        raise
+    finally:
+        if unregister is not None:
+            unregister()
+    if cancel_token is not None:
+        cancel_token.check()
+    return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
+
+
+class JobScheduler:
+    """登録されたジョブをワーカープールで同時に実行する"""
+
+    def __init__(self, max_workers=3):
+        self.max_workers = max_workers
+        self._jobs = []
+
+    def add(self, name, func, *args, **kwargs):
+        """ジョブを登録する"""
+        self._jobs.append((name, func, args, kwargs))
+
+    def run(self, cancel_token=None):
+        """登録済みのジョブをすべて実行し、登録順に結果を返す
+        
+        cancel_token を指定した場合、待機中の Ctrl+C でキャンセルを指示し、
+        各ジョブが中断するのを待ってから結果を返す。
+        """
+        jobs, self._jobs = self._jobs, []
+        if not jobs:
+            return []
+
+        workers = max(1, min(self.max_workers, len(jobs)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ILCollector") as executor:
+            futures = [executor.submit(self._run_job, *job) for job in jobs]
+            results = []
+            for future in futures:
+                while True:
+                    try:
+                        results.append(future.result(timeout=0.5))
+                        break
+                    except FutureTimeoutError:
+                        pass
+                    except KeyboardInterrupt:
+                        if cancel_token is None:
+                            raise
+                        cancel_token.cancel()
+            return results
+
+    @staticmethod
+    def _run_job(name, func, args, kwargs):
+        """ジョブを1件実行する（例外は結果として返し、他のジョブに影響させない）"""
+        start = time.perf_counter()
+        try:
+            value = func(*args, **kwargs)
+            return JobResult(name, True, value=value, elapsed=time.perf_counter() - start)
+        except Exception as e:
+            return JobResult(name, False, error=e, elapsed=time.perf_counter() - start)
+
+
+class JobQueue:
+    """画面の操作から投入される処理を、同時に実行する数を制限して順に実行する
+
+    同じキーの処理が待機中・実行中の場合は新たに実行せず、その処理の Future を返す。
+    ボタンの連打や一括取得との重複で、同じイベントログや msinfo32 を二重に読みに行かない。
+    """
+
+    def __init__(self, max_running=2):
+        self._executor = ThreadPoolExecutor(max_workers=max_running, thread_name_prefix="ILCollectorJob")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, func, *args):
+        """処理を投入し (Future, 新しく投入したか) を返す"""
+        with self._lock:
+            future = self._jobs.get(key)
+            if future is not None:
+                return future, False
+            future = self._executor.submit(func, *args)
+            self._jobs[key] = future
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future, True
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._jobs.get(key) is future:
+                del self._jobs[key]
+
+    @property
+    def busy(self):
+        """待機中・実行中の処理があるか"""
+        with self._lock:
+            return bool(self._jobs)
+
+    def shutdown(self):
+        """待機中の処理を取り消し、実行中の処理の終了を待つ"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+class ProgressQueue:
+    """ワーカースレッドからGUIへの通知をまとめる単一のスレッドセーフなキュー
+
+    投入は待たずに戻るため、GUIの処理が遅れてもワーカーは止まらない。
+    GUIは一定間隔で drain() を呼んで溜まった通知をまとめて処理する。
+    """
+
+    def __init__(self, interval=0.2):
+        self.interval = interval   # 進捗を送る最小間隔（秒）
+        self._queue = queue.Queue()
+
+    def post(self, kind, *args):
+        """通知を投入する"""
+        self._queue.put_nowait((kind,) + args)
+
+    def drain(self):
+        """溜まっている通知をすべて取り出す"""
+        messages = []
+        while True:
+            try:
+                messages.append(self._queue.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def task(self, name, total=None):
+        """ジョブ1件分の進捗を作成する"""
+        return ProgressTask(self, name, total)
+
+
+class ProgressTask:
+    """ジョブ1件分の進捗（読み込み件数・書き込み件数・書き込みバイト数・速度・残り時間）
+
+    update() は最小間隔ごとにしかキューへ送らないため、チャンクごとに呼んでよい。
+    """
+
+    def __init__(self, progress_queue, name, total=None):
+        self.queue = progress_queue
+        self.name = name
+        self.total = total
+        self.read = 0
+        self.written = 0
+        self.bytes = 0
+        self.done = False
+        self._start = time.perf_counter()
+        self._last_post = None
+        self.queue.post('progress', self.snapshot())
+
+    def update(self, read, written, bytes_written=None, force=False):
+        """進捗を更新する（bytes_written は呼び出し可能なら送る直前にだけ評価する）"""
+        self.read = read
+        self.written = written
+        now = time.perf_counter()
+        if not force and self._last_post is not None and now - self._last_post < self.queue.interval:
+            return
+        self._last_post = now
+        if callable(bytes_written):
+            bytes_written = bytes_written()
+        if bytes_written is not None:
+            self.bytes = bytes_written
+        self.queue.post('progress', self.snapshot())
+
+    def finish(self, written=None, bytes_written=None):
+        """完了を通知する"""
+        self.done = True
+        self.update(self.read, self.written if written is None else written, bytes_written, force=True)
+
+    def snapshot(self):
+        elapsed = time.perf_counter() - self._start
+        rate = self.written / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.total and rate > 0 and not self.done:
+            eta = max(self.total - self.written, 0) / rate
+        return {
+            'name': self.name,
+            'read': self.read,
+            'written': self.written,
+            'total': self.total,
+            'bytes': self.bytes,
+            'rate': rate,
+            'eta': eta,
+            'done': self.done,
+        }
+
+
+def format_bytes(size):
+    """バイト数を読みやすい単位にする"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+
+
+_SIZE_UNITS = {'': 1, 'B': 1, 'K': 1024, 'KB': 1024, 'M': 1024 ** 2, 'MB': 1024 ** 2, 'G': 1024 ** 3, 'GB': 1024 ** 3}
+
+
+def parse_size(text):
+    """サイズの指定（"500MB" "2G" "1048576" など）をバイト数にする"""
+    match = re.match(r"^\s*(\d+(?:\.\d+)?)\s*([KMG]?B?)\s*$", text, re.IGNORECASE)
+    if not match or float(match.group(1)) <= 0:
+        raise ValueError(f"サイズの形式が正しくありません: {text}")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+
+def describe_progress(snapshot):
+    """進捗（ProgressTask.snapshot()）を1行の文字列にする"""
+    name = snapshot['name']
+    if snapshot['done']:
+        detail = f"完了 {snapshot['written']:,}件" if snapshot['total'] is not None or snapshot['written'] else "完了"
+        return f"{name}: {detail}  {format_bytes(snapshot['bytes'])}"
+    if snapshot['total']:
+        count = f"{snapshot['written']:,} / {snapshot['total']:,}件"
+    else:
+        count = f"{snapshot['written']:,}件"
+    parts = [f"{name}: {count}", format_bytes(snapshot['bytes'])]
+    if snapshot['rate']:
+        parts.append(f"{snapshot['rate']:,.0f}件/秒")
+    if snapshot['eta'] is not None:
+        parts.append(f"残り約{snapshot['eta']:.0f}秒")
+    return "  ".join(parts)
+
+
+class LRUCache:
+    """件数上限付きのLRUキャッシュ（ヒット・ミス数を記録する）"""
+
+    def __init__(self, maxsize, on_evict=None):
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def lookup(self, key):
+        """(見つかったか, 値) を返す"""
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return False, None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    def put(self, key, value):
+        """値を登録し、上限を超えた分を古い順に追い出す"""
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            old_key, old_value = self._data.popitem(last=False)
+            if self.on_evict:
+                self.on_evict(old_key, old_value)
+
+    def clear(self):
+        """すべて追い出す"""
+        while self._data:
+            old_key, old_value = self._data.popitem(last=False)
+            if self.on_evict:
+                self.on_evict(old_key, old_value)
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,356 @@
+"""出力したイベントの検索用の索引（SQLite）
+
+出力ルートの event_index.sqlite3 に全ホスト・全チャネルのイベントをまとめ、
+日時・レベル・ソース・イベントIDとキーワードで検索する。
+"""
+import csv
+import os
+import re
+import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from event_records import LEVEL_LABELS, LEVEL_OTHER, parse_csv_time, to_int
+
+
+class EventSearchIndex:
+    """出力ルートの event_index.sqlite3 に、出力したイベントの全文検索用の索引を持つ
+
+    イベントの出力と同時に EventIndexWriter で追加する。キーワードは SQLite の FTS5（trigram が
+    使える場合は日本語も部分一致で検索できる）、ソース・イベントID・日時はそれぞれの索引で絞り込む。
+    索引を持たない過去の出力フォルダのCSVは sync() で取り込む。
+    """
+
+    FILE_NAME = "event_index.sqlite3"
+
+    # 過去の収集のCSV（出力ルート直下の差分ファイルと、タイムスタンプ付きフォルダのCSV）
+    CSV_PATTERN = re.compile(r"^(?P<log>.+?)_(?:EventLog|Evtx)_.+\.csv$")
+
+    # sync() で過去のCSVを何行ずつ登録するか（1回のコミットでロックを持つ時間とメモリを抑える）
+    SYNC_BATCH = 5000
+
+    def __init__(self, root):
+        self.root = root
+        self.path = os.path.join(root, self.FILE_NAME)
+        os.makedirs(root, exist_ok=True)
+        # 接続はスレッド間で共有し、_lock で直列化する（他のプロセスとの競合は SQLite のロックで待つ）
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        # 出力中のイベントの登録は1つのスレッドで順に行う
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ILCollectorIndex")
+        with self._lock, self._conn as conn:
+            self._create_tables(conn)
+
+    def _create_tables(self, conn):
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                log_name TEXT,
+                bytes INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY,
+                file_id INTEGER NOT NULL,
+                record_number INTEGER,
+                timestamp INTEGER,
+                event_id INTEGER,
+                level INTEGER,
+                source TEXT,
+                message TEXT
+            );
+            CREATE INDEX IF NOT EXISTS events_file ON events(file_id, record_number);
+            CREATE INDEX IF NOT EXISTS events_timestamp ON events(timestamp);
+            CREATE INDEX IF NOT EXISTS events_event_id ON events(event_id, timestamp);
+            CREATE INDEX IF NOT EXISTS events_source ON events(source COLLATE NOCASE, timestamp);
+        """)
+        # メッセージ本文は events に1つだけ持ち、FTS5 は索引だけを持つ（FTS5 がない環境では LIKE で検索する）。
+        # trigram は部分一致（LIKE）にだけ使うため、語の位置を持たない detail=none にして登録を軽くする
+        for options in ("tokenize='trigram', detail=none", "tokenize='unicode61'"):
+            try:
+                conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5("
+                    f"message, content='events', content_rowid='id', {options})"
+                )
+                break
+            except sqlite3.OperationalError:
+                continue
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'messages'").fetchone()
+        self.fts = row is not None
+        self.trigram = self.fts and "trigram" in row[0]
+
+    def _relpath(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root)
+
+    def writer(self, output_file, log_name, keep_through_record=None, keep_from_record=None):
+        """出力ファイル1つ分の EventIndexWriter を返す
+
+        既存のファイルに追記する場合は keep_through_record より後の（中断で捨てられた）イベントを削除する。
+        新しい順に書き込んだファイルの続きから書き込む場合は keep_from_record より古いイベントを削除する。
+        """
+        with self._lock, self._conn as conn:
+            relpath = self._relpath(output_file)
+            row = conn.execute("SELECT id FROM files WHERE path = ?", (relpath,)).fetchone()
+            if row is None:
+                file_id = conn.execute(
+                    "INSERT INTO files (path, log_name) VALUES (?, ?)", (relpath, log_name)
+                ).lastrowid
+            else:
+                file_id = row[0]
+                # 書き込み中は bytes を空にし、sync() で取り込み直さないようにする
+                conn.execute("UPDATE files SET bytes = NULL WHERE id = ?", (file_id,))
+                if keep_through_record is not None:
+                    self._delete_events(conn, "file_id = ? AND record_number > ?", (file_id, keep_through_record))
+                elif keep_from_record is not None:
+                    self._delete_events(conn, "file_id = ? AND record_number < ?", (file_id, keep_from_record))
+                else:
+                    self._delete_events(conn, "file_id = ?", (file_id,))
+        return EventIndexWriter(self, file_id)
+
+    def _delete_events(self, conn, where, params):
+        if self.fts:
+            conn.execute(
+                "INSERT INTO messages (messages, rowid, message) "
+                f"SELECT 'delete', id, message FROM events WHERE {where}", params
+            )
+        conn.execute(f"DELETE FROM events WHERE {where}", params)
+
+    def _insert(self, conn, rows):
+        # 書き込みは直列化しているため、追加した行の id は直前の最大値より後になる
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+        conn.executemany(
+            "INSERT INTO events (file_id, record_number, timestamp, event_id, level, source, message) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+        )
+        if self.fts:
+            conn.execute("INSERT INTO messages (rowid, message) SELECT id, message FROM events WHERE id > ?",
+                         (last_id,))
+
+    def add_rows(self, rows):
+        """(file_id, record_number, timestamp, event_id, level, source, message) の行をまとめて追加する"""
+        with self._lock, self._conn as conn:
+            self._insert(conn, rows)
+
+    def add_rows_async(self, rows):
+        """add_rows() を索引専用のスレッドで実行する（イベントの出力を待たせない）"""
+        return self._executor.submit(self.add_rows, rows)
+
+    def finish_file(self, file_id, output_file):
+        """書き込みを終えたファイルのパス（.partial への名前の変更を含む）とサイズを記録する"""
+        with self._lock, self._conn as conn:
+            conn.execute(
+                "UPDATE files SET path = ?, bytes = ? WHERE id = ?",
+                (self._relpath(output_file), os.path.getsize(output_file), file_id)
+            )
+
+    def sync(self, cancel_token=None):
+        """出力ルート以下のCSVのうち、索引にない（または追記された）分を取り込み、取り込んだ件数を返す"""
+        added = 0
+        for path, log_name in self._csv_files():
+            if cancel_token is not None:
+                cancel_token.check()
+            added += self._sync_file(path, log_name, cancel_token)
+        return added
+
+    def _csv_files(self):
+        # 出力ルート直下・タイムスタンプ付きフォルダ・フリート収集のホスト別フォルダ（2階層まで）
+        folders = level = [self.root]
+        for _ in range(2):
+            level = sorted(entry.path for folder in level for entry in os.scandir(folder) if entry.is_dir())
+            folders = folders + level
+        for folder in folders:
+            for entry in os.scandir(folder):
+                match = self.CSV_PATTERN.match(entry.name)
+                if match and entry.is_file():
+                    yield entry.path, match.group('log')
+
+    def _sync_file(self, path, log_name, cancel_token=None):
+        """CSVの未取り込みの部分を SYNC_BATCH 行ずつ読んで登録する
+
+        バッチごとにコミットして files.bytes を進めるため、途中でキャンセルしても次の sync() で続きから取り込める。
+        書き込み途中で終わっている最後の行は含めない。
+        """
+        relpath = self._relpath(path)
+        size = os.path.getsize(path)
+        with self._lock, self._conn as conn:
+            row = conn.execute("SELECT id, bytes FROM files WHERE path = ?", (relpath,)).fetchone()
+            if row is None:
+                file_id = conn.execute(
+                    "INSERT INTO files (path, log_name, bytes) VALUES (?, ?, 0)", (relpath, log_name)
+                ).lastrowid
+                start = 0
+            else:
+                file_id, start = row
+                # 書き込み中のファイルと、取り込み済みのファイルは飛ばす
+                if start is None or start == size:
+                    return 0
+                if start > size:
+                    self._delete_events(conn, "file_id = ?", (file_id,))
+                    start = 0
+        
+        count = 0
+        with open(path, 'rb') as f:
+            f.seek(start)
+            offset = len(f.readline()) if start == 0 else start
+            parts = []
+            quotes = 0
+            lines = []
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                parts.append(line)
+                quotes += line.count(b'"')
+                if quotes % 2:
+                    continue
+                record = parts[0] if len(parts) == 1 else b"".join(parts)
+                parts = []
+                quotes = 0
+                offset += len(record)
+                lines.append(record.decode('utf-8', 'replace'))
+                if len(lines) >= self.SYNC_BATCH:
+                    added = self._sync_rows(file_id, lines, offset)
+                    if added is None:
+                        return count
+                    count += added
+                    lines = []
+                    if cancel_token is not None:
+                        cancel_token.check()
+            added = self._sync_rows(file_id, lines, offset)
+        return count + (added or 0)
+
+    def _sync_rows(self, file_id, lines, offset):
+        # CSVの行を登録し、取り込んだ位置を offset に進める（登録中に書き込みが始まったファイルは None を返して打ち切る）
+        rows = []
+        for row in csv.reader(lines):
+            if len(row) < 5:
+                continue
+            rows.append((file_id, None, parse_csv_time(row[0]), to_int(row[1]),
+                         LEVEL_LABELS.index(row[2]) if row[2] in LEVEL_LABELS else LEVEL_OTHER,
+                         row[3], row[4]))
+        with self._lock, self._conn as conn:
+            updated = conn.execute(
+                "UPDATE files SET bytes = ? WHERE id = ? AND bytes IS NOT NULL", (offset, file_id)
+            ).rowcount
+            if not updated:
+                return None
+            self._insert(conn, rows)
+        return len(rows)
+
+    def search(self, keyword=None, event_filter=None, limit=100):
+        """キーワード・絞り込み条件に合うイベントを新しい順に返す
+
+        keyword は空白区切りのすべての語を含むメッセージに一致する。
+        戻り値は {'time', 'event_id', 'level', 'source', 'message', 'file', 'log_name'} の辞書のリスト。
+        """
+        conditions = []
+        params = []
+        for word in (keyword or "").split():
+            # trigram の索引は3文字以上で、ESCAPE の要らない（% や _ を含まない）語だけに使える
+            if self.trigram and len(word) >= 3 and not re.search(r"[%_]", word):
+                conditions.append("e.id IN (SELECT rowid FROM messages WHERE message LIKE ?)")
+                params.append(f"%{word}%")
+            elif self.fts and not self.trigram:
+                conditions.append("e.id IN (SELECT rowid FROM messages WHERE messages MATCH ?)")
+                params.append('"' + word.replace('"', '""') + '"')
+            else:
+                conditions.append("e.message LIKE ? ESCAPE '\\'")
+                params.append("%" + re.sub(r"([%_\\])", r"\\\1", word) + "%")
+        if event_filter is not None:
+            if event_filter.since_timestamp is not None:
+                conditions.append("e.timestamp >= ?")
+                params.append(event_filter.since_timestamp)
+            if event_filter.until_timestamp is not None:
+                conditions.append("e.timestamp <= ?")
+                params.append(event_filter.until_timestamp)
+            for column, values in (("e.level", event_filter.level_codes), ("e.event_id", event_filter.event_ids),
+                                   ("e.source COLLATE NOCASE", event_filter.sources)):
+                if values is not None:
+                    conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+                    params.extend(sorted(values))
+        
+        sql = ("SELECT e.timestamp, e.event_id, e.level, e.source, e.message, f.path, f.log_name "
+               "FROM events e JOIN files f ON f.id = e.file_id")
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY e.timestamp DESC, e.id DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            {
+                'time': timestamp,
+                'event_id': event_id,
+                'level': level,
+                'source': source,
+                'message': message,
+                'file': os.path.join(self.root, path),
+                'log_name': log_name,
+            }
+            for timestamp, event_id, level, source, message, path, log_name in rows
+        ]
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            self._conn.close()
+
+
+class EventIndexWriter:
+    """出力ファイル1つ分のイベントを検索用の索引に追加する
+
+    FLUSH_ROWS 件ずつ溜めて、索引専用のスレッドでまとめて登録する（登録待ちが MAX_PENDING を
+    超えた場合は古いものの完了を待つ）。索引への書き込みに失敗した場合はそれ以降の追加をやめ、
+    イベントの出力は続ける。
+    """
+
+    FLUSH_ROWS = 5000
+    MAX_PENDING = 4
+
+    def __init__(self, index, file_id):
+        self.index = index
+        self.file_id = file_id
+        self.failed = False
+        self._rows = []
+        self._pending = deque()
+
+    def add(self, event, message):
+        """出力したイベント（EventRecord）とメッセージを追加する"""
+        self._rows.append((self.file_id, event.record_number, event.timestamp, event.event_id & 0xFFFF,
+                           event.level, event.source, message))
+        if len(self._rows) >= self.FLUSH_ROWS:
+            self.flush()
+
+    def flush(self):
+        rows, self._rows = self._rows, []
+        if self.failed or not rows:
+            return
+        self._pending.append(self.index.add_rows_async(rows))
+        while len(self._pending) > self.MAX_PENDING:
+            self._wait(self._pending.popleft())
+
+    def _wait(self, future):
+        try:
+            future.result()
+        except sqlite3.Error:
+            self.failed = True
+
+    def sync(self):
+        """追加したイベントの登録を終えるまで待つ（チェックポイントの保存前に索引を出力に追いつかせる）"""
+        self.flush()
+        while self._pending:
+            self._wait(self._pending.popleft())
+
+    def close(self, output_file):
+        """残りを登録し、出力ファイルのパスとサイズを記録する"""
+        self.sync()
+        if self.failed:
+            return
+        try:
+            self.index.finish_file(self.file_id, output_file)
+        except (sqlite3.Error, OSError):
+            self.failed = True
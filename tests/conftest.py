@@ -0,0 +1,63 @@
+"""テスト共通のフィクスチャ
+
+benchmark.py の擬似 win32evtlog（SyntheticLog / FakeEventLogApi）で稼働中のイベントログを再現し、
+Windows 以外の環境でも収集処理を実行する。
+"""
+import csv
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark  # noqa: E402
+from ILCollector import Collector, FakeMessageFormatter, MessageFormatCache  # noqa: E402
+
+
+@pytest.fixture
+def fake_eventlog(monkeypatch):
+    """件数を指定して擬似イベントログを登録し、その FakeEventLogApi を返す関数
+
+    hosts（FakeHost のリスト）を渡すとフリート収集用の FakeFleetApi を登録する。
+    """
+    def install(count, hosts=None, **kwargs):
+        log = benchmark.SyntheticLog(count, **kwargs)
+        if hosts is None:
+            api = benchmark.FakeEventLogApi(log, call_delay=0, event_delay=0)
+        else:
+            api = benchmark.FakeFleetApi(log, hosts, call_delay=0, event_delay=0)
+        # テストの終了時に登録前の状態へ戻す
+        for name in ("win32evtlog", "win32evtlogutil", "win32con"):
+            monkeypatch.setitem(sys.modules, name, types.ModuleType(name))
+        benchmark.install_fake_win32(api)
+        return api
+    return install
+
+
+@pytest.fixture
+def output_root(tmp_path):
+    return str(tmp_path / "out")
+
+
+@pytest.fixture
+def make_collector(output_root):
+    """擬似フォーマッタでメッセージを作る Collector を返す関数（テストの終了時に閉じる）"""
+    collectors = []
+
+    def make(**kwargs):
+        collector = Collector(output_root, **kwargs)
+        collector.message_cache = MessageFormatCache(FakeMessageFormatter(load_delay=0, template_delay=0))
+        collectors.append(collector)
+        return collector
+    yield make
+    for collector in collectors:
+        collector.close()
+
+
+def read_csv(path):
+    """出力したCSVを (ヘッダー, 行のリスト) にする"""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.reader(f))
+    return rows[0], rows[1:]
@@ -0,0 +1,56 @@
+"""絞り込み条件（EventFilter）と EvtQuery に渡すXPathのテスト"""
+from datetime import datetime
+
+from conftest import read_csv
+from event_records import LEVEL_INFO, LEVEL_OTHER, EventRecord, event_level
+from eventlog_readers import EventFilter
+
+
+def test_xpath_levels_match_event_level():
+    # 詳細（Level 5）は event_level と同じく「情報」に含める
+    assert event_level(5, 0) == LEVEL_INFO
+    assert EventFilter(levels=['info']).to_xpath() == "*[System[(Level=0 or Level=4 or Level=5)]]"
+    assert EventFilter(levels=['other']).to_xpath() == "*[System[(Level=0)]]"
+    assert EventFilter(levels=['error', 'warning']).to_xpath() == "*[System[(Level=1 or Level=2 or Level=3)]]"
+
+
+def test_audit_events_are_other():
+    assert event_level(0, 0x20000000000000) == LEVEL_OTHER
+    assert event_level(0, 0) == LEVEL_INFO
+
+
+def test_xpath_keeps_source_spelling():
+    event_filter = EventFilter(sources=["Service Control Manager", "EventLog"])
+    assert "Provider[@Name='EventLog' or @Name='Service Control Manager']" in event_filter.to_xpath()
+    assert event_filter.matches(EventRecord(1, 0, source="service control manager"))
+    assert not event_filter.matches(EventRecord(1, 0, source="Kernel-Power"))
+
+
+def test_round_trip_keeps_source_spelling():
+    event_filter = EventFilter(since=datetime(2025, 1, 1), sources=["EventLog"], levels=['error'])
+    restored = EventFilter.from_dict(event_filter.to_dict())
+    assert restored.to_xpath() == event_filter.to_xpath()
+    assert restored.key() == event_filter.key()
+
+
+def test_xpath_quotes_are_escaped():
+    assert "@Name='O&apos;Brien'" in EventFilter(sources=["O'Brien"]).to_xpath()
+
+
+def _export(make_collector, reader, event_filter):
+    collector = make_collector(reader=reader)
+    [result] = collector.collect(channels=["System"], systeminfo=False, limit=None, event_filter=event_filter)
+    assert result.ok, result.error
+    header, rows = read_csv(result.value['file'])
+    # メッセージは読み込み方式ごとに作り方が違うため、日時・イベントID・レベル・ソースを比べる
+    return [row[:4] for row in rows]
+
+
+def test_readers_select_the_same_events(fake_eventlog, make_collector):
+    fake_eventlog(500)
+    for levels in (['error'], ['warning', 'info'], ['other']):
+        event_filter = EventFilter(levels=levels, event_ids=range(0, 50, 3))
+        legacy = _export(make_collector, "legacy", event_filter)
+        evtquery = _export(make_collector, "evtquery", event_filter)
+        assert legacy == evtquery
+        assert legacy or levels == ['other']
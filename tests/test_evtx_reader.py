@@ -0,0 +1,50 @@
+import pytest
+
+import benchmark
+from event_records import decode_eventlog_records
+from evtx_reader import EvtxFileSource, EvtxParseError
+
+
+def _read(path):
+    source = EvtxFileSource(str(path))
+    try:
+        return [event for batch in source.batches() for event in batch], source
+    finally:
+        source.close()
+
+
+def test_evtx_records_match_source_events(tmp_path):
+    log = benchmark.SyntheticLog(1500, inserts=3)
+    path = tmp_path / "System.evtx"
+    assert benchmark.write_synthetic_evtx(str(path), log) == 1500
+
+    events, source = _read(path)
+    expected = decode_eventlog_records(list(log))
+    assert source.log_name == "System"
+    assert source.skipped == 0
+    # batches() は新しい順
+    assert [e.record_number for e in events] == list(range(1500, 0, -1))
+    for got, want in zip(reversed(events), expected):
+        assert (got.timestamp, got.event_id & 0xFFFF, got.level, got.source, tuple(got.inserts)) == \
+               (want.timestamp, want.event_id & 0xFFFF, want.level, want.source, tuple(want.inserts))
+
+
+def test_evtx_batches_from_and_before(tmp_path):
+    path = tmp_path / "Application.evtx"
+    benchmark.write_synthetic_evtx(str(path), benchmark.SyntheticLog(800))
+    source = EvtxFileSource(str(path))
+    try:
+        assert source.count() == 800
+        newer = [e.record_number for batch in source.batches_from(701) for e in batch]
+        older = [e.record_number for batch in source.batches_before(101) for e in batch]
+    finally:
+        source.close()
+    assert newer == list(range(701, 801))
+    assert older == list(range(100, 0, -1))
+
+
+def test_not_an_evtx_file(tmp_path):
+    path = tmp_path / "broken.evtx"
+    path.write_bytes(b"not an evtx file" * 10)
+    with pytest.raises(EvtxParseError):
+        EvtxFileSource(str(path))
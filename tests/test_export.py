@@ -0,0 +1,30 @@
+"""イベントログのCSV出力のテスト"""
+import time
+
+from conftest import read_csv
+from event_records import format_timestamp, parse_csv_time
+
+
+def test_date_column_keeps_time_generated_format(fake_eventlog, make_collector):
+    api = fake_eventlog(20)
+    [result] = make_collector().collect(channels=["System"], systeminfo=False, limit=None)
+    assert result.ok, result.error
+    _, rows = read_csv(result.value['file'])
+    # 従来どおり TimeGenerated.Format()（ロケールの %c）と同じ表記
+    assert [row[0] for row in rows] == [api.log.event(number).TimeGenerated.Format() for number in range(20, 0, -1)]
+
+
+def test_incremental_append_uses_one_date_format(fake_eventlog, make_collector):
+    api = fake_eventlog(10)
+    assert make_collector().collect(channels=["System"], systeminfo=False, limit=None, incremental=True)[0].ok
+    api.log.count = 25
+    [result] = make_collector().collect(channels=["System"], systeminfo=False, limit=None, incremental=True)
+    _, rows = read_csv(result.value['file'])
+    assert [row[0] for row in rows] == [api.log.event(number).TimeGenerated.Format() for number in range(1, 26)]
+
+
+def test_parse_csv_time_reads_both_formats():
+    timestamp = int(time.mktime((2026, 3, 4, 5, 6, 7, 0, 0, -1)))
+    assert parse_csv_time(format_timestamp(timestamp)) == timestamp
+    assert parse_csv_time("2026/03/04 05:06:07") == timestamp
+    assert parse_csv_time("") is None
@@ -0,0 +1,43 @@
+import pytest
+
+import benchmark
+from fleet import HostConnection, HostUnreachable, read_hosts
+
+
+def _read_all(source):
+    try:
+        return sum(len(batch) for batch in source.batches())
+    finally:
+        source.close()
+
+
+@pytest.mark.parametrize("reader", ["legacy", "evtquery"])
+def test_flaky_host_is_retried(fake_eventlog, reader):
+    api = fake_eventlog(300, hosts=[benchmark.FakeHost("srv001", latency=0, failures=1)])
+    connection = HostConnection("srv001", reader=reader, retry_delay=0)
+    try:
+        assert _read_all(connection.open_source("System")) == 300
+        assert _read_all(connection.open_source("Application")) == 300
+    finally:
+        connection.close()
+    assert connection.attempts == 3
+    if reader == "evtquery":
+        # セッションは失敗時に作り直し、以降のチャネルでは使い回す
+        assert api.sessions == 2
+
+
+def test_unreachable_host_fails_without_retrying_other_channels(fake_eventlog):
+    api = fake_eventlog(10, hosts=[benchmark.FakeHost("srv001", latency=0, down=True)])
+    connection = HostConnection("srv001", reader="evtquery", retries=2, retry_delay=0)
+    with pytest.raises(HostUnreachable):
+        connection.open_source("System")
+    assert api.connects == 3
+    with pytest.raises(HostUnreachable):
+        connection.open_source("Application")
+    assert api.connects == 3
+
+
+def test_read_hosts_merges_arguments_and_file(tmp_path):
+    hosts_file = tmp_path / "hosts.txt"
+    hosts_file.write_text("\ufeffsrv002\n# 停止中\n\nsrv003  # DB\nsrv001\n", encoding="utf-8")
+    assert read_hosts(["srv001", "srv002"], str(hosts_file)) == ["srv001", "srv002", "srv003"]
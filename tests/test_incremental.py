@@ -0,0 +1,64 @@
+"""差分取得（ブックマークからの追記）のテスト"""
+from conftest import read_csv
+
+
+class Crash(Exception):
+    pass
+
+
+def _crash(*args, **kwargs):
+    raise Crash("異常終了")
+
+
+def _collect(collector):
+    [result] = collector.collect(channels=["System"], systeminfo=False, limit=None, incremental=True)
+    return result
+
+
+def test_appends_only_new_events(fake_eventlog, make_collector):
+    api = fake_eventlog(30)
+    first = _collect(make_collector())
+    assert first.ok
+    api.log.count = 50
+    second = _collect(make_collector())
+    assert second.ok
+    assert second.value['events'] == 20
+    header, rows = read_csv(second.value['file'])
+    assert header == ['日時', 'イベントID', 'レベル', 'ソース', 'メッセージ']
+    assert len(rows) == 50
+
+
+def test_crash_before_first_bookmark_is_not_duplicated(fake_eventlog, make_collector, monkeypatch):
+    fake_eventlog(50)
+    collector = make_collector()
+    # 行を書き込んだ後、最初のブックマークを保存する前に異常終了させる
+    monkeypatch.setattr(collector.bookmarks, "update", _crash)
+    crashed = _collect(collector)
+    assert not crashed.ok
+    assert collector.bookmarks.get("System") is None
+    output_file = collector.output_root + "/System_EventLog_incremental.csv"
+    assert len(read_csv(output_file)[1]) == 50
+
+    result = _collect(make_collector())
+    assert result.ok
+    header, rows = read_csv(result.value['file'])
+    assert header[0] == '日時'
+    assert len(rows) == 50
+    assert len({row[-1] for row in rows}) == 50
+
+
+def test_crash_after_bookmark_discards_unrecorded_rows(fake_eventlog, make_collector, monkeypatch):
+    api = fake_eventlog(30)
+    assert _collect(make_collector()).ok
+    api.log.count = 50
+    collector = make_collector()
+    monkeypatch.setattr(collector.bookmarks, "update", _crash)
+    assert not _collect(collector).ok
+    api.log.count = 60
+
+    result = _collect(make_collector())
+    assert result.ok
+    assert result.value['events'] == 30
+    _, rows = read_csv(result.value['file'])
+    assert len(rows) == 60
+    assert len({row[-1] for row in rows}) == 60
@@ -0,0 +1,109 @@
+"""異常終了したエクスポートのチェックポイントからの再開のテスト"""
+import json
+import os
+import sqlite3
+
+import pytest
+
+from conftest import read_csv
+from ILCollector import ExportCheckpoint
+
+
+class Crash(Exception):
+    pass
+
+
+@pytest.fixture
+def crash_on_save(monkeypatch):
+    """チェックポイントを書き込みのたびに保存し、calls 回目の保存の直前に異常終了させる関数
+
+    保存は書き込み（500件）のたびに行うため、直前に書き込んだ分はチェックポイントに記録されていない
+    状態になる（再開時に切り詰める分）。
+    """
+    save = ExportCheckpoint.save
+    state = {'calls': 0, 'crash_at': None}
+
+    def saving(self, writer, force=False):
+        state['calls'] += 1
+        if state['calls'] == state['crash_at']:
+            raise Crash("異常終了")
+        save(self, writer, True)
+    monkeypatch.setattr(ExportCheckpoint, "save", saving)
+
+    def arm(calls):
+        state['calls'] = 0
+        state['crash_at'] = calls
+    return arm
+
+
+def _export(collector, **kwargs):
+    [result] = collector.collect(channels=["System"], systeminfo=False, limit=None, **kwargs)
+    return result
+
+
+def test_resume_continues_after_crash(fake_eventlog, make_collector, crash_on_save):
+    fake_eventlog(3000)
+    crash_on_save(4)
+    crashed = _export(make_collector(formats=["csv", "jsonl", "sqlite"]))
+    assert isinstance(crashed.error, Crash)
+    crash_on_save(None)
+
+    collector = make_collector()
+    [(checkpoint_path, state)] = collector.find_interrupted()
+    assert state['rows'] == 1000
+    # 記録されていない3回目の書き込みの分もファイルには残っている
+    output_file = os.path.join(os.path.dirname(checkpoint_path), state['file'])
+    assert len(read_csv(output_file)[1]) == 1500
+    assert state['formats'] == ["csv", "jsonl", "sqlite"]
+
+    [result] = collector.resume_interrupted()
+    assert result.ok, result.error
+    assert result.value['events'] == 3000
+    assert not os.path.exists(checkpoint_path)
+
+    files = result.value['files']
+    _, rows = read_csv(files['csv'])
+    assert len(rows) == 3000
+    assert len({row[-1] for row in rows}) == 3000
+    with open(files['jsonl'], encoding='utf-8') as f:
+        numbers = [json.loads(line)['record_number'] for line in f]
+    assert numbers == list(range(3000, 0, -1))
+    with sqlite3.connect(files['sqlite']) as conn:
+        assert conn.execute("SELECT COUNT(*), COUNT(DISTINCT record_number) FROM events").fetchone() == (3000, 3000)
+
+
+def test_resume_with_rotating_parts(fake_eventlog, make_collector, crash_on_save):
+    fake_eventlog(3000)
+    crash_on_save(5)
+    assert isinstance(_export(make_collector(part_rows=700)).error, Crash)
+    crash_on_save(None)
+
+    [result] = make_collector().resume_interrupted()
+    assert result.ok, result.error
+    with open(result.value['file'], encoding='utf-8') as f:
+        index = json.load(f)
+    rows = []
+    for part in index['parts']:
+        rows += read_csv(os.path.join(os.path.dirname(result.value['file']), part['file']))[1]
+    assert len(rows) == 3000
+    assert len({row[-1] for row in rows}) == 3000
+
+
+def test_mismatched_output_is_not_resumed(fake_eventlog, make_collector, crash_on_save):
+    fake_eventlog(3000)
+    crash_on_save(4)
+    assert isinstance(_export(make_collector()).error, Crash)
+    crash_on_save(None)
+
+    collector = make_collector()
+    [(checkpoint_path, state)] = collector.find_interrupted()
+    output_file = os.path.join(os.path.dirname(checkpoint_path), state['file'])
+    with open(output_file, 'r+b') as f:
+        f.seek(10)
+        f.write(b"X")
+
+    [result] = collector.resume_interrupted()
+    assert not result.ok
+    assert isinstance(result.error, ValueError)
+    assert not os.path.exists(checkpoint_path)
+    assert collector.find_interrupted() == []
@@ -0,0 +1,42 @@
+"""出力したイベントの検索用の索引（EventSearchIndex）のテスト"""
+import os
+
+from eventlog_readers import EventFilter
+from search_index import EventSearchIndex
+
+
+def _collect(make_collector, **kwargs):
+    collector = make_collector(**kwargs)
+    [result] = collector.collect(channels=["System"], systeminfo=False, limit=None)
+    assert result.ok, result.error
+    return collector
+
+
+def _key(hit):
+    return hit['time'], hit['event_id'], hit['level'], hit['source'], " ".join(hit['message'].split())
+
+
+def test_export_does_not_index_by_default(fake_eventlog, make_collector, output_root):
+    fake_eventlog(50)
+    _collect(make_collector)
+    assert not os.path.exists(os.path.join(output_root, EventSearchIndex.FILE_NAME))
+
+
+def test_search_imports_unindexed_csv(fake_eventlog, make_collector):
+    fake_eventlog(50)
+    collector = _collect(make_collector)
+    hits = collector.search(event_filter=EventFilter(levels=['error']), limit=None)
+    assert hits
+    assert all(hit['level'] == 0 for hit in hits)
+
+
+def test_indexed_export_matches_imported_csv(fake_eventlog, make_collector, output_root):
+    fake_eventlog(50)
+    indexed = _collect(make_collector, index_events=True)
+    live = indexed.search(limit=None)
+    assert len(live) == 50
+
+    os.remove(os.path.join(output_root, EventSearchIndex.FILE_NAME))
+    imported = make_collector().search(limit=None)
+    # 出力と同時に登録したメッセージは改行を含み、CSVから取り込んだものは改行を空白にしている
+    assert [_key(hit) for hit in imported] == [_key(hit) for hit in live]
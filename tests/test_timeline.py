@@ -0,0 +1,67 @@
+"""チャネル横断のタイムライン（merge_timeline）のテスト"""
+import csv
+import hashlib
+
+from conftest import read_csv
+from event_records import EventRecord, event_csv_row, parse_csv_time
+from ILCollector import TIMELINE_HEADER, merge_timeline
+
+DAY = 24 * 60 * 60
+BASE = 1767225600  # 2026-01-01
+
+
+def _write_channel(path, events):
+    """(エポック秒, メッセージ) を新しい順に並べたエクスポートのCSVを作る"""
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['日時', 'イベントID', 'レベル', 'ソース', 'メッセージ'])
+        for number, (timestamp, message) in enumerate(events, 1):
+            writer.writerow(event_csv_row(EventRecord(number, timestamp, 7, source="Src"), message))
+
+
+def test_merges_channels_newest_first(tmp_path):
+    system = tmp_path / "System.csv"
+    application = tmp_path / "Application.csv"
+    _write_channel(system, [(BASE + 9 * DAY, "s3"), (BASE + 5 * DAY, "s2"), (BASE + 1 * DAY, "s1")])
+    _write_channel(application, [(BASE + 10 * DAY, "a2"), (BASE + 2 * DAY, "a1")])
+    output_file = tmp_path / "Timeline.csv"
+
+    count, checksum = merge_timeline([("System", [system]), ("Application", [application])], output_file)
+
+    header, rows = read_csv(output_file)
+    assert header == TIMELINE_HEADER
+    assert count == 5
+    assert [row[5] for row in rows] == ["a2", "s3", "s2", "a1", "s1"]
+    assert [row[1] for row in rows] == ["Application", "System", "System", "Application", "System"]
+    assert checksum == {'sha256': hashlib.sha256(output_file.read_bytes()).hexdigest(),
+                        'bytes': output_file.stat().st_size}
+
+
+def test_keeps_quoted_fields_and_parts(tmp_path):
+    part1 = tmp_path / "System_part1.csv"
+    part2 = tmp_path / "System_part2.csv"
+    _write_channel(part1, [(BASE + 3 * DAY, 'quote " and, comma')])
+    _write_channel(part2, [(BASE + 2 * DAY, "line1\nline2")])
+    output_file = tmp_path / "Timeline.csv"
+
+    count, _ = merge_timeline([("System", [part1, part2])], output_file)
+
+    _, rows = read_csv(output_file)
+    assert count == 2
+    assert rows[0][5] == 'quote " and, comma'
+    assert rows[1][5] == "line1 line2"
+    assert [parse_csv_time(row[0]) for row in rows] == [BASE + 3 * DAY, BASE + 2 * DAY]
+
+
+def test_collect_writes_timeline(fake_eventlog, make_collector):
+    fake_eventlog(40)
+    collector = make_collector()
+    results = collector.collect(channels=["System", "Application"], systeminfo=False, limit=None, timeline=True)
+    assert all(result.ok for result in results)
+    timeline = results[-1]
+    assert timeline.value['events'] == 80
+
+    _, rows = read_csv(timeline.value['file'])
+    times = [parse_csv_time(row[0]) for row in rows]
+    assert times == sorted(times, reverse=True)
+    assert {row[1] for row in rows} == {"System", "Application"}